@@ -0,0 +1,158 @@
+import asyncio
+import multiprocessing
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Нагрузка на обработчик, который читает пользователя и баланс (как /api/user/balance),
+# при CLIENTS одновременных клиентах: синхронная сессия прямо в цикле событий,
+# синхронная сессия в пуле потоков (services/executors.py) и AsyncSession
+# (database/databases.py, services/crud/user.py, services/balance.py).
+# Сервер uvicorn - в отдельном процессе. База - файловая SQLite (aiosqlite для AsyncSession),
+# каждый запрос к ней ждет DB_LATENCY_MS в потоке драйвера, как ответа MySQL по сети;
+# или DATABASE_URL и DATABASE_ASYNC_URL из настроек, если заданы оба
+# (таблицы и пользователи 1..USERS должны уже быть).
+# Запуск: python -m benchmarks.bench_async_db [blocking|threads|async ...]
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import modelses.models  # noqa: F401 - модели для связей User
+from benchmarks.bench_worker_batch import USERS, make_engine
+from database.config import get_settings
+from services.balance import AsyncBalanceService, BalanceService
+from services.crud.user import get_user_by_id, get_user_by_id_async
+from services.executors import get_executors
+
+CLIENTS = 200
+REQUESTS = 4000
+DB_LATENCY_MS = 5.0
+PORT = 8765
+
+
+def add_latency(engine, seconds: float) -> None:
+    # Задержка в потоке, который выполняет запрос: у sqlite3 - поток вызова,
+    # у aiosqlite - собственный поток соединения (цикл событий не ждет)
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, record):
+        raw = getattr(getattr(dbapi_connection, "_connection", None), "_conn", dbapi_connection)
+        raw.set_trace_callback(lambda statement: time.sleep(seconds))
+
+
+def make_app(url: str, async_url: str, latency: float = 0.0) -> FastAPI:
+    # Пулы соединений как в database/databases.py: 5 + 10 сверх
+    engine = create_engine(url, pool_size=5, max_overflow=10)
+    async_engine = create_async_engine(async_url, poolclass=AsyncAdaptedQueuePool, pool_size=5, max_overflow=10)
+    if latency:
+        add_latency(engine, latency)
+        add_latency(async_engine.sync_engine, latency)
+    async_session = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    app = FastAPI()
+
+    def load_balance(user_id: int) -> float:
+        with Session(engine) as session:
+            user = get_user_by_id(user_id, session)
+            return BalanceService(session).get_balance(user)
+
+    @app.get("/ready")
+    async def ready():
+        return {}
+
+    @app.get("/blocking/{user_id}")
+    async def blocking(user_id: int):
+        return {"balance": load_balance(user_id)}
+
+    @app.get("/threads/{user_id}")
+    async def threads(user_id: int):
+        return {"balance": await get_executors().run_io(load_balance, user_id)}
+
+    @app.get("/async/{user_id}")
+    async def async_session_balance(user_id: int):
+        async with async_session() as session:
+            user = await get_user_by_id_async(user_id, session)
+            return {"balance": await AsyncBalanceService(session).get_balance(user)}
+
+    return app
+
+
+def serve(url: str, async_url: str, latency: float) -> None:
+    import uvicorn
+
+    uvicorn.run(make_app(url, async_url, latency), host="127.0.0.1", port=PORT, log_level="warning",
+                timeout_keep_alive=120)
+
+
+async def load(mode: str):
+    # Клиенты на asyncio-соединениях с keep-alive: разбор ответа дешевле, чем в httpx,
+    # и генератор нагрузки не отнимает процессор у сервера
+    latencies = []
+
+    async def client(n: int):
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        try:
+            for i in range(n, REQUESTS, CLIENTS):
+                started = time.perf_counter()
+                writer.write(f"GET /{mode}/{i % USERS + 1} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head.startswith(b"HTTP/1.1 200"):
+                    raise RuntimeError(head.decode(errors="replace"))
+                await reader.readexactly(int(re.search(rb"content-length: (\d+)", head, re.I).group(1)))
+                latencies.append(time.perf_counter() - started)
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(CLIENTS)))
+    elapsed = time.perf_counter() - started
+    return np.array(latencies) * 1000, elapsed
+
+
+def wait_ready(timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/ready").raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    settings = get_settings()
+    print(f"{CLIENTS} clients, {REQUESTS} requests")
+    with tempfile.TemporaryDirectory() as tmp:
+        url, async_url, latency = settings.DATABASE_URL, settings.DATABASE_ASYNC_URL, 0.0
+        if not url or not async_url:
+            path = Path(tmp) / "bench.db"
+            make_engine(path).dispose()
+            url, async_url = f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+            latency = DB_LATENCY_MS / 1000
+            print(f"SQLite, {DB_LATENCY_MS} ms per statement")
+        server = multiprocessing.get_context("spawn").Process(target=serve, args=(url, async_url, latency),
+                                                              daemon=True)
+        server.start()
+        try:
+            wait_ready()
+            for mode in sys.argv[1:] or ("blocking", "threads", "async"):
+                latencies, elapsed = asyncio.run(load(mode))
+                print(f"{mode:8s} {REQUESTS / elapsed:7.0f} req/s  latency p50 {np.percentile(latencies, 50):8.2f} ms"
+                      f"  p99 {np.percentile(latencies, 99):8.2f} ms")
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
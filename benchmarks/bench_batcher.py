@@ -0,0 +1,49 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Пропускная способность одиночных предсказаний от параллельных клиентов:
+# отдельный predict на каждый запрос против MicroBatcher.
+# Запуск: python -m benchmarks.bench_batcher
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelses.models import MLModel
+from services.ml.batcher import MicroBatcher
+
+CLIENTS = 500
+REQUESTS_PER_CLIENT = 40
+ROW = {"petal_length": 4.5, "petal_width": 1.5}
+
+
+async def client_direct(model: MLModel):
+    for _ in range(REQUESTS_PER_CLIENT):
+        model.predict([ROW])
+        await asyncio.sleep(0)
+
+
+async def client_batched(batcher: MicroBatcher):
+    for _ in range(REQUESTS_PER_CLIENT):
+        await batcher.predict([ROW])
+
+
+async def run(factory) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(factory() for _ in range(CLIENTS)))
+    return CLIENTS * REQUESTS_PER_CLIENT / (time.perf_counter() - started)
+
+
+def main():
+    model = MLModel()
+    batcher = MicroBatcher(lambda: model, max_batch_size=256, max_wait_ms=2.0)
+
+    direct = asyncio.run(run(lambda: client_direct(model)))
+    batched = asyncio.run(run(lambda: client_batched(batcher)))
+    print(f"direct:  {direct:,.0f} predictions/s")
+    print(f"batched: {batched:,.0f} predictions/s")
+    print(f"batcher stats: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Кодирование и разбор сообщений ml_task_queue: JSON (список словарей) против
+# msgpack с упакованными колонками float64 (services/RabbitMQ/codec.py).
+# Разбор - до матрицы признаков NumPy, как его видит воркер.
+# Запуск: python -m benchmarks.bench_codec
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelses.models import FEATURES
+from services.RabbitMQ.codec import JSON, MSGPACK, decode_task, encode_task
+
+ROWS = (1, 10, 100, 1000, 10000, 100000)
+TARGET_SECONDS = 0.2
+
+
+def timed(func) -> float:
+    # Среднее время вызова; число повторов подбирается под TARGET_SECONDS
+    repeats, elapsed = 1, 0.0
+    while True:
+        started = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= TARGET_SECONDS:
+            return elapsed / repeats
+        repeats *= 4
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>7s} {'format':8s} {'size, B':>10s} {'encode, rows/s':>15s} {'decode, rows/s':>15s}")
+    for rows in ROWS:
+        X = np.round(rng.uniform(0.1, 7.0, size=(rows, len(FEATURES))), 1)
+        data = [dict(zip(FEATURES, row)) for row in X.tolist()]
+        for name, content_type in (("json", JSON), ("msgpack", MSGPACK)):
+            body, _ = encode_task(1, data, content_type)
+            assert np.array_equal(decode_task(1, body, content_type).X, X)
+            encode = timed(lambda: encode_task(1, data, content_type))
+            decode = timed(lambda: decode_task(1, body, content_type))
+            print(f"{rows:7d} {name:8s} {len(body):10d} {rows / encode:15.0f} {rows / decode:15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Сравнение холодного старта: обучение модели против загрузки артефакта.
+# Каждый замер - отдельный процесс, чтобы учитывать импорт pandas/sklearn.
+# Запуск: python -m benchmarks.bench_cold_start
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNS = 5
+
+# Код процесса печатает время создания MLModel без учета импортов
+# (sklearn импортируется заранее, его импорт входит только в время процесса)
+CODE = (
+    "import time; import sklearn.linear_model; from modelses.models import MLModel; "
+    "started = time.perf_counter(); m = MLModel({args}); "
+    "print(time.perf_counter() - started, m.source)"
+)
+
+
+def measure(code: str):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                            capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": str(ROOT)})
+    total = time.perf_counter() - started
+    model_time, source = result.stdout.split()
+    return total, float(model_time), source
+
+
+def main():
+    sys.path.insert(0, str(ROOT))
+    from modelses.models import MLModel
+    from services.ml.artifacts import export_model
+
+    with tempfile.TemporaryDirectory() as root:
+        export_model(MLModel(use_artifact=False), root=root, version="bench")
+
+        variants = (
+            ("train", "use_artifact=False"),
+            ("artifact", f"artifact_dir={root!r}")
+        )
+        for title, args in variants:
+            runs = [measure(CODE.format(args=args)) for _ in range(RUNS)]
+            totals = sorted(run[0] for run in runs)
+            models = sorted(run[1] for run in runs)
+            print(f"{title:>10} ({runs[0][2]}): process median {totals[RUNS // 2] * 1000:.1f} ms, "
+                  f"model median {models[RUNS // 2] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Задержка небольших задач во время потока больших: одна очередь FIFO (как раньше)
+# против полос и очередей bulk по пользователям со справедливой очередностью в воркере
+# (services/RabbitMQ/scheduling.py). Поток bulk опубликован заранее, интерактивные задачи
+# приходят из другого потока с постоянной частотой; задержка - от публикации до коммита.
+# Очередь в памяти (services/RabbitMQ/queues.py) и файловая SQLite вместо RabbitMQ и MySQL.
+# Запуск: python -m benchmarks.bench_fair_queue
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from sqlmodel import Session
+
+from benchmarks.bench_worker_batch import make_engine
+from modelses.models import MLModel
+from services.RabbitMQ.batching import handle_batch
+from services.RabbitMQ.codec import decode_task, encode_task
+from services.RabbitMQ.queues import MemoryQueueBackend
+from services.RabbitMQ.scheduling import FairScheduler
+from services.RabbitMQ.tasks import (
+    BULK, ENQUEUED_AT_HEADER, INTERACTIVE, TASK_QUEUE, USER_ID_HEADER, task_headers, task_queue, task_queues
+)
+
+BULK_USERS = 3
+BULK_MESSAGES = 60  # на пользователя
+BULK_ROWS = 2000
+INTERACTIVE_MESSAGES = 200
+INTERACTIVE_INTERVAL = 0.01
+USERS = 50
+
+
+def run(engine, model, fair: bool):
+    backend = MemoryQueueBackend()
+    rng = np.random.default_rng(0)
+
+    def publish(user_id: int, lane: str, rows: int) -> None:
+        body, content_type = encode_task(user_id, rng.uniform(0, 7, size=(rows, 2)))
+        queue = task_queue(lane, user_id) if fair else TASK_QUEUE
+        backend.publish(queue, body, headers=task_headers("-", user_id, lane, queue), content_type=content_type)
+
+    for i in range(BULK_MESSAGES):
+        for user_id in range(1, BULK_USERS + 1):
+            publish(user_id, BULK, BULK_ROWS)
+
+    def interactive():
+        for i in range(INTERACTIVE_MESSAGES):
+            publish(BULK_USERS + 1 + i % (USERS - BULK_USERS), INTERACTIVE, 1)
+            time.sleep(INTERACTIVE_INTERVAL)
+
+    latencies = {INTERACTIVE: [], BULK: []}
+
+    def on_message(ch, method, properties, body):
+        task = decode_task(method.delivery_tag, body, properties.content_type)
+        handle_batch(lambda: Session(engine), [task], model)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        lane = INTERACTIVE if properties.headers[USER_ID_HEADER] > BULK_USERS else BULK
+        latencies[lane].append(time.time() - properties.headers[ENQUEUED_AT_HEADER])
+        if len(latencies[INTERACTIVE]) == INTERACTIVE_MESSAGES:
+            backend.stop()
+
+    if fair:
+        scheduler = FairScheduler(backend, on_message, window=16)
+        for queue in task_queues():
+            backend.consume(queue, scheduler.on_message, prefetch=3)
+    else:
+        backend.consume(TASK_QUEUE, on_message, prefetch=1)
+
+    producer = threading.Thread(target=interactive)
+    started = time.perf_counter()
+    producer.start()
+    backend.start()
+    elapsed = time.perf_counter() - started
+    producer.join()
+    return latencies, elapsed
+
+
+def main():
+    import contextlib
+    import io
+
+    model = MLModel()
+    print(f"bulk: {BULK_USERS} users x {BULK_MESSAGES} messages x {BULK_ROWS} rows, "
+          f"interactive: {INTERACTIVE_MESSAGES} messages every {INTERACTIVE_INTERVAL * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fair in (("fifo", False), ("fair", True)):
+            engine = make_engine(Path(tmp) / f"bench-{name}.db")
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, elapsed = run(engine, model, fair)
+            small = np.array(latencies[INTERACTIVE]) * 1000
+            print(f"{name}: small jobs p50 {np.percentile(small, 50):8.1f} ms, p99 {np.percentile(small, 99):8.1f} ms; "
+                  f"bulk processed {len(latencies[BULK])} in {elapsed:.2f} s")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
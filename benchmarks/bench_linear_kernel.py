@@ -0,0 +1,47 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Задержка одного вызова: sklearn LogisticRegression.predict против LinearKernel.
+# Запуск: python -m benchmarks.bench_linear_kernel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelses.models import MLModel
+
+BATCH_SIZES = (1, 2, 5, 10, 100, 1_000, 10_000)
+CALLS = 2_000
+
+
+def per_call_us(func, X: np.ndarray) -> float:
+    calls = max(CALLS // max(len(X) // 100, 1), 20)
+    for _ in range(10):
+        func(X)
+    started = time.perf_counter()
+    for _ in range(calls):
+        func(X)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    model = MLModel()
+    estimator, kernel = model._model, model._kernel
+    if kernel is None:
+        print("Model is not linear, kernel is not available")
+        return
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>6} {'sklearn, us':>12} {'kernel, us':>12} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        X = rng.uniform(0, 7, size=(size, 2))
+        assert np.array_equal(estimator.predict(X), kernel.predict(X))
+
+        sklearn_us = per_call_us(estimator.predict, X)
+        kernel_us = per_call_us(kernel.predict, X)
+        print(f"{size:>6} {sklearn_us:>12.1f} {kernel_us:>12.1f} {sklearn_us / kernel_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
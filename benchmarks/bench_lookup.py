@@ -0,0 +1,57 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Таблица решений против LogisticRegression.predict и LinearKernel:
+# время построения, размер, точность на границах ячеек и задержка одного вызова.
+# Запуск: python -m benchmarks.bench_lookup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelses.models import MLModel
+from services.ml.lookup import DecisionGrid
+
+BATCH_SIZES = (1, 10, 100, 1_000, 10_000, 100_000)
+CALLS = 2_000
+
+
+def per_call_us(func, X: np.ndarray) -> float:
+    calls = max(CALLS // max(len(X) // 100, 1), 20)
+    for _ in range(10):
+        func(X)
+    started = time.perf_counter()
+    for _ in range(calls):
+        func(X)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    model = MLModel()
+
+    for cells_per_unit in (10, 20):
+        started = time.perf_counter()
+        grid = DecisionGrid.build(model, cells_per_unit=cells_per_unit)
+        build_ms = (time.perf_counter() - started) * 1000
+        accuracy = grid.check_accuracy(model)
+        print(f"grid 1/{cells_per_unit}: build {build_ms:.1f} ms, {grid.table.nbytes / 1e6:.1f} MB, "
+              f"boundary mismatches {accuracy['mismatches']}/{accuracy['points']} "
+              f"({accuracy['mismatch_rate']:.2e})")
+
+    grid = DecisionGrid.build(model)
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>7} {'sklearn, us':>12} {'kernel, us':>11} {'grid, us':>9}")
+    for size in BATCH_SIZES:
+        # Значения с шагом 0.1, как из формы
+        X = np.round(rng.uniform(0, 100, size=(size, 2)), 1)
+        assert np.array_equal(grid.predict(X), model._model.predict(X))
+
+        sklearn_us = per_call_us(model._model.predict, X)
+        kernel_us = per_call_us(model._kernel.predict, X) if model._kernel is not None else float("nan")
+        grid_us = per_call_us(grid.predict, X)
+        print(f"{size:>7} {sklearn_us:>12.1f} {kernel_us:>11.1f} {grid_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
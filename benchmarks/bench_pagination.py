@@ -0,0 +1,101 @@
+import asyncio
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# /api/predictions при росте истории пользователя: вся история с json.loads каждой строки
+# (как раньше) против одной страницы по курсору (services/pagination.py) - первой и из середины.
+# Файловая SQLite с индексами из миграций (database/migrations); время и пик памяти на запрос.
+# Запуск: python -m benchmarks.bench_pagination
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.bench_worker_batch import make_engine
+from modelses.models import PredictionResult
+from services.crud.prediction import get_predictions_page_async
+from services.pagination import encode_cursor
+
+HISTORY_SIZES = (1000, 10000, 100000, 1000000)
+LIMIT = 50
+REPEATS = 5
+ROW = '[{"color": "setosa"}]'
+FULL_HISTORY_MAX = 100000  # дальше вся история - десятки секунд и сотни МБ
+
+
+def fill(engine, user_id: int, rows: int) -> None:
+    started = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        for offset in range(0, rows, 50000):
+            conn.execute(insert(PredictionResult), [
+                {"user_id": user_id, "prediction_rez": ROW, "cost": 10.0, "model_version": "v1",
+                 "created_at": started + timedelta(seconds=n)}
+                for n in range(offset, min(offset + 50000, rows))
+            ])
+
+
+async def measure(load) -> tuple:
+    # Лучшее время из REPEATS и пик памяти одного запроса
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await load()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    await load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best * 1000, peak / 2 ** 20
+
+
+async def run(path: Path, user_id: int, rows: int) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    middle = encode_cursor(datetime(2026, 1, 1) + timedelta(seconds=rows // 2), 10 ** 12)
+
+    async def full_history():
+        async with sessions() as session:
+            statement = select(PredictionResult).where(
+                PredictionResult.user_id == user_id
+            ).order_by(PredictionResult.created_at.desc())
+            return [pred.get_prediction_rez() for pred in (await session.exec(statement)).all()]
+
+    def page(cursor):
+        async def load():
+            async with sessions() as session:
+                predictions, _ = await get_predictions_page_async(user_id, session, LIMIT, cursor)
+                return [pred.get_prediction_rez() for pred in predictions]
+        return load
+
+    try:
+        results = {"first page": await measure(page(None)), "middle page": await measure(page(middle))}
+        if rows <= FULL_HISTORY_MAX:
+            results["full history"] = await measure(full_history)
+        return results
+    finally:
+        await engine.dispose()
+
+
+def main():
+    print(f"page of {LIMIT}, best of {REPEATS}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        engine = make_engine(path)
+        for user_id, rows in enumerate(HISTORY_SIZES, start=1):
+            fill(engine, user_id, rows)
+        engine.dispose()
+        for user_id, rows in enumerate(HISTORY_SIZES, start=1):
+            results = asyncio.run(run(path, user_id, rows))
+            line = "  ".join(f"{name} {ms:8.2f} ms {mb:7.2f} MB" for name, (ms, mb) in results.items())
+            print(f"{rows:8d} rows: {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Сравнение построчного predict(List[Dict]) и векторного predict_columns.
+# Запуск: python -m benchmarks.bench_predict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelses.models import MLModel
+
+SIZES = (10, 1_000, 10_000, 100_000)
+REPEATS = 5
+
+
+def best_of(func, *args, **kwargs) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    model = MLModel()
+    rng = np.random.default_rng(42)
+
+    print(f"{'rows':>8} {'records, ms':>12} {'columns, ms':>12} {'matrix, ms':>12}")
+    for size in SIZES:
+        X = rng.uniform(0, 7, size=(size, 2))
+        records = [{"petal_length": float(pl), "petal_width": float(pw)} for pl, pw in X]
+        columns = {"petal_length": X[:, 0], "petal_width": X[:, 1]}
+
+        rows_time = best_of(model.predict, records)
+        columns_time = best_of(model.predict_columns, columns)
+        matrix_time = best_of(model.predict_columns, X)
+        print(f"{size:>8} {rows_time * 1000:>12.2f} {columns_time * 1000:>12.2f} {matrix_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
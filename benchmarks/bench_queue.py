@@ -0,0 +1,133 @@
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Пропускная способность и задержка воркера без инфраструктуры: синтетические сообщения
+# идут через очередь в памяти (services/RabbitMQ/queues.py) в handle_batch по одному
+# (как callback воркера) или пачками (BatchConsumer), база - файловая SQLite.
+# Задержка - от публикации до подтверждения (ack) сообщения.
+# burst - все сообщения опубликованы сразу (задержка включает ожидание в очереди),
+# paced - публикация с постоянной скоростью RATE сообщений/с.
+# Запуск: python -m benchmarks.bench_queue
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from modelses.balance import Balance
+from modelses.user import User
+from services.ml.registry import get_model
+from services.RabbitMQ.batching import BatchConsumer, handle_batch
+from services.RabbitMQ.codec import decode_task
+from services.RabbitMQ.queues import MemoryQueueBackend
+
+QUEUE = 'ml_task_queue'
+MESSAGES = 2000
+USERS = 50
+RATE = 200
+PACED_SECONDS = 3
+ROW = {"petal_length": 4.5, "petal_width": 1.5}
+
+
+class TimedQueue(MemoryQueueBackend):
+    # Замер задержки при подтверждении сообщения
+    def __init__(self):
+        super().__init__()
+        self.latencies = []
+
+    def _settle(self, delivery_tag, multiple):
+        settled = super()._settle(delivery_tag, multiple)
+        now = time.perf_counter()
+        self.latencies.extend(now - properties.headers["published_at"] for _, _, properties in settled)
+        return settled
+
+
+def make_engine(path: Path):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for user_id in range(1, USERS + 1):
+            session.add(User(user_id=user_id, username=f"u{user_id}", email=f"u{user_id}@test.ru",
+                             password_hash="x"))
+            session.add(Balance(user_id=user_id, amount=1e9))
+        session.commit()
+    return engine
+
+
+def publish(queue: MemoryQueueBackend, count: int, rate: float = None):
+    for i in range(count):
+        body = json.dumps({"user_id": i % USERS + 1, "data": [ROW]})
+        queue.publish(QUEUE, body.encode(), headers={"published_at": time.perf_counter()})
+        if rate:
+            time.sleep(1 / rate)
+
+
+def single_consumer(engine):
+    model = get_model()
+
+    def on_message(channel, method, properties, body):
+        task = decode_task(method.delivery_tag, body, properties.content_type)
+        handle_batch(lambda: Session(engine), [task], model)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+    return on_message, 1
+
+
+def batched_consumer(engine, queue, batch_size=100):
+    model = get_model()
+    consumer = BatchConsumer(
+        queue,
+        lambda tasks: handle_batch(lambda: Session(engine), tasks, model),
+        max_batch_size=batch_size,
+        max_wait_ms=20
+    )
+    return consumer.on_message, batch_size
+
+
+def run(mode: str, engine, count: int, rate: float = None):
+    queue = TimedQueue()
+    if mode == "single":
+        on_message, prefetch = single_consumer(engine)
+    else:
+        on_message, prefetch = batched_consumer(engine, queue)
+    queue.consume(QUEUE, on_message, prefetch=prefetch)
+
+    producer = threading.Thread(target=publish, args=(queue, count, rate))
+    started = time.perf_counter()
+    producer.start()
+    if rate is None:
+        producer.join()
+    # Сообщения обрабатываются в этом потоке; выходим, когда все подтверждены
+    while len(queue.latencies) < count:
+        queue.start(until_idle=True)
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    producer.join()
+
+    latencies = np.array(queue.latencies) * 1000
+    return count / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    get_model()
+    print(f"messages: {MESSAGES} (burst), {RATE} msg/s x {PACED_SECONDS} s (paced), users: {USERS}")
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        for mode in ("single", "batched"):
+            for scenario, count, rate in (("burst", MESSAGES, None), ("paced", RATE * PACED_SECONDS, RATE)):
+                engine = make_engine(Path(tmp) / f"{mode}-{scenario}.db")
+                # Воркер печатает строку на каждое сообщение - в бенчмарке это шум
+                with contextlib.redirect_stdout(devnull):
+                    throughput, p50, p99 = run(mode, engine, count, rate)
+                engine.dispose()
+                print(f"{mode:8s} {scenario:6s} {throughput:8.0f} msg/s  "
+                      f"latency p50 {p50:8.2f} ms  p99 {p99:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Обработка здоровых сообщений, когда часть сообщений падает при каждой попытке:
+# немедленный возврат в очередь (nack с requeue) против очередей повтора с задержкой
+# (services/RabbitMQ/retry.py). Время - до обработки всех здоровых сообщений, но не дольше
+# TIME_LIMIT: когда упавших сообщений больше пачки, немедленный возврат занимает ими
+# весь prefetch и здоровые сообщения не обрабатываются вовсе.
+# Очередь в памяти (services/RabbitMQ/queues.py) и файловая SQLite вместо RabbitMQ и MySQL.
+# Запуск: python -m benchmarks.bench_retry
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlmodel import Session
+
+from benchmarks.bench_worker_batch import make_engine
+from modelses.models import MLModel
+from services.RabbitMQ.batching import BatchConsumer, FAILED, handle_batch
+from services.RabbitMQ.queues import MemoryQueueBackend
+from services.RabbitMQ.retry import RetryPolicy, RetryRouter
+from services.RabbitMQ.tasks import TASK_QUEUE
+
+MESSAGES = 2000
+USERS = 50
+BATCH_SIZE = 50
+POISON_SHARES = (0.0, 0.01, 0.05)
+TIME_LIMIT = 10.0
+
+
+class RequeueRouter:
+    # Без очередей повтора: упавшее сообщение сразу возвращается в голову очереди
+    def route(self, body, properties, error, retryable=True):
+        raise RuntimeError("requeue")
+
+
+def run(engine, model, poison_share: float, router):
+    backend = MemoryQueueBackend()
+    if isinstance(router, RetryRouter):
+        router.backend = backend
+        router.declare()
+    row = {"petal_length": 4.5, "petal_width": 1.5}
+    poison_every = int(1 / poison_share) if poison_share else 0
+    healthy = 0
+    for tag in range(1, MESSAGES + 1):
+        poison = poison_every and tag % poison_every == 0
+        backend.publish(TASK_QUEUE, json.dumps({"user_id": tag % USERS + 1, "data": [row]}).encode(),
+                        headers={"poison": True} if poison else None)
+        healthy += not poison
+
+    processed = []
+
+    def handler(tasks):
+        rest = [task for task in tasks if task.tag not in poisoned]
+        outcomes = handle_batch(lambda: Session(engine), rest, model) if rest else {}
+        processed.extend(rest)
+        if len(processed) >= healthy:
+            backend.stop()
+        return {**outcomes, **{tag: FAILED for tag in poisoned.intersection(task.tag for task in tasks)}}
+
+    poisoned = set()
+    consumer = BatchConsumer(backend, handler, max_batch_size=BATCH_SIZE, router=router)
+
+    def on_message(ch, method, properties, body):
+        if properties.headers and properties.headers.get("poison"):
+            poisoned.add(method.delivery_tag)
+        consumer.on_message(ch, method, properties, body)
+
+    backend.consume(TASK_QUEUE, on_message, prefetch=BATCH_SIZE)
+    backend.call_later(TIME_LIMIT, backend.stop)
+    started = time.perf_counter()
+    backend.start()
+    return time.perf_counter() - started, len(processed), healthy
+
+
+def main():
+    import contextlib
+    import io
+
+    model = MLModel()
+    print(f"messages: {MESSAGES}, batch: {BATCH_SIZE}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for share in POISON_SHARES:
+            for name, router in (("requeue", RequeueRouter()),
+                                 ("retry", RetryRouter(None, RetryPolicy(TASK_QUEUE, base_delay=0.05)))):
+                engine = make_engine(Path(tmp) / f"bench-{share}-{name}.db")
+                # Логи воркера по каждой пачке не нужны в выводе
+                with contextlib.redirect_stdout(io.StringIO()):
+                    elapsed, processed, healthy = run(engine, model, share, router)
+                print(f"poison {share:5.0%} {name:8s}: {processed}/{healthy} healthy messages "
+                      f"in {elapsed * 1000:8.1f} ms")
+                engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
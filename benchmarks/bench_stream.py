@@ -0,0 +1,86 @@
+import asyncio
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Пропускная способность пакетных предсказаний (/api/predictions/batch) на синтетической
+# загрузке из 1M строк в CSV и NDJSON. Файл пишется во временный каталог и читается
+# кусками по 64 КБ, как если бы он приходил по сети; пиковый RSS показывает,
+# что память не растет с размером файла.
+# Запуск: python -m benchmarks.bench_stream
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modelses.models import MLModel
+from services.ml.streaming import StreamStats, stream_predictions
+
+ROWS = 1_000_000
+READ_SIZE = 64 * 1024
+CHUNK_ROWS = 10000
+
+
+def make_rows(fmt: str):
+    rng = np.random.default_rng(0)
+    if fmt == "csv":
+        yield b"petal_length,petal_width\n"
+    for start in range(0, ROWS, CHUNK_ROWS):
+        X = np.round(rng.uniform(0.1, 7.0, size=(min(CHUNK_ROWS, ROWS - start), 2)), 1)
+        if fmt == "csv":
+            yield "".join("%.1f,%.1f\n" % (pl, pw) for pl, pw in X).encode()
+        else:
+            yield "".join('{"petal_length": %.1f, "petal_width": %.1f}\n' % (pl, pw) for pl, pw in X).encode()
+
+
+def write_file(fmt: str, path: Path) -> int:
+    with open(path, "wb") as f:
+        for data in make_rows(fmt):
+            f.write(data)
+    return path.stat().st_size
+
+
+async def upload(path: Path):
+    # Куски фиксированного размера, не совпадающие с границами строк
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            yield data
+
+
+async def run(model: MLModel, fmt: str, path: Path):
+    stats = StreamStats()
+    sent = 0
+    started = time.perf_counter()
+    async for lines in stream_predictions(model, upload(path), fmt, stats, chunk_rows=CHUNK_ROWS):
+        sent += len(lines)
+    return time.perf_counter() - started, stats, sent
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    model = MLModel()
+    print(f"rows: {ROWS}, chunk_rows: {CHUNK_ROWS}, read_size: {READ_SIZE} bytes")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("csv", "ndjson"):
+            path = Path(tmp) / f"upload.{fmt}"
+            size = write_file(fmt, path)
+            rss_before = max_rss_mb()
+            elapsed, stats, sent = asyncio.run(run(model, fmt, path))
+            print(
+                f"{fmt:7s} input {size / 2 ** 20:5.1f} MB  {elapsed:6.2f} s  "
+                f"{stats.rows / elapsed:10.0f} rows/s  output {sent / 2 ** 20:6.1f} MB  "
+                f"peak RSS {max_rss_mb():.0f} MB (+{max_rss_mb() - rss_before:.0f} MB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import timezone
+from pathlib import Path
+
+import numpy as np
+
+# Задержка доставки результата задачи клиенту: от коммита воркера до момента,
+# когда ожидающий запрос узнал о завершении. События воркера (services/RabbitMQ/notifier.py)
+# против опроса таблицы статусов с интервалом POLL_INTERVAL.
+# Очередь в памяти (services/RabbitMQ/queues.py), база - файловая SQLite.
+# Запуск: python -m benchmarks.bench_task_events
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from modelses.balance import Balance
+from modelses.task import PredictionTask, TERMINAL_STATUSES
+from modelses.user import User
+from services.ml.registry import get_model
+from services.RabbitMQ.batching import BatchConsumer, handle_batch
+from services.RabbitMQ.notifier import TaskNotifier
+from services.RabbitMQ.queues import MemoryQueueBackend
+from services.RabbitMQ.tasks import EVENTS_EXCHANGE, TASK_QUEUE, TaskTracker, submit_task
+
+TASKS = 200
+POLL_INTERVAL = 0.1
+ROW = {"petal_length": 4.5, "petal_width": 1.5}
+
+
+def start_worker(engine, backend: MemoryQueueBackend) -> threading.Thread:
+    model = get_model()
+    consumer = BatchConsumer(backend, lambda tasks: handle_batch(lambda: Session(engine), tasks, model),
+                             max_batch_size=1, tracker=TaskTracker(lambda: Session(engine), backend))
+    backend.consume(TASK_QUEUE, consumer.on_message, prefetch=1)
+    worker = threading.Thread(target=backend.start, daemon=True)
+    worker.start()
+    return worker
+
+
+def finished_at(engine, task_id: str):
+    with Session(engine) as session:
+        task = session.get(PredictionTask, task_id)
+        return task.finished_at if task.status in TERMINAL_STATUSES else None
+
+
+async def wait_event(notifier: TaskNotifier, engine, backend, run):
+    with Session(engine) as session:
+        task_id = submit_task(session, backend, 1, [ROW]).task_id
+    events = notifier.subscribe(task_id)
+    try:
+        while await run(finished_at, engine, task_id) is None:
+            await notifier.next_event(events, 5.0)
+    finally:
+        notifier.unsubscribe(task_id, events)
+    return task_id, time.time()
+
+
+async def wait_poll(engine, backend, run):
+    with Session(engine) as session:
+        task_id = submit_task(session, backend, 1, [ROW]).task_id
+    while await run(finished_at, engine, task_id) is None:
+        await asyncio.sleep(POLL_INTERVAL)
+    return task_id, time.time()
+
+
+async def measure(mode: str, engine, backend):
+    loop = asyncio.get_running_loop()
+    run = lambda func, *args: loop.run_in_executor(None, func, *args)
+    notifier = TaskNotifier()
+    notifier.attach(loop)
+    # Подписчик рассылки получает события в потоке воркера, как слушатель веб-приложения
+    backend.subscribe(EVENTS_EXCHANGE, lambda ch, method, properties, body: notifier.deliver(body))
+
+    delivered = []
+    for _ in range(TASKS):
+        if mode == "events":
+            delivered.append(await wait_event(notifier, engine, backend, run))
+        else:
+            delivered.append(await wait_poll(engine, backend, run))
+    return delivered
+
+
+def main():
+    get_model()
+    print(f"tasks: {TASKS} one at a time, poll interval: {POLL_INTERVAL * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        for mode in ("events", "poll"):
+            engine = create_engine(f"sqlite:///{Path(tmp) / mode}.db")
+            SQLModel.metadata.create_all(engine)
+            with Session(engine) as session:
+                session.add(User(user_id=1, username="u1", email="u1@test.ru", password_hash="x"))
+                session.add(Balance(user_id=1, amount=1e9))
+                session.commit()
+
+            backend = MemoryQueueBackend()
+            with contextlib.redirect_stdout(devnull):
+                start_worker(engine, backend)
+                delivered = asyncio.run(measure(mode, engine, backend))
+                backend.stop()
+
+            # finished_at (UTC) пишется в транзакции результата, непосредственно перед коммитом
+            latencies = []
+            for task_id, delivered_at in delivered:
+                committed = finished_at(engine, task_id).replace(tzinfo=timezone.utc).timestamp()
+                latencies.append((delivered_at - committed) * 1000)
+            engine.dispose()
+            print(f"{mode:6s} commit -> client p50 {np.percentile(latencies, 50):7.2f} ms  "
+                  f"p99 {np.percentile(latencies, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Пропускная способность воркера: сообщение за сообщением (транзакция на каждое)
+# против пакетной обработки (services/RabbitMQ/batching.py).
+# Вместо MySQL используется файловая SQLite, поэтому выигрыш на сетевой БД будет больше:
+# там каждая транзакция - еще и несколько сетевых запросов.
+# Запуск: python -m benchmarks.bench_worker_batch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from modelses.balance import Balance
+from modelses.models import MLModel
+from modelses.user import User
+from services.RabbitMQ.batching import handle_batch
+from services.RabbitMQ.codec import decode_task
+
+MESSAGES = 5000
+USERS = 50
+BATCH_SIZES = (1, 10, 100, 500)
+
+
+def make_engine(path: Path):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for user_id in range(1, USERS + 1):
+            session.add(User(user_id=user_id, username=f"u{user_id}", email=f"u{user_id}@test.ru",
+                             password_hash="x"))
+            session.add(Balance(user_id=user_id, amount=1e9))
+        session.commit()
+    return engine
+
+
+def main():
+    model = MLModel()
+    row = {"petal_length": 4.5, "petal_width": 1.5}
+    tasks = [
+        decode_task(tag, json.dumps({"user_id": tag % USERS + 1, "data": [row]}).encode())
+        for tag in range(1, MESSAGES + 1)
+    ]
+
+    print(f"messages: {MESSAGES}, users: {USERS}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in BATCH_SIZES:
+            engine = make_engine(Path(tmp) / f"bench-{batch_size}.db")
+            started = time.perf_counter()
+            for start in range(0, MESSAGES, batch_size):
+                handle_batch(lambda: Session(engine), tasks[start:start + batch_size], model)
+            elapsed = time.perf_counter() - started
+            print(f"batch {batch_size:4d}: {MESSAGES / elapsed:9.0f} messages/s")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 from typing import Optional
+from pathlib import Path
 
 
 class Settings(BaseSettings):
@@ -16,6 +17,24 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str = "secret123"
     MYSQL_HOST: str = "localhost"
     MYSQL_PORT: int = 3306
+    # URL базы вместо MySQL (локальный запуск): синхронный движок и асинхронный,
+    # например sqlite:///local.db и sqlite+aiosqlite:///local.db
+    DATABASE_URL: Optional[str] = None
+    DATABASE_ASYNC_URL: Optional[str] = None
+    # Пул соединений каждого движка (синхронного и асинхронного, database/databases.py)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # ожидание свободного соединения
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # раньше wait_timeout MySQL; -1 - не пересоздавать
+    DB_POOL_PRE_PING: bool = True  # проверка соединения при выдаче из пула
+    # Метрики пула и запросов (database/metrics.py, /api/metrics): выражения дольше
+    # DB_SLOW_QUERY_MS пишутся в лог database.slow_query с вероятностью DB_SLOW_QUERY_SAMPLE_RATE
+    DB_SLOW_QUERY_MS: float = 200.0
+    DB_SLOW_QUERY_SAMPLE_RATE: float = 1.0
+    DB_ECHO: bool = False  # все SQL-выражения в лог (отладка)
+    # Запросы веб-приложения с не меньшим числом SQL-выражений пишутся в лог уровня DEBUG
+    # (webview/app.py, DbStatsMiddleware) - поиск N+1 без записи о каждом запросе
+    DB_STATS_LOG_MIN_STATEMENTS: int = 20
 
     app_host: str = "0.0.0.0"
     app_port: str = "8080"
@@ -23,6 +42,99 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "SECRET_KEY"
     COOKIE_NAME: str = "auth_token"
     DEBUG: bool = True
+
+    # Артефакты ML моделей (см. services/ml/artifacts.py)
+    MODEL_ARTIFACT_DIR: str = str(Path(__file__).resolve().parent.parent / "artifacts")
+    MODEL_VERSION: Optional[str] = None  # None - последняя экспортированная версия
+
+    # Микро-батчинг одиночных предсказаний (см. services/ml/batcher.py)
+    PREDICTION_BATCH_MAX_SIZE: int = 64
+    PREDICTION_BATCH_WAIT_MS: float = 2.0
+
+    # Пулы для блокирующей работы из async обработчиков (см. services/executors.py)
+    EXECUTOR_IO_WORKERS: int = 16
+    EXECUTOR_CPU_WORKERS: int = 2  # 0 - CPU задачи выполняются в пуле потоков
+    EXECUTOR_CPU_OFFLOAD_MIN_ROWS: int = 256  # меньшие пачки дешевле предсказать на месте
+
+    # Кэш предсказаний (см. services/ml/cache.py), по умолчанию выключен
+    PREDICTION_CACHE_ENABLED: bool = False
+    PREDICTION_CACHE_SIZE: int = 10000
+    PREDICTION_CACHE_TTL_SECONDS: float = 300.0
+    # Кэшируются строки не более чем с DECIMALS знаками после запятой (форма отправляет
+    # значения с шагом 0.1); более точные считаются моделью в обход кэша
+    PREDICTION_CACHE_DECIMALS: int = 2
+
+    # Режим инференса: "model" - модель, "grid" - таблица решений (services/ml/lookup.py)
+    PREDICTION_MODE: str = "model"
+    PREDICTION_GRID_LOW: float = 0.0
+    PREDICTION_GRID_HIGH: float = 100.0  # те же границы, что и в /prediction
+    PREDICTION_GRID_CELLS_PER_UNIT: int = 10  # шаг 0.1, как у полей формы
+    PREDICTION_GRID_VERIFY: bool = False
+
+    # Пакетные предсказания из загрузки CSV/NDJSON (/api/predictions/batch)
+    PREDICTION_STREAM_CHUNK_ROWS: int = 10000
+    PREDICTION_BATCH_ROW_COST: float = 0.01  # списывается одной транзакцией за всю загрузку
+
+    # Постраничная выдача /api/predictions и /get_all_users (services/pagination.py):
+    # размер страницы по умолчанию и наибольший
+    PAGE_LIMIT_DEFAULT: int = 50
+    PAGE_LIMIT_MAX: int = 200
+
+    # Воркер RabbitMQ (services/RabbitMQ/worker.py): при WORKER_BATCH_SIZE > 1 сообщения
+    # обрабатываются пачками (services/RabbitMQ/batching.py)
+    WORKER_PREFETCH_COUNT: int = 1  # не меньше WORKER_BATCH_SIZE
+    WORKER_BATCH_SIZE: int = 1
+    WORKER_BATCH_WAIT_MS: float = 50.0
+    # Асинхронный воркер (services/RabbitMQ/async_worker.py): число одновременных сообщений,
+    # оно же prefetch - брокер не отдает больше неподтвержденных сообщений
+    WORKER_CONCURRENCY: int = 16
+    WORKER_STARTUP_DELAY_SECONDS: float = 15.0  # ожидание инициализации RabbitMQ
+    # Супервизор (services/RabbitMQ/supervisor.py): число процессов воркера
+    # подбирается по глубине очереди в границах [MIN, MAX]
+    WORKER_PROCESSES_MIN: int = 1
+    WORKER_PROCESSES_MAX: int = 4
+    WORKER_SCALE_MESSAGES_PER_PROCESS: int = 100
+    WORKER_SCALE_INTERVAL_SECONDS: float = 5.0
+    WORKER_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # Повторы упавших сообщений (services/RabbitMQ/retry.py): задержка BASE * 2^(n-1),
+    # не больше MAX; после MAX_ATTEMPTS повторов - в очередь ml_task_queue.dead
+    WORKER_RETRY_MAX_ATTEMPTS: int = 5
+    WORKER_RETRY_BASE_SECONDS: float = 1.0
+    WORKER_RETRY_MAX_SECONDS: float = 60.0
+    # Ключи идемпотентности, которые процесс воркера помнит без запроса к БД
+    # (services/RabbitMQ/idempotency.py)
+    WORKER_SEEN_KEYS: int = 10000
+    # Справедливая очередность (services/RabbitMQ/scheduling.py): из WINDOW полученных сообщений
+    # воркер выбирает следующее по очереди между полосами и пользователями (deficit round-robin,
+    # QUANTUM_BYTES байт тела сообщения за ход, у интерактивной полосы INTERACTIVE_WEIGHT ходов на
+    # один ход bulk). Если окно не заполнено, сообщения отдаются через WAIT_MS
+    WORKER_FAIR_SCHEDULING: bool = True
+    WORKER_SCHEDULER_WINDOW: int = 64
+    WORKER_SCHEDULER_QUANTUM_BYTES: int = 4096
+    WORKER_SCHEDULER_INTERACTIVE_WEIGHT: int = 8
+    WORKER_SCHEDULER_WAIT_MS: float = 5.0
+    WORKER_SCHEDULER_STATS_SECONDS: float = 60.0  # вывод времени ожидания по полосам
+
+    # Статусы задач очереди (services/RabbitMQ/tasks.py): ожидание завершения
+    # в /api/tasks/{task_id} по событиям воркера (services/RabbitMQ/notifier.py)
+    TASK_EVENTS_ENABLED: bool = True
+    TASK_EVENTS_RETRY_SECONDS: float = 5.0  # повтор подключения к RabbitMQ
+    TASK_LONG_POLL_MAX_SECONDS: float = 30.0
+    TASK_STATUS_RECHECK_SECONDS: float = 5.0  # перечитывание статуса из БД, если событие потерялось
+    # Публикация задач из веб-приложения (services/RabbitMQ/publisher.py)
+    TASK_QUEUE_BACKEND: str = "rabbitmq"  # "memory" - очередь в памяти процесса (тесты, локальный запуск)
+    TASK_PUBLISHER_CHANNELS: int = 4
+    TASK_PUBLISH_BATCH: int = 100  # сообщений на одно ожидание подтверждений
+    TASK_PUBLISH_CONFIRM_TIMEOUT_SECONDS: float = 5.0
+    # Задачи больше стольких строк идут в полосу bulk: одна из TASK_BULK_SHARDS очередей
+    # ml_task_queue.bulk.<n> по хэшу пользователя (services/RabbitMQ/tasks.py)
+    TASK_INTERACTIVE_MAX_ROWS: int = 100
+    TASK_BULK_SHARDS: int = 4
+    # /prediction отправляет предсказание в очередь вместо расчета на месте, если строк
+    # не меньше PREDICTION_QUEUE_MIN_ROWS или в пуле CPU не меньше PREDICTION_QUEUE_LOAD_THRESHOLD
+    # выполняющихся и ждущих задач; 0 - порог выключен
+    PREDICTION_QUEUE_MIN_ROWS: int = 0
+    PREDICTION_QUEUE_LOAD_THRESHOLD: int = 0
     # @property
     # def DATABASE_URL_asyncpg(self):
     #     return f'postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}'
@@ -38,6 +150,13 @@ class Settings(BaseSettings):
             f'@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DB}'
         )
 
+    @property
+    def DATABASE_URL_aiomysql(self):
+        return (
+            f'mysql+aiomysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}'
+            f'@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DB}'
+        )
+
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding='utf-8',
@@ -1,15 +1,47 @@
 import database
 import sys
+from contextvars import ContextVar
+from typing import Dict, Optional
 from sqlmodel import SQLModel, Session, create_engine
 from database.config import get_settings
-from sqlalchemy import text
+from database.metrics import EngineMetrics
+from sqlalchemy import event, inspect
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from contextlib import contextmanager
+from pathlib import Path
 
 
-engine = create_engine(url=get_settings().DATABASE_URL_pymysql,
-                       echo=True,
-                       pool_size=5,
-                       max_overflow=10)
+def _metrics(name: str) -> EngineMetrics:
+    settings = get_settings()
+    return EngineMetrics(name, slow_query_ms=settings.DB_SLOW_QUERY_MS,
+                         slow_query_sample_rate=settings.DB_SLOW_QUERY_SAMPLE_RATE)
+
+
+def engine_options(url: str, metrics: EngineMetrics, is_async: bool = False) -> dict:
+    # Параметры пула из настроек; класс пула замеряет ожидание соединения (database/metrics.py).
+    # У aiosqlite соединения без пула (NullPool): размер, overflow и timeout не задаются
+    settings = get_settings()
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS
+    }
+    if is_async and url.startswith("sqlite"):
+        options["poolclass"] = metrics.pool_class(NullPool)
+    else:
+        options.update(
+            poolclass=metrics.pool_class(AsyncAdaptedQueuePool if is_async else QueuePool),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS
+        )
+    return options
+
+
+engine_metrics = _metrics("sync")
+_url = get_settings().DATABASE_URL or get_settings().DATABASE_URL_pymysql
+engine = create_engine(url=_url, **engine_options(_url, engine_metrics))
+engine_metrics.attach(engine)
 
 
 def get_database_engine():
@@ -18,28 +50,130 @@ def get_database_engine():
 
 @contextmanager
 def get_session():
+    # Для воркера и скриптов (with get_session() as session); в обработчиках FastAPI -
+    # зависимость get_async_session, одна сессия на запрос
     with Session(engine) as session:
         yield session
 
-def init_db(drop_all: bool = False) -> None:
-    # SQLModel.metadata.drop_all(engine)
-    # SQLModel.metadata.create_all(engine)
 
+class DbStats:
+    # Обращения к базе в пределах track_db_stats: выдачи соединений из пула и SQL-выражения
+    def __init__(self):
+        self.checkouts = 0
+        self.statements = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"checkouts": self.checkouts, "statements": self.statements}
+
+
+_db_stats: ContextVar[Optional[DbStats]] = ContextVar("db_stats", default=None)
+
+
+@contextmanager
+def track_db_stats():
+    # Счетчики видны задачам, созданным внутри блока, и потокам run_io (services/executors.py)
+    stats = DbStats()
+    token = _db_stats.set(stats)
     try:
-        engine = get_database_engine()
-        if drop_all:
-            with engine.begin() as conn:
-                # Отключаем проверку внешних ключей
-                conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
-                # Сначала удаляем таблицы с foreign keys
-                conn.execute(text("DROP TABLE IF EXISTS balance"))
-                conn.execute(text("DROP TABLE IF EXISTS trans"))
-                conn.execute(text("DROP TABLE IF EXISTS predictionresult"))
-                # Затем основную таблицу
-                conn.execute(text("DROP TABLE IF EXISTS user"))
-                conn.execute(text("DROP TABLE IF EXISTS events"))
-                # Включаем проверку обратно
-                conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
-        SQLModel.metadata.create_all(engine)
-    except Exception as e:
-        raise
\ No newline at end of file
+        yield stats
+    finally:
+        _db_stats.reset(token)
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    stats = _db_stats.get()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+
+
+def track_engine(sync_engine) -> None:
+    # Подсчет для движка; у асинхронного - для его sync_engine
+    event.listen(sync_engine, "checkout", _count_checkout)
+    event.listen(sync_engine, "before_cursor_execute", _count_statement)
+
+
+track_engine(engine)
+
+
+# Асинхронный движок создается по требованию: драйвер aiomysql (локально - aiosqlite)
+# нужен только асинхронным потребителям - обработчикам webview/app.py и routes/*,
+# services/RabbitMQ/async_worker.py
+_async_engine = None
+_async_session_factory = None
+async_engine_metrics = _metrics("async")
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        settings = get_settings()
+        url = settings.DATABASE_ASYNC_URL or settings.DATABASE_URL_aiomysql
+        _async_engine = create_async_engine(url=url, **engine_options(url, async_engine_metrics, is_async=True))
+        async_engine_metrics.attach(_async_engine.sync_engine)
+        track_engine(_async_engine.sync_engine)
+    return _async_engine
+
+
+def get_async_session_factory():
+    # Объекты остаются доступны после коммита и закрытия сессии (expire_on_commit=False):
+    # ленивой загрузки атрибутов в асинхронной сессии нет
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        from sqlmodel.ext.asyncio.session import AsyncSession
+        _async_session_factory = async_sessionmaker(get_async_engine(), class_=AsyncSession,
+                                                    expire_on_commit=False)
+    return _async_session_factory
+
+
+async def get_async_session():
+    # Зависимость FastAPI: одна асинхронная сессия на запрос - ее получают и зависимости
+    # авторизации, и обработчик (FastAPI вызывает зависимость один раз за запрос).
+    # Коммит - в обработчике; незакоммиченное при выходе откатывается
+    async with get_async_session_factory()() as session:
+        yield session
+
+
+def database_stats() -> Dict:
+    # Метрики пулов и запросов обоих движков (асинхронного - если он уже создан)
+    return {
+        "sync": engine_metrics.stats(),
+        "async": async_engine_metrics.stats() if _async_engine is not None else None
+    }
+
+def migrations_config(connection=None):
+    # Настройки alembic (alembic.ini, database/migrations); connection - выполнить на нем
+    from alembic.config import Config
+    config = Config(str(Path(__file__).resolve().parent.parent / "alembic.ini"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def migrate(connection, drop_all: bool = False) -> None:
+    # Схема - миграциями database/migrations до последней версии;
+    # drop_all - сначала откат всех миграций (удаление таблиц)
+    from alembic import command
+
+    config = migrations_config(connection)
+    tables = inspect(connection).get_table_names()
+    if "alembic_version" not in tables and "user" in tables:
+        # База создана SQLModel.metadata.create_all до миграций: помечается исходной схемой 0001,
+        # добавленное в модели позже 0002 досоздает, если его нет
+        command.stamp(config, "0001")
+    if drop_all:
+        command.downgrade(config, "base")
+    command.upgrade(config, "head")
+
+
+def init_db(drop_all: bool = False) -> None:
+    with get_database_engine().begin() as conn:
+        migrate(conn, drop_all)
@@ -0,0 +1,95 @@
+import sys
+from typing import Dict, List, Tuple
+
+# Проверка планов запросов веб-приложения: EXPLAIN для каждого запроса горячего пути,
+# ошибка - полный просмотр таблицы или индекса и сортировка без индекса.
+# Индексы для этих запросов - в миграциях database/migrations.
+# Запуск: python -m database.explain (код выхода 1, если есть проблемы)
+
+from datetime import datetime
+
+from sqlmodel import select
+
+import modelses.models  # noqa: F401 - модели для связей User
+from modelses.models import PredictionResult
+from modelses.transaction import Trans
+from modelses.user import User
+from services.crud.prediction import predictions_page_statement
+from services.crud.user import users_page_statement
+from services.pagination import encode_cursor
+
+
+def hot_queries(user_id: int = 1, email: str = "user@example.com") -> Dict:
+    # Те же выражения, что в webview/app.py и services/crud/*; страницы - с курсором,
+    # как запрос второй и следующих страниц
+    cursor = encode_cursor(datetime(2026, 1, 1), 1000)
+    return {
+        "latest prediction (index page)": select(PredictionResult).where(
+            PredictionResult.user_id == user_id
+        ).order_by(PredictionResult.created_at.desc()).limit(1),
+        "predictions page (/api/predictions)": predictions_page_statement(user_id, 50, cursor),
+        "user by email (login)": select(User).where(User.email == email),
+        "transactions of user": select(Trans).where(Trans.user_id == user_id).order_by(Trans.timestamp.desc()),
+        "users first page (/get_all_users)": users_page_statement(50),
+        "users page (/get_all_users)": users_page_statement(50, cursor)
+    }
+
+
+def explain(connection, statement) -> Tuple[List[str], List[str]]:
+    # Строки плана и найденные проблемы; SQLite - EXPLAIN QUERY PLAN, MySQL - EXPLAIN
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    dialect = connection.dialect.name
+    # С LIMIT перебор индекса в порядке ORDER BY останавливается после LIMIT строк
+    limited = " LIMIT " in sql.upper()
+    plan, problems = [], []
+    if dialect == "sqlite":
+        for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"):
+            detail = row[3]
+            plan.append(detail)
+            # SCAN - перебор всей таблицы или всего индекса, SEARCH - поиск по индексу
+            if detail.startswith("SCAN ") and not (limited and " INDEX " in detail):
+                problems.append(f"full scan: {detail}")
+            elif "TEMP B-TREE" in detail:
+                problems.append(f"sort without index: {detail}")
+    elif dialect == "mysql":
+        for row in connection.exec_driver_sql(f"EXPLAIN {sql}").mappings():
+            plan.append(f"{row['table']}: type={row['type']} key={row['key']} extra={row['Extra']}")
+            # ALL - перебор таблицы, index - перебор всего индекса
+            if row["type"] == "ALL" or (row["type"] == "index" and not limited):
+                problems.append(f"full scan of {row['table']} (type={row['type']})")
+            if row["Extra"] and "filesort" in row["Extra"]:
+                problems.append(f"sort without index on {row['table']}: {row['Extra']}")
+    else:
+        raise ValueError(f"EXPLAIN check is not implemented for {dialect}")
+    return plan, problems
+
+
+def check_query_plans(engine) -> Dict[str, List[str]]:
+    # Проблемы по запросам; пустой словарь - все запросы идут по индексам
+    failures = {}
+    with engine.connect() as connection:
+        for name, statement in hot_queries().items():
+            _, problems = explain(connection, statement)
+            if problems:
+                failures[name] = problems
+    return failures
+
+
+def main():
+    from database.databases import engine
+
+    failed = False
+    with engine.connect() as connection:
+        for name, statement in hot_queries().items():
+            plan, problems = explain(connection, statement)
+            failed = failed or bool(problems)
+            print(f"{'FAIL' if problems else 'ok  '} {name}")
+            for line in plan:
+                print(f"       {line}")
+            for problem in problems:
+                print(f"       ! {problem}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import event, exc
+
+slow_query_logger = logging.getLogger("database.slow_query")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_IN_LIST = re.compile(rf"\bIN\s*\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)(?:\s*,\s*\(\s*{_PLACEHOLDER}"
+                          rf"(?:\s*,\s*{_PLACEHOLDER})*\s*\))+")
+_ANY_PLACEHOLDER = re.compile(_PLACEHOLDER)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    # Вид запроса без значений: литералы и параметры -> ?, списки IN (...) и VALUES (...), (...)
+    # сворачиваются, чтобы запросы с разным числом значений попадали в одну группу
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _ANY_PLACEHOLDER.sub("?", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    statement = _VALUES_LIST.sub("(...)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def _percentiles(samples) -> Dict[str, Optional[float]]:
+    values = np.array(samples) * 1000
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(values, 50)), 2) if len(values) else None,
+        "p99": round(float(np.percentile(values, 99)), 2) if len(values) else None,
+        "max": round(float(values.max()), 2) if len(values) else None
+    }
+
+
+class EngineMetrics:
+    # Пул соединений и запросы одного движка: ожидание соединения из пула, занятые
+    # соединения и overflow, длительность выражений. Выражения дольше slow_query_ms
+    # собираются по нормализованному SQL (normalize_sql) и с вероятностью
+    # slow_query_sample_rate пишутся в лог database.slow_query - вместо echo всех запросов
+    def __init__(self, name: str, slow_query_ms: float = 200.0, slow_query_sample_rate: float = 1.0,
+                 samples: int = 1000, slow_queries: int = 100):
+        self.name = name
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.slow_query_sample_rate = slow_query_sample_rate
+        self.max_slow_queries = slow_queries
+        self._engine = None
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=samples)
+        self._durations = deque(maxlen=samples)
+        self._slow = OrderedDict()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.statements = 0
+        self.errors = 0
+        self.slow_statements = 0
+
+    def pool_class(self, base):
+        # Класс пула, который замеряет ожидание соединения (в SQLAlchemy нет события
+        # "до выдачи"). Пул, пересозданный после dispose(), того же класса
+        metrics = self
+
+        class TimedPool(base):
+            def _do_get(self):
+                started = time.perf_counter()
+                try:
+                    return super()._do_get()
+                except exc.TimeoutError:
+                    metrics.record_timeout()
+                    raise
+                finally:
+                    metrics.record_wait(time.perf_counter() - started)
+
+        TimedPool.__name__ = f"Timed{base.__name__}"
+        return TimedPool
+
+    def attach(self, sync_engine) -> None:
+        # Движок, созданный с pool_class(...); у асинхронного - его sync_engine
+        self._engine = sync_engine
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+        event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_execute)
+        event.listen(sync_engine, "handle_error", self._on_error)
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self._waits.append(seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.invalidated += 1
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        self.record_statement(statement, duration)
+
+    def _on_error(self, context) -> None:
+        # Выражение упало: after_cursor_execute не будет, убираем его время начала
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        with self._lock:
+            self.errors += 1
+
+    def record_statement(self, statement: str, duration: float) -> None:
+        with self._lock:
+            self.statements += 1
+            self._durations.append(duration)
+            if duration < self.slow_query_seconds:
+                return
+            self.slow_statements += 1
+            sql = normalize_sql(statement)
+            entry = self._slow.pop(sql, None) or {"sql": sql, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] += duration * 1000
+            entry["max_ms"] = max(entry["max_ms"], duration * 1000)
+            # Недавние выражения в конце; самое давнее вытесняется
+            self._slow[sql] = entry
+            if len(self._slow) > self.max_slow_queries:
+                self._slow.popitem(last=False)
+        if random.random() < self.slow_query_sample_rate:
+            slow_query_logger.warning(f"[{self.name}] {duration * 1000:.1f} ms: {sql}")
+
+    def pool_stats(self) -> Dict:
+        # Текущее состояние пула; у NullPool (aiosqlite) размера и overflow нет
+        pool = self._engine.pool if self._engine is not None else None
+        if pool is None:
+            return {}
+        state = {"class": type(pool).__name__}
+        if hasattr(pool, "checkedout"):
+            state.update(
+                size=pool.size(),
+                in_use=pool.checkedout(),
+                idle=pool.checkedin(),
+                # До заполнения пула QueuePool.overflow() отрицательный
+                overflow=max(pool.overflow(), 0)
+            )
+        return state
+
+    def stats(self, top: int = 10) -> Dict:
+        with self._lock:
+            waits, durations = list(self._waits), list(self._durations)
+            slow = sorted(self._slow.values(), key=lambda entry: entry["total_ms"], reverse=True)[:top]
+            counters = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "statements": self.statements,
+                "errors": self.errors,
+                "slow_statements": self.slow_statements
+            }
+        return {
+            "pool": self.pool_stats(),
+            **counters,
+            "checkout_wait_ms": _percentiles(waits),
+            "statement_ms": _percentiles(durations),
+            "slow_queries": [
+                {**entry, "total_ms": round(entry["total_ms"], 2), "max_ms": round(entry["max_ms"], 2)}
+                for entry in slow
+            ]
+        }
@@ -0,0 +1,79 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# Исходная схема, которую создавал SQLModel.metadata.create_all (init_db) до версий моделей,
+# ключей идемпотентности и задач очереди - они добавлены в 0002. База, созданная через
+# create_all, помечается этой версией (alembic stamp 0001) и обновляется дальше
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("username", sqlmodel.AutoString(), nullable=False),
+        sa.Column("email", sqlmodel.AutoString(), nullable=False),
+        sa.Column("password_hash", sqlmodel.AutoString(), nullable=False),
+        sa.Column("is_admin", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("balance", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id")
+    )
+    op.create_table(
+        "balance",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.user_id"]),
+        sa.PrimaryKeyConstraint("user_id")
+    )
+    op.create_table(
+        "events",
+        sa.Column("event_id", sa.Integer(), nullable=False),
+        sa.Column("description", sqlmodel.AutoString(), nullable=False),
+        sa.Column("creator_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["creator_id"], ["user.user_id"]),
+        sa.PrimaryKeyConstraint("event_id")
+    )
+    op.create_table(
+        "predictionresult",
+        sa.Column("prediction_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("prediction_rez", sqlmodel.AutoString(), nullable=False),
+        sa.Column("cost", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.user_id"]),
+        sa.PrimaryKeyConstraint("prediction_id")
+    )
+    op.create_table(
+        "trans",
+        sa.Column("transaction_id", sqlmodel.AutoString(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("transaction_type", sqlmodel.AutoString(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.user_id"]),
+        sa.PrimaryKeyConstraint("transaction_id")
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("trans")
+    op.drop_table("predictionresult")
+    op.drop_table("events")
+    op.drop_table("balance")
+    op.drop_table("user")
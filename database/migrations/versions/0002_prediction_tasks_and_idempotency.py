@@ -0,0 +1,60 @@
+"""model versions, idempotency keys and prediction tasks
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# То, что добавлялось в модели после исходной схемы 0001: версия модели результата,
+# ключ идемпотентности задачи (services/RabbitMQ/idempotency.py) и таблица задач очереди.
+# База, созданная через create_all на любом шаге и помеченная 0001 (init_db), может уже
+# содержать часть этого - добавляется только недостающее
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("predictionresult")}
+    # SQLite не добавляет ограничение к существующей таблице - batch пересоздает ее
+    with op.batch_alter_table("predictionresult") as batch:
+        if "model_version" not in columns:
+            batch.add_column(sa.Column("model_version", sqlmodel.AutoString(), nullable=True))
+        if "idempotency_key" not in columns:
+            batch.add_column(sa.Column("idempotency_key", sqlmodel.AutoString(length=64), nullable=True))
+            batch.create_unique_constraint("uq_predictionresult_idempotency_key", ["idempotency_key"])
+
+    if "predictiontask" not in inspector.get_table_names():
+        op.create_table(
+            "predictiontask",
+            sa.Column("task_id", sqlmodel.AutoString(length=32), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("status", sqlmodel.AutoString(length=16), nullable=False),
+            sa.Column("prediction_id", sa.Integer(), nullable=True),
+            sa.Column("error", sqlmodel.AutoString(length=255), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["prediction_id"], ["predictionresult.prediction_id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["user.user_id"]),
+            sa.PrimaryKeyConstraint("task_id")
+        )
+        op.create_index("ix_predictiontask_user_id", "predictiontask", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_predictiontask_user_id", table_name="predictiontask")
+    op.drop_table("predictiontask")
+    with op.batch_alter_table("predictionresult") as batch:
+        batch.drop_constraint("uq_predictionresult_idempotency_key", type_="unique")
+        batch.drop_column("idempotency_key")
+        batch.drop_column("model_version")
@@ -0,0 +1,66 @@
+"""indexes for hot query paths
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# Составные индексы под запросы веб-приложения (проверка планов - database/explain.py):
+# результаты пользователя по времени (главная страница, /api/predictions),
+# вход по email (уникальный), история операций пользователя.
+# MySQL удаляет созданный для внешнего ключа индекс по user_id, когда появляется
+# составной индекс, который начинается с user_id.
+# База из create_all текущих моделей, помеченная 0001 (init_db), уже содержит эти индексы -
+# создаются и удаляются только те, что есть или которых нет
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _indexes(table: str) -> set:
+    # В офлайн-режиме (--sql) базы нет - считаем, что индексов нет
+    if context.is_offline_mode():
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _create_index(name: str, table: str, columns, **kwargs) -> None:
+    if name not in _indexes(table):
+        op.create_index(name, table, columns, **kwargs)
+
+
+def _drop_index(name: str, table: str) -> None:
+    if context.is_offline_mode() or name in _indexes(table):
+        op.drop_index(name, table_name=table)
+
+
+def upgrade() -> None:
+    # Уникальный индекс не создастся, если email уже повторяются - сообщаем какие
+    if not context.is_offline_mode():
+        user = sa.table("user", sa.column("email"))
+        duplicates = op.get_bind().execute(
+            sa.select(user.c.email).group_by(user.c.email).having(sa.func.count() > 1)
+        ).scalars().all()
+        if duplicates:
+            raise RuntimeError(f"Duplicate user emails, resolve before upgrading: {duplicates}")
+
+    _create_index("ix_user_email", "user", ["email"], unique=True)
+    _create_index("ix_predictionresult_user_id_created_at", "predictionresult", ["user_id", "created_at"])
+    _create_index("ix_trans_user_id_timestamp", "trans", ["user_id", "timestamp"])
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "mysql":
+        # Внешнему ключу нужен индекс по user_id, иначе MySQL не даст удалить составной
+        _create_index("ix_trans_user_id", "trans", ["user_id"])
+        _create_index("ix_predictionresult_user_id", "predictionresult", ["user_id"])
+    _drop_index("ix_trans_user_id_timestamp", "trans")
+    _drop_index("ix_predictionresult_user_id_created_at", "predictionresult")
+    _drop_index("ix_user_email", "user")
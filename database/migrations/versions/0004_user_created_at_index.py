@@ -0,0 +1,36 @@
+"""index for the paginated user list
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# Список пользователей по страницам, новые первыми (services/crud/user.py: users_page_statement).
+# Первичный ключ входит в запись индекса (InnoDB, rowid в SQLite) - порядок (created_at, user_id)
+# берется из индекса без сортировки. В базе из create_all текущих моделей индекс уже есть
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_index() -> bool:
+    if context.is_offline_mode():
+        return False
+    return "ix_user_created_at" in {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("user")}
+
+
+def upgrade() -> None:
+    if not _has_index():
+        op.create_index("ix_user_created_at", "user", ["created_at"])
+
+
+def downgrade() -> None:
+    if context.is_offline_mode() or _has_index():
+        op.drop_index("ix_user_created_at", table_name="user")
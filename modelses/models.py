@@ -1,32 +1,83 @@
 import modelses
 from datetime import datetime
 from enum import Enum
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Sequence, Union
 import re
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from modelses.balance import Balance, BalanceService
 from modelses.user import User
 import json
 import random
 import numpy as np
-from sklearn import datasets
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-import pandas as pd
+
+
+# Признаки модели и названия классов (последний - для неизвестного индекса)
+FEATURES = ("petal_length", "petal_width")
+LABELS = np.array(["setosa", "versicolor", "virginica", "unknown"])
 
 
 class MLModel(): # Класс ML модели
-    def __init__(self):
+    def __init__(self, use_artifact: bool = True, artifact_dir: Optional[str] = None,
+                 version: Optional[str] = None):
         self._model = None
+        self._kernel = None
+        self._cache = None
+        self._grid = None
         self._is_trained = False
-        self._train_model()
+        self._frozen = False
+        self.version = None
+        self.source = None
+        if not use_artifact or not self._load_artifact(artifact_dir, version):
+            self._train_model()
+        self._build_kernel()
+
+    def freeze(self) -> None:
+        # Экземпляр из реестра общий для всего процесса и не должен меняться
+        self._frozen = True
+
+    def enable_cache(self, cache) -> None:
+        # Кэш предсказаний перед моделью (services/ml/cache.py)
+        self._cache = cache
+
+    def enable_grid(self, grid) -> None:
+        # Режим таблицы решений (services/ml/lookup.py)
+        self._grid = grid
+
+    def invalidate_cache(self) -> None:
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _build_kernel(self) -> None:
+        # Для линейных моделей предсказание идет через ядро на NumPy,
+        # для остальных оценщиков - через sklearn
+        from services.ml.kernels import LinearKernel
+        self._kernel = LinearKernel.from_estimator(self._model) if self._model is not None else None
+
+    def _load_artifact(self, artifact_dir: Optional[str] = None, version: Optional[str] = None) -> bool:
+        # Загрузка готовой модели из артефакта, обучение не требуется
+        from services.ml.artifacts import load_artifact
+
+        loaded = load_artifact(root=artifact_dir, version=version)
+        if loaded is None:
+            return False
+
+        self._model, meta = loaded
+        self.version = meta["version"]
+        self.source = "artifact"
+        self._is_trained = True
+        return True
 
     def _train_model(self):
-        # Обучение модели
+        # Обучение модели (запасной путь, если артефакт не экспортирован)
         if self._is_trained:
             return
 
+        import pandas as pd
+        from sklearn import datasets
+        from sklearn.model_selection import train_test_split
+        from sklearn.linear_model import LogisticRegression
+
         data = datasets.load_iris()
         df = pd.DataFrame(data.data, columns=data.feature_names)
         df['target'] = data.target
@@ -44,6 +95,8 @@ class MLModel(): # Класс ML модели
         self._model = LogisticRegression()
         self._model.fit(X_train, y_train)
         self._is_trained = True
+        self.version = "untracked"
+        self.source = "trained"
 
     def predict(self, data: List[Dict]) -> List[Dict]:
         # Случайный цвет для каждого элемента
@@ -52,32 +105,103 @@ class MLModel(): # Класс ML модели
         #return [{"prediction": "example"} for i in data]
 
         # Предсказание цвета лепестка ириса
-        if not self._is_trained:
-            self._train_model()
-
         if not data:
             return []
 
-        # Преобразуем входные данные в формат для модели
-        features = []
-        for item in data:
-            # Ожидаем данные в формате: [{"petal_length": 1.4, "petal_width": 0.2}, ...]
-            petal_length = item.get('petal_length', 0.0)
-            petal_width = item.get('petal_width', 0.0)
-            features.append([petal_length, petal_width])
-
-        # Делаем предсказание
-        predictions = self._model.predict(features)
-
-        # Преобразуем числовые предсказания в названия цветов
-        result = []
-        classes = ["setosa", "versicolor", "virginica"]
-        for pred in predictions:
-            label = classes[int(pred)] if 0 <= int(pred) < len(classes) else "unknown"
-            result.append({"color": label})
-
-        return result
+        # Ожидаем данные в формате: [{"petal_length": 1.4, "petal_width": 0.2}, ...]
+        columns = {name: [item.get(name, 0.0) for item in data] for name in FEATURES}
+        return self.predict_columns(columns, as_records=True)
 
+    def predict_columns(self, features: Union[np.ndarray, Dict[str, Sequence[float]]],
+                        as_records: bool = False) -> Union[np.ndarray, List[Dict]]:
+        # Векторное предсказание: матрица (n, 2) или словарь колонок
+        # {"petal_length": [...], "petal_width": [...]}; без циклов по строкам
+        if not self._is_trained:
+            self._train_model()
+            self._build_kernel()
+
+        X = self._to_matrix(features)
+        if X.shape[0] == 0:
+            labels = LABELS[:0]
+        elif self._cache is not None and X.shape[0] <= self._cache.max_batch_rows:
+            labels = self._predict_cached(X)
+        else:
+            labels = self._predict_matrix(X)
+
+        if as_records:
+            return [{"color": label} for label in labels.tolist()]
+        return labels
+
+    def _predict_matrix(self, X: np.ndarray) -> np.ndarray:
+        if self._grid is None:
+            return self._to_labels(self._raw_predict(X))
+
+        # Точки вне сетки считаются моделью
+        inside = self._grid.contains(X)
+        if inside.all():
+            return self._to_labels(self._grid.predict(X))
+        predictions = np.empty(len(X), dtype=np.intp)
+        predictions[inside] = self._grid.predict(X[inside])
+        predictions[~inside] = self._raw_predict(X[~inside])
+        return self._to_labels(predictions)
+
+    def _raw_predict(self, X: np.ndarray) -> np.ndarray:
+        if self._kernel is not None:
+            return self._kernel.predict(X)
+        return self._model.predict(X)
+
+    def _predict_cached(self, X: np.ndarray) -> np.ndarray:
+        # Через кэш идут только строки, которые нормализация (округление) не меняет -
+        # значения формы с шагом 0.1. Остальные модель считает по исходным признакам
+        # в обход кэша, поэтому результат с кэшем и без него совпадает
+        cache = self._cache
+        labels = np.empty(len(X), dtype=LABELS.dtype)
+        cacheable = (cache.normalize(X) == X).all(axis=1)
+        if not cacheable.all():
+            labels[~cacheable] = self._predict_matrix(X[~cacheable])
+        indices = np.flatnonzero(cacheable)
+        rows = [tuple(row) for row in X[indices].tolist()]
+
+        missing = []
+        for i, row in zip(indices.tolist(), rows):
+            label = cache.get(self.version, row)
+            if label is None:
+                missing.append(i)
+            else:
+                labels[i] = label
+
+        if missing:
+            computed = self._predict_matrix(X[missing])
+            labels[missing] = computed
+            for i, label in zip(missing, computed.tolist()):
+                cache.put(self.version, tuple(X[i].tolist()), label)
+        return labels
+
+    @staticmethod
+    def _to_matrix(features: Union[np.ndarray, Dict[str, Sequence[float]]]) -> np.ndarray:
+        if isinstance(features, dict):
+            n_rows = max((len(column) for column in features.values()), default=0)
+            X = np.empty((n_rows, len(FEATURES)), dtype=np.float64)
+            for i, name in enumerate(FEATURES):
+                # Отсутствующий признак, как и раньше, считается нулем
+                column = features.get(name)
+                X[:, i] = 0.0 if column is None else np.asarray(column, dtype=np.float64)
+            return X
+
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != len(FEATURES):
+            raise ValueError(f"Expected features with shape (n, {len(FEATURES)}), got {X.shape}")
+        return X
+
+    @staticmethod
+    def _to_labels(predictions: np.ndarray) -> np.ndarray:
+        # Индексы вне диапазона классов отображаются в "unknown" (последний элемент LABELS)
+        index = np.asarray(predictions).astype(np.intp, copy=False)
+        unknown = len(LABELS) - 1
+        index = np.where((index >= 0) & (index < unknown), index, unknown)
+        return LABELS[index]
 
     def get_cost_predict(self) -> float:
         # Стоимость предсказания
@@ -85,15 +209,27 @@ class MLModel(): # Класс ML модели
 
     def reset_training(self) -> None:
         # Сброс обучения модели для возможности переобучения
+        if self._frozen:
+            raise RuntimeError("Shared model is read-only, reload it through the model registry")
         self._is_trained = False
         self._model = None
+        self._kernel = None
+        self._grid = None
+        self.invalidate_cache()
 
 class PredictionResult (SQLModel, table=True):
+    # Главная страница и /api/predictions: результаты пользователя, новые первыми
+    __table_args__ = (Index("ix_predictionresult_user_id_created_at", "user_id", "created_at"),)
+
     prediction_id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.user_id")
     prediction_rez: str # JSON строка
     cost: float
+    model_version: Optional[str] = Field(default=None)  # версия модели, сделавшей предсказание
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Ключ задачи очереди: повторная доставка не создает второй результат
+    # и не списывает средства (services/RabbitMQ/idempotency.py)
+    idempotency_key: Optional[str] = Field(default=None, max_length=64, unique=True)
 
     user: Optional["User"] = Relationship(back_populates="predictions")
 
@@ -130,33 +266,67 @@ class Predictions:
         self.balance.deposit(user, -cost)
         return prediction_result
 
+async def _run_inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
 class MLModelService:
-    def __init__(self, balance_service: BalanceService):
-        # Инициализация модели Iris
-        self.imodel = MLModel()
+    def __init__(self, balance_service: BalanceService, ml_model: Optional[MLModel] = None):
+        # Общая модель Iris из реестра процесса (без переобучения на каждый запрос)
+        if ml_model is None:
+            from services.ml.registry import get_model
+            ml_model = get_model()
+        self.imodel = ml_model
         self.balance_service = balance_service
         #self.predictions = (Predictions(self.imodel, balance))
 
     def make_prediction(self, user: User, data: List[Dict]) -> List[Dict]:
+        cost = self._check_credits(user)
+        predictions = self.imodel.predict(data)
+        self._charge(user, cost)
+        return predictions
+
+    async def make_prediction_batched(self, user: User, data: List[Dict], batcher,
+                                      run_io=None) -> List[Dict]:
+        # То же, что make_prediction, но строки уходят в общий микро-батч (services/ml/batcher.py),
+        # а обращения к балансу - в run_io (пул потоков, services/executors.py)
+        run_io = run_io or _run_inline
+        cost = await run_io(self._check_credits, user)
+        predictions = await batcher.predict(data, model=self.imodel)
+        await run_io(self._charge, user, cost)
+        return predictions
+
+    async def make_prediction_batched_async(self, user: User, data: List[Dict], batcher) -> List[Dict]:
+        # То же с асинхронным сервисом баланса (AsyncBalanceService в webview/app.py)
+        cost = self.imodel.get_cost_predict()
+        if await self.balance_service.get_balance(user) < cost:
+            raise ValueError("Not enough credits")
+        predictions = await batcher.predict(data, model=self.imodel)
+        if not await self.balance_service.withdraw(user, cost):
+            raise ValueError("Withdrawal failed")
+        return predictions
+
+    def _check_credits(self, user: User) -> float:
         cost = self.imodel.get_cost_predict()
 
         # Используем методы объекта balance_service
         balance = self.balance_service.get_balance(user)
         if balance < cost:
             raise ValueError("Not enough credits")
+        return cost
 
-        predictions = self.imodel.predict(data)
-
+    def _charge(self, user: User, cost: float) -> None:
         # Списание средств (нужно передать session)
         # self.balance_obj.update_balance(-cost, session)
         success = self.balance_service.withdraw(user, cost)
         if not success:
             raise ValueError("Withdrawal failed")
-        return predictions
 
         #prediction_result = self.predictions.make_predict(user, data)
         #return prediction_result.get_prediction_rez()
 
     def reset_model(self) -> None:
-        # Сброс модели для переобучения
-        self.ml_model.reset_training()
+        # Переобучение в фоне (services/ml/lifecycle.py); текущие запросы
+        # дорабатывают на старой модели, новые получат новую после подмены
+        from services.ml.lifecycle import get_lifecycle
+        get_lifecycle().retrain()
@@ -0,0 +1,27 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlmodel import SQLModel, Field
+
+
+class TaskStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+# Статусы, после которых задача больше не меняется
+TERMINAL_STATUSES = (TaskStatus.DONE.value, TaskStatus.FAILED.value)
+
+
+class PredictionTask(SQLModel, table=True): # Задача предсказания в очереди ml_task_queue
+    task_id: str = Field(primary_key=True, max_length=32)
+    user_id: int = Field(foreign_key="user.user_id", index=True)
+    status: str = Field(default=TaskStatus.QUEUED.value, max_length=16)
+    prediction_id: Optional[int] = Field(default=None, foreign_key="predictionresult.prediction_id")
+    error: Optional[str] = Field(default=None, max_length=255)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
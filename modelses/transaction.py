@@ -4,7 +4,7 @@ from datetime import datetime
 from enum import Enum
 from typing import List, Dict, Optional
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, String
 import re
 #import bcrypt
 
@@ -14,6 +14,9 @@ class TransactionType(str, Enum):
     # Можно добавить другие типы по необходимости
 
 class Trans(SQLModel, table=True):
+    # История операций пользователя по времени (database/migrations)
+    __table_args__ = (Index("ix_trans_user_id_timestamp", "user_id", "timestamp"),)
+
     transaction_id: str = Field(primary_key=True)
     user_id: int = Field(foreign_key="user.user_id")
     amount: float
@@ -19,10 +19,10 @@ class User(SQLModel, table=True):
     __tablename__ = "user"
     user_id: int = Field(default=None, primary_key=True)
     username: str
-    email: str
+    email: str = Field(index=True, unique=True)  # вход по email
     password_hash: str
     is_admin: bool = Field(default=False)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # список пользователей
     balance: float = Field(default=0.0)
 
     # Связи с другими моделями
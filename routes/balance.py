@@ -1,17 +1,20 @@
 import modelses, services, services
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlmodel import Session
 from typing import Dict
 from modelses.user import User
 from modelses.balance import Balance, BalanceUpdate
-from services.balance import BalanceService
-from database.databases import get_session
+from services.balance import AsyncBalanceService
+from database.databases import get_async_session
 import logging
 
 
 balance_router = APIRouter()
 logger = logging.getLogger(__name__)
 
+
+async def get_balance_service(session=Depends(get_async_session)) -> AsyncBalanceService:
+    return AsyncBalanceService(session)
+
 @balance_router.get(
     "/{user_id}",
     response_model=Dict[str, float],
@@ -24,11 +27,11 @@ logger = logging.getLogger(__name__)
 )
 async def get_balance(
         user_id: int,
-        balance_service: BalanceService = Depends(lambda: BalanceService())
+        balance_service: AsyncBalanceService = Depends(get_balance_service)
 ) -> Dict[str, float]:
     try:
-        user = User(id=user_id)
-        balance = balance_service.get_balance(user)
+        user = User(user_id=user_id)
+        balance = await balance_service.get_balance(user)
         return {"balance": balance}
     except Exception as e:
         logger.error(f"Ошибка при получении баланса: {str(e)}")
@@ -48,11 +51,11 @@ async def get_balance(
 )
 async def deposit_up(
         data: BalanceUpdate,
-        balance_service: BalanceService = Depends(lambda: BalanceService())
+        balance_service: AsyncBalanceService = Depends(get_balance_service)
 ) -> Dict[str, str]:
     try:
-        user = User(id=data.user_id)
-        balance_service.deposit(user, data.amount)
+        user = User(user_id=data.user_id)
+        await balance_service.deposit(user, data.amount)
         logger.info(f"Баланс пользователя {data.user_id} пополнен на сумму {data.amount}")
         return {"message": "Баланс успешно пополнен"}
     except Exception as e:
@@ -75,22 +78,18 @@ async def deposit_up(
 )
 async def balance_reduction(
         data: BalanceUpdate,
-        session: Session = Depends(get_session),
-        balance_service: BalanceService = Depends(lambda: BalanceService())
+        balance_service: AsyncBalanceService = Depends(get_balance_service)
 ) -> Dict[str, str]:
     try:
-        user = User(id=data.user_id)
-        current_balance = balance_service.get_balance(user)
+        user = User(user_id=data.user_id)
 
-        if current_balance < data.amount:
+        # Списание средств с записью в историю транзакций
+        if not await balance_service.withdraw(user, data.amount):
             raise HTTPException(
                 status_code=status.HTTP_402_PAYMENT_REQUIRED,
                 detail="Недостаточно средств"
             )
 
-        # Списание средств
-        balance_service.deposit(user, -data.amount)
-
         logger.info(f"Списание с баланса пользователя {data.user_id} суммы {data.amount}")
         return {"message": "Средства успешно списаны"}
     except HTTPException:
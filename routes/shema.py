@@ -1,9 +1,9 @@
 import modelses, services, database
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Dict
 from modelses.models import MLModel, PredictionResult
-from database.databases import get_session
+from database.databases import get_async_session
 import logging, random
 
 model_router = APIRouter()
@@ -24,7 +24,7 @@ COLORS = ["красный", "синий", "желтый", "зеленый", "ф
     }
 )
 async def get_models(
-        session: Session = Depends(get_session)
+        session: AsyncSession = Depends(get_async_session)
 ) -> List[MLModel]:
     try:
         return [
@@ -50,7 +50,7 @@ async def get_models(
 )
 async def make_prediction(
         request: PredictionResult,
-        session: Session = Depends(get_session)
+        session: AsyncSession = Depends(get_async_session)
 ) -> PredictionResult:
     try:
         # 1. Проверка баланса пользователя
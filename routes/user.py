@@ -1,10 +1,12 @@
 import database, services, modelses
 from fastapi import APIRouter, HTTPException, status, Depends
-from database.databases import get_session
+from database.config import get_settings
+from database.databases import get_async_session
 from modelses.user import User
 from services.crud import user as UserService
+from services.pagination import InvalidCursor, clamp_limit
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 from sqlmodel import Session
 
@@ -31,6 +33,11 @@ class UserCreateSchema(BaseModel):
     password: str
     username: str
 
+# Страница списка пользователей и курсор следующей
+class UsersPage(BaseModel):
+    users: List[User]
+    next_cursor: Optional[str] = None
+
 user_route = APIRouter()
 
 @user_route.post(
@@ -40,10 +47,10 @@ user_route = APIRouter()
     summary="Регистрация пользователя",
     description="Регистрация нового пользователя с email и паролем"
 )
-async def signup(data: UserCreateSchema, session=Depends(get_session)) -> Dict[str, str]:
+async def signup(data: UserCreateSchema, session=Depends(get_async_session)) -> Dict[str, str]:
     try:
         # Проверка существования пользователя по email
-        existing_user = UserService.get_user_by_email(data.email, session)
+        existing_user = await UserService.get_user_by_email_async(data.email, session)
         if existing_user:
             logger.warning(f"Попытка регистрации с существующим email: {data.email}")
             raise HTTPException(
@@ -61,7 +68,7 @@ async def signup(data: UserCreateSchema, session=Depends(get_session)) -> Dict[s
             username=data.username
         )
 
-        UserService.create_user(user, session)
+        await UserService.create_user_async(user, session)
         logger.info(f"Новый пользователь зарегистрирован: {data.email}")
         return {"message": "Пользователь успешно зарегистрирован"}
 
@@ -75,9 +82,9 @@ async def signup(data: UserCreateSchema, session=Depends(get_session)) -> Dict[s
         )
 
 @user_route.post('/signin')
-async def signin(data: UserCreateSchema, session=Depends(get_session)) -> Dict[str, str]:
+async def signin(data: UserCreateSchema, session=Depends(get_async_session)) -> Dict[str, str]:
     try:
-        user = UserService.get_user_by_email(data.email, session)
+        user = await UserService.get_user_by_email_async(data.email, session)
         if user is None:
             logger.warning(f"Попытка входа с несуществующим email: {data.email}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
@@ -100,15 +107,20 @@ async def signin(data: UserCreateSchema, session=Depends(get_session)) -> Dict[s
 
 @user_route.get(
     "/get_all_users",
-    response_model=List[User],
+    response_model=UsersPage,
     summary="Получить всех пользователей",
-    response_description="Список пользователей"
+    response_description="Страница пользователей, новые первыми; следующая - с cursor=next_cursor"
 )
-async def get_all_users(session=Depends(get_session)) -> List[User]:
+async def get_all_users(limit: Optional[int] = None, cursor: Optional[str] = None,
+                        session=Depends(get_async_session)) -> UsersPage:
+    settings = get_settings()
+    limit = clamp_limit(limit, settings.PAGE_LIMIT_DEFAULT, settings.PAGE_LIMIT_MAX)
     try:
-        users = UserService.get_all_users(session)
+        users, next_cursor = await UserService.get_users_page_async(session, limit, cursor)
         logger.info(f"Получено {len(users)} пользователей")
-        return users
+        return UsersPage(users=users, next_cursor=next_cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Ошибка при получении пользователей: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+from collections import Counter
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import select, update
+
+from modelses.balance import Balance
+from modelses.models import PredictionResult
+from modelses.task import TaskStatus
+from services.RabbitMQ.batching import (
+    ACK_OUTCOMES, DONE, FAILED, INVALID, NO_CREDITS_ERROR, OUTCOME_ERRORS, REJECTED, task_status
+)
+from services.RabbitMQ.codec import JSON, Task, decode_task
+from services.RabbitMQ.idempotency import SeenKeys, idempotency_key_of
+from services.RabbitMQ.retry import RETRY, RetryPolicy
+from services.RabbitMQ.scheduling import DeficitRoundRobin
+from services.RabbitMQ.tasks import (
+    BULK, EVENTS_EXCHANGE, INTERACTIVE, QUEUE_HEADER, TASK_QUEUE, USER_ID_HEADER, event_body, failed_update,
+    lane_of, results_update, retry_update, running_update, task_id_of, task_queues
+)
+
+
+rabbitmq_host = os.getenv('RABBITMQ_HOST', 'localhost')
+
+
+class AsyncWorker:
+    # Асинхронный воркер: до concurrency сообщений обрабатываются одновременно,
+    # медленный коммит одного сообщения не останавливает остальные.
+    # Контракт очереди тот же, что у worker.py; подтверждение - после обработки:
+    # DONE и REJECTED - ack, INVALID и FAILED - reject без возврата в очередь или route_failure.
+    # messages - асинхронный итератор сообщений с body, delivery_tag, ack() и reject()
+    # (aio_pika.IncomingMessage или фейковый брокер в тестах).
+    # route_failure(message, error, retryable) -> RETRY/DEAD перекладывает INVALID и FAILED
+    # в очередь повтора или DLQ (services/RabbitMQ/retry.py), после чего сообщение подтверждается.
+    # finish(task_id, outcome, decision, error) вызывается после подтверждения сообщений с task_id:
+    # статус неразобранных и упавших задач и событие (services/RabbitMQ/tasks.py)
+    def __init__(self, process: Callable[[Task], Awaitable[str]], concurrency: int = 16,
+                 finish: Optional[Callable[..., Awaitable[None]]] = None,
+                 route_failure: Optional[Callable[..., Awaitable[str]]] = None):
+        self.process = process
+        self.concurrency = max(int(concurrency), 1)
+        self.finish = finish
+        self.route_failure = route_failure
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._tasks = set()
+        self.outcomes: Counter = Counter()
+
+    async def run(self, messages: AsyncIterator) -> None:
+        try:
+            async for message in messages:
+                # Обратное давление: новое сообщение берется, только когда освободился слот.
+                # Брокер при этом не отдает больше prefetch_count = concurrency сообщений
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._handle(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            await self.drain()
+
+    async def drain(self) -> None:
+        # Дожидаемся сообщений, которые уже в обработке
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def _handle(self, message) -> None:
+        task_id = task_id_of(message)
+        error = None
+        decision = None
+        try:
+            try:
+                task = decode_task(message.delivery_tag, message.body,
+                                   getattr(message, "content_type", None), task_id, idempotency_key_of(message))
+            except Exception as e:
+                # Любая ошибка разбора - некорректное сообщение: оно подтверждается через settle
+                # и не занимает слот prefetch навсегда
+                print(f"Ошибка при разборе сообщения: {e}")
+                outcome = INVALID
+                error = f"{OUTCOME_ERRORS[INVALID]}: {e}"
+            else:
+                try:
+                    outcome = await self.process(task)
+                except Exception as e:
+                    print(f'Ошибка при обработке предсказания: {e}')
+                    outcome = FAILED
+                    error = f"{OUTCOME_ERRORS[FAILED]}: {e}"
+
+            self.outcomes[outcome] += 1
+            if outcome in ACK_OUTCOMES:
+                await message.ack()
+            elif self.route_failure is not None:
+                try:
+                    decision = await self.route_failure(message, error, outcome == FAILED)
+                    await message.ack()
+                except Exception as e:
+                    # Брокер не принял копию: сообщение возвращается в очередь как есть
+                    print(f'Ошибка при отправке сообщения на повтор: {e}')
+                    decision = RETRY
+                    await message.reject(requeue=True)
+            else:
+                await message.reject(requeue=False)
+
+            if self.finish is not None and task_id:
+                try:
+                    await self.finish(task_id, outcome, decision, error)
+                except Exception as e:
+                    print(f'Ошибка при завершении задачи {task_id}: {e}')
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> Dict:
+        return {"in_flight": self.in_flight, "concurrency": self.concurrency, **self.outcomes}
+
+
+async def lane_messages(queues, scheduler: DeficitRoundRobin) -> AsyncIterator:
+    # Сообщения всех полос в очередности планировщика (services/RabbitMQ/scheduling.py):
+    # брокер отдает каждой полосе до prefetch сообщений, выбор следующего - по полосе и пользователю
+    ready = asyncio.Event()
+
+    async def on_message(message) -> None:
+        headers = message.headers or {}
+        scheduler.push((lane_of(message), headers.get(USER_ID_HEADER)), message, len(message.body))
+        ready.set()
+
+    for queue in queues:
+        await queue.consume(on_message)
+    while True:
+        if not len(scheduler):
+            ready.clear()
+            await ready.wait()
+            continue
+        yield scheduler.pop()[0]
+
+
+async def process_message(session_factory: Callable, task: Task, model,
+                          seen: Optional[SeenKeys] = None) -> str:
+    # Одно сообщение в асинхронной сессии. Списание - атомарный UPDATE с проверкой
+    # остатка, поэтому параллельные сообщения одного пользователя не теряют списаний.
+    # Статус задачи с task_id записывается в той же транзакции.
+    # Повторная доставка (ключ в seen или в БД) подтверждается без списания
+    # (services/RabbitMQ/idempotency.py)
+    if seen is not None and task.key in seen:
+        print(f'Повторная доставка задачи {task.key}, пропущена без обращения к БД')
+        return DONE
+
+    if task.task_id:
+        async with session_factory() as session:
+            await session.execute(running_update([task.task_id]))
+            await session.commit()
+
+    # Инференс синхронный - в потоке, чтобы не останавливать остальные сообщения в event loop
+    labels = (await asyncio.to_thread(model.predict_columns, task.X)).tolist() if len(task.X) else []
+
+    cost = model.get_cost_predict()
+    async with session_factory() as session:
+        if task.key:
+            existing = await session.execute(
+                select(PredictionResult.prediction_id).where(PredictionResult.idempotency_key == task.key)
+            )
+            if existing.first() is not None:
+                print(f'Повторная доставка задачи {task.key}, списание пропущено')
+                if seen is not None:
+                    seen.add([task.key])
+                return DONE
+
+        result = await session.execute(
+            update(Balance)
+            .where(Balance.user_id == task.user_id, Balance.amount >= cost)
+            .values(amount=Balance.amount - cost)
+        )
+        if result.rowcount == 0:
+            print(f"Недостаточно кредитов или нет баланса у пользователя {task.user_id}")
+            if task.task_id:
+                await session.execute(failed_update([task.task_id], NO_CREDITS_ERROR))
+                await session.commit()
+            return REJECTED
+
+        prediction = PredictionResult(
+            user_id=task.user_id,
+            prediction_rez=json.dumps([{"color": label} for label in labels]),
+            cost=cost,
+            model_version=model.version,
+            idempotency_key=task.key
+        )
+        session.add(prediction)
+        if task.task_id:
+            await session.flush()
+            await session.execute(*results_update(
+                {task.task_id: (TaskStatus.DONE.value, prediction.prediction_id, None)}
+            ))
+        await session.commit()
+    if seen is not None:
+        seen.add([task.key])
+    print(f'Предсказание для пользователя {task.user_id} обработано')
+    return DONE
+
+
+async def main() -> None:
+    import aio_pika
+    from database.config import get_settings
+    from database.databases import get_async_session_factory
+    from services.ml.registry import get_model, model_registry
+
+    settings = get_settings()
+    get_model()
+    print(f'Модель загружена: {model_registry.stats()}')
+
+    session_factory = get_async_session_factory()
+    concurrency = max(settings.WORKER_CONCURRENCY, 1)
+
+    connection = await aio_pika.connect_robust(
+        host=rabbitmq_host,
+        port=5672,
+        login='guest',
+        password='guest',
+        heartbeat=30
+    )
+    async with connection:
+        channel = await connection.channel()
+        # prefetch каждой полосы равен числу одновременных сообщений
+        await channel.set_qos(prefetch_count=concurrency)
+        names = list(task_queues(settings.TASK_BULK_SHARDS))
+        queues = [await channel.declare_queue(name, durable=True) for name in names]
+        events = await channel.declare_exchange(EVENTS_EXCHANGE, aio_pika.ExchangeType.FANOUT)
+
+        # Очереди повтора и DLQ полос - те же, что у синхронного воркера
+        policies = {
+            name: RetryPolicy(
+                name,
+                max_attempts=settings.WORKER_RETRY_MAX_ATTEMPTS,
+                base_delay=settings.WORKER_RETRY_BASE_SECONDS,
+                max_delay=settings.WORKER_RETRY_MAX_SECONDS
+            )
+            for name in names
+        }
+        for policy in policies.values():
+            await channel.declare_queue(policy.dead_letter_queue, durable=True)
+            for name, arguments in policy.retry_queues().items():
+                await channel.declare_queue(name, durable=True, arguments=arguments)
+
+        async def route_failure(message, error: str, retryable: bool) -> str:
+            policy = policies.get((message.headers or {}).get(QUEUE_HEADER), policies[TASK_QUEUE])
+            decision, target, headers = policy.plan(message.headers, error, retryable)
+            await channel.default_exchange.publish(
+                aio_pika.Message(message.body, headers=headers, content_type=message.content_type,
+                                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+                routing_key=target
+            )
+            return decision
+
+        async def finish(task_id: str, outcome: str, decision: Optional[str], error: Optional[str]) -> None:
+            # Итог DONE и REJECTED записан в process_message
+            status = task_status(outcome)
+            if decision == RETRY:
+                status = TaskStatus.QUEUED.value
+                statement = retry_update([task_id], error)
+            elif outcome in OUTCOME_ERRORS:
+                statement = failed_update([task_id], error or OUTCOME_ERRORS[outcome])
+            else:
+                statement = None
+            if statement is not None:
+                async with session_factory() as session:
+                    await session.execute(statement)
+                    await session.commit()
+            await events.publish(
+                aio_pika.Message(event_body({task_id: status}), content_type=JSON),
+                routing_key=''
+            )
+
+        seen = SeenKeys(settings.WORKER_SEEN_KEYS)
+        worker = AsyncWorker(
+            lambda task: process_message(session_factory, task, get_model(), seen),
+            concurrency=concurrency,
+            finish=finish,
+            route_failure=route_failure
+        )
+
+        scheduler = DeficitRoundRobin(
+            settings.WORKER_SCHEDULER_QUANTUM_BYTES,
+            weights={INTERACTIVE: settings.WORKER_SCHEDULER_INTERACTIVE_WEIGHT, BULK: 1},
+            flow_factory=lambda: DeficitRoundRobin(settings.WORKER_SCHEDULER_QUANTUM_BYTES)
+        )
+        print(f"Async worker started ({worker.concurrency} concurrent messages). Waiting for messages...")
+        await worker.run(lane_messages(queues, scheduler))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,259 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from modelses.balance import Balance
+from modelses.models import FEATURES, PredictionResult
+from modelses.task import TaskStatus
+from modelses.user import User
+from services.RabbitMQ.codec import Task, decode_task
+from services.RabbitMQ.idempotency import SeenKeys, idempotency_key_of
+from services.RabbitMQ.retry import DEAD, RETRY, RetryRouter
+from services.RabbitMQ.tasks import TaskTracker, results_update, task_id_of
+
+
+# Итог обработки сообщения
+DONE = "done"          # предсказание сохранено, средства списаны
+REJECTED = "rejected"  # сообщение корректное, но не выполнено (нет пользователя или средств)
+INVALID = "invalid"    # сообщение не разбирается
+FAILED = "failed"      # ошибка при обработке (БД, модель)
+
+# DONE и REJECTED подтверждаются (ack), INVALID и FAILED отклоняются (nack) по одному
+ACK_OUTCOMES = (DONE, REJECTED)
+
+# Причины неуспеха для статуса задачи (modelses/task.py)
+NO_USER_ERROR = "user or balance not found"
+NO_CREDITS_ERROR = "not enough credits"
+OUTCOME_ERRORS = {INVALID: "invalid message", FAILED: "processing failed"}
+
+
+def process_batch(session: Session, tasks: List[Task], model) -> Dict[int, str]:
+    # Пачка сообщений за одну транзакцию: пользователи и балансы читаются одним запросом,
+    # предсказания - одним векторным predict, результаты вставляются пачкой,
+    # списания суммируются по пользователю и применяются один раз.
+    # Статусы задач с task_id записываются в той же транзакции.
+    # Задачи, ключ которых уже есть в БД (повторная доставка), подтверждаются без списания
+    outcomes: Dict[int, str] = {}
+    results = {}
+    keys = {task.key for task in tasks if task.key}
+    processed = set(session.exec(
+        select(PredictionResult.idempotency_key).where(PredictionResult.idempotency_key.in_(keys))
+    ).all()) if keys else set()
+    user_ids = {task.user_id for task in tasks}
+    users = set(session.exec(select(User.user_id).where(User.user_id.in_(user_ids))).all())
+    balances = {
+        balance.user_id: balance
+        for balance in session.exec(select(Balance).where(Balance.user_id.in_(user_ids))).all()
+    }
+
+    # Проверка средств в порядке поступления сообщений с учетом уже принятых в этой пачке
+    cost = model.get_cost_predict()
+    available = {user_id: balance.amount for user_id, balance in balances.items()}
+    accepted = []
+    for task in tasks:
+        if task.key and task.key in processed:
+            print(f'Повторная доставка задачи {task.key}, списание пропущено')
+            outcomes[task.tag] = DONE
+        elif task.user_id not in users or task.user_id not in balances:
+            print(f'Пользователь {task.user_id} или баланс не найдены')
+            outcomes[task.tag] = REJECTED
+            if task.task_id:
+                results[task.task_id] = (TaskStatus.FAILED.value, None, NO_USER_ERROR)
+        elif available[task.user_id] < cost:
+            print(f"Недостаточно кредитов у пользователя {task.user_id}")
+            outcomes[task.tag] = REJECTED
+            if task.task_id:
+                results[task.task_id] = (TaskStatus.FAILED.value, None, NO_CREDITS_ERROR)
+        else:
+            available[task.user_id] -= cost
+            accepted.append(task)
+            if task.key:
+                processed.add(task.key)
+
+    X = np.concatenate([task.X for task in accepted]) if accepted else np.empty((0, len(FEATURES)))
+    labels = model.predict_columns(X).tolist() if len(X) else []
+
+    offset = 0
+    predictions = []
+    for task in accepted:
+        rows = len(task.X)
+        predictions.append(PredictionResult(
+            user_id=task.user_id,
+            prediction_rez=json.dumps([{"color": label} for label in labels[offset:offset + rows]]),
+            cost=cost,
+            model_version=model.version,
+            idempotency_key=task.key
+        ))
+        offset += rows
+        outcomes[task.tag] = DONE
+
+    for user_id, amount in available.items():
+        if amount != balances[user_id].amount:
+            balances[user_id].amount = amount
+            session.add(balances[user_id])
+    session.add_all(predictions)
+
+    if any(task.task_id for task in accepted):
+        # prediction_id нужен для статуса задачи
+        session.flush()
+        for task, prediction in zip(accepted, predictions):
+            if task.task_id:
+                results[task.task_id] = (TaskStatus.DONE.value, prediction.prediction_id, None)
+    if results:
+        session.execute(*results_update(results))
+    session.commit()
+    return outcomes
+
+
+def handle_batch(session_factory: Callable, tasks: List[Task], model,
+                 seen: Optional[SeenKeys] = None) -> Dict[int, str]:
+    # Если пачка целиком не прошла (ошибка БД или модели), повторяем по одному сообщению,
+    # чтобы ошибка одного сообщения не отклоняла остальные.
+    # seen - ключи, уже закоммиченные этим процессом: такие задачи не идут в БД
+    outcomes = {}
+    if seen is not None:
+        outcomes = {task.tag: DONE for task in tasks if task.key in seen}
+        if outcomes:
+            print(f'Повторная доставка {len(outcomes)} задач, пропущены без обращения к БД')
+            tasks = [task for task in tasks if task.tag not in outcomes]
+    if not tasks:
+        return outcomes
+    try:
+        with session_factory() as session:
+            outcomes.update(process_batch(session, tasks, model))
+        if seen is not None:
+            # Ключи отклоненных задач не запоминаются: после пополнения баланса
+            # повторная отправка той же задачи должна выполниться
+            seen.add(task.key for task in tasks if outcomes[task.tag] == DONE)
+        return outcomes
+    except Exception as e:
+        if len(tasks) == 1:
+            print(f'Ошибка при обработке предсказания: {e}')
+            tasks[0].error = f"{OUTCOME_ERRORS[FAILED]}: {e}"
+            outcomes[tasks[0].tag] = FAILED
+            return outcomes
+        print(f'Ошибка при обработке пачки из {len(tasks)} сообщений, обработка по одному: {e}')
+
+    for task in tasks:
+        outcomes.update(handle_batch(session_factory, [task], model, seen))
+    return outcomes
+
+
+class BatchConsumer:
+    # Пакетный режим воркера: сообщения копятся, пока не наберется max_batch_size
+    # или не пройдет max_wait_ms с первого сообщения в буфере, затем обрабатываются
+    # одной транзакцией и подтверждаются через settle.
+    # С tracker задачи пачки переводятся в running до обработки, а после нее
+    # рассылается одно событие со статусами всех задач пачки
+    def __init__(self, connection, handler: Callable[[List[Task]], Dict[int, str]],
+                 max_batch_size: int = 100, max_wait_ms: float = 50.0,
+                 tracker: Optional[TaskTracker] = None, router: Optional[RetryRouter] = None):
+        self.connection = connection
+        self.handler = handler
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000
+        self.tracker = tracker
+        self.router = router
+        self._buffer: List[Tuple[int, bytes, object]] = []
+        self._channel = None
+        self._timer = None
+
+    def on_message(self, ch, method, properties, body) -> None:
+        self._channel = ch
+        self._buffer.append((method.delivery_tag, body, properties))
+        if len(self._buffer) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.connection.call_later(self.max_wait, self.flush)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self.connection.remove_timeout(self._timer)
+            self._timer = None
+
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+
+        tasks = []
+        outcomes: Dict[int, str] = {}
+        errors: Dict[int, str] = {}
+        for tag, body, properties in batch:
+            try:
+                tasks.append(decode_task(tag, body, getattr(properties, "content_type", None),
+                                         task_id_of(properties), idempotency_key_of(properties)))
+            except Exception as e:
+                # Любая ошибка разбора - некорректное сообщение, а не падение всей пачки
+                print(f"Ошибка при разборе сообщения: {e}")
+                outcomes[tag] = INVALID
+                errors[tag] = f"{OUTCOME_ERRORS[INVALID]}: {e}"
+
+        if self.tracker is not None:
+            self.tracker.start([task.task_id for task in tasks if task.task_id])
+
+        outcomes.update(self.handler(tasks))
+        errors.update({task.tag: task.error for task in tasks if task.error})
+        settle(self._channel, batch, outcomes, errors, self.tracker, self.router)
+
+
+def settle(channel, messages: List[Tuple[int, bytes, object]], outcomes: Dict[int, str],
+           errors: Dict[int, str], tracker: Optional[TaskTracker] = None,
+           router: Optional[RetryRouter] = None) -> None:
+    # Подтверждение сообщений (tag, body, properties) по итогам обработки.
+    # DONE и REJECTED подтверждаются. INVALID и FAILED без router получают nack без возврата
+    # в очередь; с router они перекладываются в очередь повтора (FAILED) или DLQ
+    # и тоже подтверждаются (services/RabbitMQ/retry.py).
+    # Сначала nack по одному, затем один ack с multiple=True до последнего
+    # подтверждаемого тега: он захватывает все оставшиеся теги пачки
+    acked, nacked = [], []
+    statuses, failed, retrying = {}, [], []
+    for tag, body, properties in messages:
+        outcome = outcomes.get(tag, FAILED)
+        task_id = task_id_of(properties)
+        if outcome in ACK_OUTCOMES:
+            acked.append(tag)
+            statuses[task_id] = task_status(outcome)
+            continue
+
+        error = errors.get(tag) or OUTCOME_ERRORS[outcome]
+        decision = DEAD
+        if router is None:
+            nacked.append((tag, False))
+        else:
+            try:
+                decision = router.route(body, properties, error, retryable=outcome == FAILED)
+                acked.append(tag)
+            except Exception as e:
+                # Брокер не принял копию: сообщение возвращается в очередь как есть
+                print(f'Ошибка при отправке сообщения на повтор: {e}')
+                nacked.append((tag, True))
+                decision = RETRY
+        if decision == RETRY:
+            retrying.append((task_id, error))
+            statuses[task_id] = TaskStatus.QUEUED.value
+        else:
+            failed.append((task_id, error))
+            statuses[task_id] = TaskStatus.FAILED.value
+
+    # Статусы задач - до подтверждения: подтвержденное сообщение уже не повторится
+    statuses.pop(None, None)
+    if tracker is not None:
+        tracker.fail({task_id: error for task_id, error in failed if task_id})
+        tracker.retrying({task_id: error for task_id, error in retrying if task_id})
+
+    for tag, requeue in nacked:
+        channel.basic_nack(delivery_tag=tag, requeue=requeue)
+    if acked:
+        channel.basic_ack(delivery_tag=max(acked), multiple=True)
+
+    if tracker is not None:
+        tracker.notify(statuses)
+    done = sum(1 for tag, _, _ in messages if outcomes.get(tag) == DONE)
+    print(f'Пачка из {len(messages)} сообщений: выполнено {done}, '
+          f'на повтор {len(retrying)}, отклонено {len(failed)}')
+
+
+def task_status(outcome: Optional[str]) -> str:
+    return TaskStatus.DONE.value if outcome == DONE else TaskStatus.FAILED.value
@@ -0,0 +1,121 @@
+import json
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from modelses.models import FEATURES
+
+# Форматы сообщений ml_task_queue. Формат выбирается по content_type сообщения;
+# сообщения без content_type считаются JSON (старые производители).
+#
+# application/json - {"user_id": 1, "data": [{"petal_length": 1.4, "petal_width": 0.2}, ...]}
+#   Тот же контракт, что у MLModel.predict: отсутствующий признак равен 0.0.
+#
+# application/x-msgpack - {"v": 1, "user_id": 1, "rows": n,
+#                          "columns": {"petal_length": <n * 8 байт>, "petal_width": <n * 8 байт>}}
+#   Колонки - упакованные float64 little-endian, декодируются в NumPy без разбора строк.
+#   Нужны все признаки FEATURES, лишние колонки не допускаются.
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+MSGPACK_VERSION = 1
+COLUMN_DTYPE = np.dtype("<f8")
+
+
+class Task:
+    # Разобранное сообщение очереди: матрица признаков (n, len(FEATURES)) в порядке FEATURES;
+    # task_id - из заголовка сообщения (services/RabbitMQ/tasks.py), если производитель его передал;
+    # key - ключ идемпотентности, по умолчанию task_id (services/RabbitMQ/idempotency.py);
+    # error - причина, если обработка упала (для повтора и DLQ, services/RabbitMQ/retry.py)
+    def __init__(self, tag: int, user_id: int, X: np.ndarray, task_id: Optional[str] = None,
+                 key: Optional[str] = None):
+        self.tag = tag
+        self.user_id = user_id
+        self.X = X
+        self.task_id = task_id
+        self.key = key or task_id
+        self.error: Optional[str] = None
+
+
+def decode_task(tag: int, body: bytes, content_type: Optional[str] = None,
+                task_id: Optional[str] = None, key: Optional[str] = None) -> Task:
+    content_type = (content_type or JSON).split(";")[0].strip().lower()
+    if content_type == JSON:
+        user_id, X = _decode_json(body)
+    elif content_type == MSGPACK:
+        user_id, X = _decode_msgpack(body)
+    else:
+        raise ValueError(f"Unsupported content type: {content_type}")
+
+    if not np.isfinite(X).all():
+        raise ValueError("data contains non-finite values")
+    return Task(tag, user_id, X, task_id, key)
+
+
+def encode_task(user_id: int, data: Union[np.ndarray, Sequence[Dict]],
+                content_type: str = MSGPACK) -> Tuple[bytes, str]:
+    # data - матрица (n, len(FEATURES)) или список словарей, как у MLModel.predict
+    if content_type == JSON:
+        if isinstance(data, np.ndarray):
+            data = [dict(zip(FEATURES, row)) for row in data.tolist()]
+        return json.dumps({"user_id": user_id, "data": list(data)}).encode(), JSON
+    if content_type != MSGPACK:
+        raise ValueError(f"Unsupported content type: {content_type}")
+
+    import msgpack
+
+    X = data if isinstance(data, np.ndarray) else _rows_from_dicts(data)
+    X = np.asarray(X, dtype=COLUMN_DTYPE).reshape(-1, len(FEATURES))
+    body = msgpack.packb({
+        "v": MSGPACK_VERSION,
+        "user_id": int(user_id),
+        "rows": len(X),
+        "columns": {name: np.ascontiguousarray(X[:, i]).tobytes() for i, name in enumerate(FEATURES)}
+    }, use_bin_type=True)
+    return body, MSGPACK
+
+
+def _rows_from_dicts(data: Sequence[Dict]) -> np.ndarray:
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError("data must be a list of objects")
+    X = np.empty((len(data), len(FEATURES)), dtype=np.float64)
+    try:
+        for i, item in enumerate(data):
+            X[i] = [float(item.get(name, 0.0)) for name in FEATURES]
+    except (TypeError, ValueError, OverflowError) as e:
+        # Целые JSON больше float (10**400) дают OverflowError - такое сообщение некорректно
+        raise ValueError(f"data must contain numbers: {e}")
+    return X
+
+
+def _decode_json(body: bytes) -> Tuple[int, np.ndarray]:
+    message = json.loads(body)
+    return int(message["user_id"]), _rows_from_dicts(message["data"])
+
+
+def _decode_msgpack(body: bytes) -> Tuple[int, np.ndarray]:
+    import msgpack
+
+    try:
+        message = msgpack.unpackb(body, raw=False)
+    except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+        raise ValueError(f"Invalid msgpack message: {e}")
+    if not isinstance(message, dict):
+        raise ValueError("Message must be a map")
+    if message.get("v") != MSGPACK_VERSION:
+        raise ValueError(f"Unsupported message version: {message.get('v')}")
+
+    rows = message.get("rows")
+    columns = message.get("columns")
+    if not isinstance(rows, int) or rows < 0 or not isinstance(columns, dict):
+        raise ValueError("Message must contain rows and columns")
+    if set(columns) != set(FEATURES):
+        raise ValueError(f"Columns must be exactly: {', '.join(FEATURES)}")
+
+    X = np.empty((rows, len(FEATURES)), dtype=np.float64)
+    for i, name in enumerate(FEATURES):
+        buffer = columns[name]
+        if not isinstance(buffer, bytes) or len(buffer) != rows * COLUMN_DTYPE.itemsize:
+            raise ValueError(f"Column {name} must contain {rows} float64 values")
+        X[:, i] = np.frombuffer(buffer, dtype=COLUMN_DTYPE)
+    return int(message["user_id"]), X
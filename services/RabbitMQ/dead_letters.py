@@ -0,0 +1,94 @@
+import argparse
+from typing import Callable, Dict, List, Optional
+
+from services.RabbitMQ.retry import RetryPolicy, clean_headers, dead_letter_info
+from services.RabbitMQ.tasks import requeue_update, task_id_of
+
+# Просмотр и повторная отправка сообщений из DLQ (<queue>.dead, services/RabbitMQ/retry.py):
+#   python -m services.RabbitMQ.dead_letters list [--limit N]
+#   python -m services.RabbitMQ.dead_letters replay [--limit N] [--task-id ID]
+
+
+def list_dead_letters(backend, policy: RetryPolicy, limit: int = 100) -> List[Dict]:
+    # Сообщения читаются без удаления: после просмотра все возвращаются в DLQ.
+    # Возврат - в обратном порядке, чтобы очередь сохранила исходный порядок
+    tags, letters = [], []
+    try:
+        while len(letters) < limit:
+            message = backend.get(policy.dead_letter_queue)
+            if message is None:
+                break
+            method, properties, body = message
+            tags.append(method.delivery_tag)
+            letters.append({**dead_letter_info(properties), "size": len(body)})
+    finally:
+        for tag in reversed(tags):
+            backend.nack(tag, requeue=True)
+    return letters
+
+
+def replay_dead_letters(backend, policy: RetryPolicy, limit: int = 100, task_id: Optional[str] = None,
+                        session_factory: Optional[Callable] = None) -> List[Dict]:
+    # Сообщения возвращаются в основную очередь со сброшенным счетчиком попыток;
+    # задачи снова становятся queued. С task_id - только сообщения этой задачи,
+    # остальные остаются в DLQ
+    skipped, replayed = [], []
+    try:
+        while len(replayed) < limit:
+            message = backend.get(policy.dead_letter_queue)
+            if message is None:
+                break
+            method, properties, body = message
+            if task_id is not None and task_id_of(properties) != task_id:
+                skipped.append(method.delivery_tag)
+                continue
+            backend.publish(policy.queue, body, headers=clean_headers(properties.headers),
+                            content_type=properties.content_type)
+            # Копия принята брокером - исходное сообщение удаляется из DLQ
+            backend.ack(method.delivery_tag)
+            replayed.append(dead_letter_info(properties))
+    finally:
+        for tag in reversed(skipped):
+            backend.nack(tag, requeue=True)
+
+    task_ids = [letter["task_id"] for letter in replayed if letter["task_id"]]
+    if task_ids and session_factory is not None:
+        with session_factory() as session:
+            session.execute(requeue_update(task_ids))
+            session.commit()
+    return replayed
+
+
+def main() -> None:
+    from database.config import get_settings
+    from database.databases import get_session
+    from services.RabbitMQ.queues import RabbitMQBackend, rabbitmq_connection_params
+
+    parser = argparse.ArgumentParser(description="Messages in the worker dead-letter queue")
+    parser.add_argument("command", choices=("list", "replay"))
+    parser.add_argument("--queue", default="ml_task_queue")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--task-id", default=None, help="replay only this task")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    policy = RetryPolicy(args.queue, max_attempts=settings.WORKER_RETRY_MAX_ATTEMPTS,
+                         base_delay=settings.WORKER_RETRY_BASE_SECONDS,
+                         max_delay=settings.WORKER_RETRY_MAX_SECONDS)
+    backend = RabbitMQBackend(rabbitmq_connection_params())
+    try:
+        backend.declare(policy.dead_letter_queue)
+        if args.command == "list":
+            letters = list_dead_letters(backend, policy, args.limit)
+        else:
+            letters = replay_dead_letters(backend, policy, args.limit, args.task_id, get_session)
+        for letter in letters:
+            print(f"{letter['task_id'] or '-'}\tattempts={letter['attempts']}\t"
+                  f"failed_at={letter['failed_at']}\t{letter['error']}")
+        print(f"{args.command}: {len(letters)} messages, {backend.depth(policy.dead_letter_queue)} in {policy.dead_letter_queue}")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
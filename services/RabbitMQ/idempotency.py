@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from services.RabbitMQ.tasks import TASK_ID_HEADER
+
+# Повторная доставка сообщения (воркер упал между commit и ack, оборвалось соединение)
+# не должна списывать средства второй раз. У задачи есть ключ идемпотентности:
+# заголовок idempotency_key или task_id. Ключ сохраняется в PredictionResult.idempotency_key
+# (уникальный индекс) в той же транзакции, что и списание, поэтому повтор находится
+# в БД, а параллельная вставка того же ключа откатывает транзакцию целиком.
+# Перед БД стоит SeenKeys - ключи, уже закоммиченные этим процессом: повторы,
+# пришедшие в тот же процесс, пропускаются без запроса к БД.
+
+IDEMPOTENCY_HEADER = 'idempotency_key'
+
+
+def idempotency_key_of(properties) -> Optional[str]:
+    headers = getattr(properties, "headers", None) or {}
+    key = headers.get(IDEMPOTENCY_HEADER) or headers.get(TASK_ID_HEADER)
+    if isinstance(key, bytes):
+        key = key.decode()
+    return str(key)[:64] if key else None
+
+
+class SeenKeys:
+    # Ограниченное множество последних ключей (LRU): память не растет с числом сообщений,
+    # а вытесненный ключ все равно найдется в БД
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = max(int(maxsize), 0)
+        self._keys: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def __contains__(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        with self._lock:
+            if key not in self._keys:
+                return False
+            self._keys.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, keys: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            for key in keys:
+                if key is None or not self.maxsize:
+                    continue
+                self._keys[key] = True
+                self._keys.move_to_end(key)
+                while len(self._keys) > self.maxsize:
+                    self._keys.popitem(last=False)
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Set
+
+import numpy as np
+
+from services.RabbitMQ.tasks import EVENTS_EXCHANGE, parse_event
+
+logger = logging.getLogger(__name__)
+
+
+class TaskNotifier:
+    # События о задачах (services/RabbitMQ/tasks.py) для ожидающих запросов веб-приложения.
+    # События приходят из потока слушателя (deliver) и передаются в цикл событий.
+    # Запрос подписывается до чтения статуса из БД, поэтому событие,
+    # пришедшее между чтением и ожиданием, не теряется
+    def __init__(self, latency_samples: int = 1000):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._latencies = deque(maxlen=latency_samples)
+        self.events = 0
+        self.connected = False
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def deliver(self, body: bytes) -> None:
+        # Вызывается из любого потока
+        try:
+            committed_at, statuses = parse_event(body)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Invalid task event: {e}")
+            return
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, statuses, committed_at)
+
+    def _dispatch(self, statuses: Dict[str, str], committed_at: float) -> None:
+        self.events += len(statuses)
+        for task_id, status in statuses.items():
+            for queue in self._subscribers.get(task_id, ()):
+                queue.put_nowait((status, committed_at))
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        # Очередь (status, committed_at) событий задачи; освобождается через unsubscribe
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(task_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[task_id]
+
+    async def next_event(self, queue: asyncio.Queue, timeout: float) -> Optional[float]:
+        # Время коммита из события или None, если за timeout событий не было
+        try:
+            _, committed_at = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return committed_at
+
+    def record_delivery(self, committed_at: float) -> None:
+        # Задержка от коммита воркера до отправки статуса клиенту
+        self._latencies.append(time.time() - committed_at)
+
+    def stats(self) -> Dict:
+        latencies = np.array(self._latencies) * 1000
+        return {
+            "connected": self.connected,
+            "events": self.events,
+            "waiting": sum(len(queues) for queues in self._subscribers.values()),
+            "delivery_latency_ms": {
+                "count": len(latencies),
+                "p50": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+                "p99": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None
+            }
+        }
+
+
+class TaskEventListener:
+    # Поток, принимающий рассылку ml_task_events для TaskNotifier.
+    # backend_factory создает подключение (QueueBackend); при ошибке подключение
+    # повторяется через retry_seconds, а запросы до тех пор перечитывают статус из БД
+    def __init__(self, notifier: TaskNotifier, backend_factory: Callable, retry_seconds: float = 5.0):
+        self.notifier = notifier
+        self.backend_factory = backend_factory
+        self.retry_seconds = retry_seconds
+        self._backend = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="task-events", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopped.set()
+        backend = self._backend
+        if backend is not None:
+            backend.stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._backend = self.backend_factory()
+                self._backend.subscribe(
+                    EVENTS_EXCHANGE,
+                    lambda ch, method, properties, body: self.notifier.deliver(body)
+                )
+                self.notifier.connected = True
+                if not self._stopped.is_set():
+                    self._backend.start()
+            except Exception as e:
+                logger.warning(f"Task events listener disconnected: {e}")
+            finally:
+                self.notifier.connected = False
+                if self._backend is not None:
+                    try:
+                        self._backend.close()
+                    except Exception:
+                        pass
+                    self._backend = None
+            self._stopped.wait(self.retry_seconds)
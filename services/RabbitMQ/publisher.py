@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.RabbitMQ.codec import MSGPACK, encode_task
+from services.RabbitMQ.tasks import (
+    BULK_SHARDS, INTERACTIVE_MAX_ROWS, create_task, fail_task, lane_for, task_headers, task_queue, task_queues
+)
+
+logger = logging.getLogger(__name__)
+
+# Сообщение для публикации: (queue, body, headers, content_type)
+Outgoing = Tuple[str, bytes, Optional[Dict], str]
+
+
+class TaskPublisher:
+    # Публикация задач из веб-приложения через пул долгоживущих каналов
+    # с подтверждениями издателя (publisher confirms).
+    # Сообщения параллельных запросов попадают в общую очередь; каждый канал забирает
+    # до max_batch сообщений, публикует их подряд и ждет подтверждений всей пачки разом
+    # (брокер подтверждает пачку одним ack с multiple=True).
+    # transport - AioPikaTransport (RabbitMQ) или MemoryTransport (очередь в памяти).
+    # Подключение - при первой публикации; после ошибки подключения новая попытка
+    # не раньше чем через retry_seconds, до тех пор publish сразу падает
+    def __init__(self, transport, session_factory: Callable, run_io: Optional[Callable] = None,
+                 pool_size: int = 4, max_batch: int = 100, confirm_timeout: float = 5.0,
+                 retry_seconds: float = 5.0, content_type: str = MSGPACK,
+                 interactive_max_rows: int = INTERACTIVE_MAX_ROWS, bulk_shards: int = BULK_SHARDS):
+        self.transport = transport
+        self.session_factory = session_factory
+        self.run_io = run_io or _run_in_thread
+        self.pool_size = max(int(pool_size), 1)
+        self.max_batch = max(int(max_batch), 1)
+        self.confirm_timeout = confirm_timeout
+        self.retry_seconds = retry_seconds
+        self.content_type = content_type
+        self.interactive_max_rows = interactive_max_rows
+        self.bulk_shards = bulk_shards
+        self._pending: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._failed_at: Optional[float] = None
+        self._stats = {"published": 0, "failed": 0, "batches": 0, "max_batch": 0}
+
+    @property
+    def connected(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._workers:
+                return
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+                raise ConnectionError("Task queue is unavailable")
+            try:
+                channels = await self.transport.open(self.pool_size)
+            except Exception:
+                self._failed_at = time.monotonic()
+                raise
+            self._failed_at = None
+            self._pending = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._channel_loop(channel)) for channel in channels]
+
+    async def close(self) -> None:
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Неотправленные сообщения завершаются ошибкой, а не зависают
+        while self._pending is not None and not self._pending.empty():
+            _, future = self._pending.get_nowait()
+            if not future.done():
+                future.set_exception(ConnectionError("Task publisher is closed"))
+        await self.transport.close()
+
+    async def publish(self, queue: str, body: bytes, headers: Optional[Dict] = None,
+                      content_type: str = MSGPACK) -> None:
+        # Возвращается после подтверждения брокером
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait(((queue, body, headers, content_type), future))
+        await future
+
+    async def enqueue_prediction(self, user_id: int, rows) -> str:
+        # rows - список словарей, как у MLModel.predict, или матрица признаков.
+        # Задача создается в статусе queued (services/RabbitMQ/tasks.py);
+        # если брокер не подтвердил сообщение, задача помечается failed.
+        # Больше interactive_max_rows строк - в полосу bulk
+        body, content_type = encode_task(user_id, rows, self.content_type)
+        lane = lane_for(len(rows), self.interactive_max_rows)
+        queue = task_queue(lane, user_id, self.bulk_shards)
+        task_id = await self.run_io(self._create_task, user_id)
+        try:
+            await self.publish(queue, body, task_headers(task_id, user_id, lane, queue), content_type)
+        except Exception as e:
+            await self.run_io(self._fail_task, task_id, f"publish failed: {e}")
+            raise
+        return task_id
+
+    def _create_task(self, user_id: int) -> str:
+        with self.session_factory() as session:
+            return create_task(session, user_id).task_id
+
+    def _fail_task(self, task_id: str, error: str) -> None:
+        with self.session_factory() as session:
+            fail_task(session, task_id, error)
+
+    async def _channel_loop(self, channel) -> None:
+        while True:
+            batch = [await self._pending.get()]
+            while len(batch) < self.max_batch and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+
+            try:
+                await asyncio.wait_for(channel.publish_batch([message for message, _ in batch]),
+                                       self.confirm_timeout)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(ConnectionError("Task publisher is closed"))
+                raise
+            except Exception as e:
+                logger.warning(f"Publishing {len(batch)} task messages failed: {e}")
+                self._stats["failed"] += len(batch)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._stats["published"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "connected": self.connected,
+            "channels": len(self._workers),
+            "pending": self._pending.qsize() if self._pending is not None else 0,
+            **self._stats
+        }
+
+
+async def _run_in_thread(func: Callable, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class AioPikaTransport:
+    # Каналы RabbitMQ с подтверждениями издателя; соединение восстанавливается само (connect_robust)
+    def __init__(self, host: str, port: int = 5672, login: str = 'guest', password: str = 'guest',
+                 bulk_shards: int = BULK_SHARDS):
+        self.host = host
+        self.bulk_shards = bulk_shards
+        self.port = port
+        self.login = login
+        self.password = password
+        self._connection = None
+
+    async def open(self, pool_size: int) -> List:
+        import aio_pika
+
+        self._connection = await aio_pika.connect_robust(
+            host=self.host, port=self.port, login=self.login, password=self.password, heartbeat=30
+        )
+        channels = [await self._connection.channel(publisher_confirms=True) for _ in range(pool_size)]
+        for queue in task_queues(self.bulk_shards):
+            await channels[0].declare_queue(queue, durable=True)
+        return [_AioPikaChannel(channel) for channel in channels]
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+class _AioPikaChannel:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def publish_batch(self, messages: List[Outgoing]) -> None:
+        import aio_pika
+
+        # Все сообщения пачки отправляются до ожидания первого подтверждения
+        exchange = self.channel.default_exchange
+        await asyncio.gather(*[
+            exchange.publish(
+                aio_pika.Message(body, headers=headers, content_type=content_type,
+                                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+                routing_key=queue
+            )
+            for queue, body, headers, content_type in messages
+        ])
+
+
+class MemoryTransport:
+    # Очередь в памяти (services/RabbitMQ/queues.py) вместо RabbitMQ: публикация
+    # подтверждается сразу, воркер в тестах читает тот же MemoryQueueBackend
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def open(self, pool_size: int) -> List:
+        return [self] * pool_size
+
+    async def close(self) -> None:
+        pass
+
+    async def publish_batch(self, messages: List[Outgoing]) -> None:
+        for queue, body, headers, content_type in messages:
+            self.backend.publish(queue, body, headers=headers, content_type=content_type)
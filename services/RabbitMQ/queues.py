@@ -0,0 +1,384 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Очередь задач за общим интерфейсом: RabbitMQ (pika) в работе и очередь в памяти
+# для тестов и бенчмарков без инфраструктуры.
+# Обработчик сообщений в обоих случаях вызывается с сигнатурой pika:
+# on_message(channel, method, properties, body), где у channel есть basic_ack/basic_nack,
+# у method - delivery_tag и redelivered, у properties - headers и content_type.
+# Кроме очередей задач есть рассылка (fanout): broadcast доставляет сообщение всем
+# подписчикам subscribe, у каждого своя временная очередь без подтверждений.
+
+
+def rabbitmq_connection_params(host: Optional[str] = None):
+    # Параметры подключения воркера и веб-приложения; хост - из RABBITMQ_HOST
+    import pika
+
+    return pika.ConnectionParameters(
+        host=host or os.getenv('RABBITMQ_HOST', 'localhost'),
+        port=5672,
+        virtual_host='/',
+        credentials=pika.PlainCredentials(
+            username='guest',
+            password='guest'
+        ),
+        heartbeat=30,
+        blocked_connection_timeout=2
+    )
+
+
+class QueueBackend:
+    def declare(self, queue: str, arguments: Optional[Dict] = None) -> None:
+        # arguments - аргументы очереди RabbitMQ; очередь в памяти понимает
+        # x-message-ttl и x-dead-letter-routing-key (services/RabbitMQ/retry.py)
+        raise NotImplementedError
+
+    def publish(self, queue: str, body: bytes, headers: Optional[Dict] = None,
+                content_type: str = 'application/json') -> None:
+        raise NotImplementedError
+
+    def consume(self, queue: str, on_message: Callable, prefetch: int = 1) -> None:
+        # Регистрирует обработчик; доставка начинается в start()
+        raise NotImplementedError
+
+    def get(self, queue: str) -> Optional[tuple]:
+        # Одно сообщение без подписки: (method, properties, body) или None, если очередь пуста.
+        # Сообщение нужно подтвердить (ack) или вернуть (nack)
+        raise NotImplementedError
+
+    def broadcast(self, exchange: str, body: bytes, headers: Optional[Dict] = None) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, exchange: str, on_message: Callable) -> None:
+        # Подписка на рассылку; сообщения, отправленные до подписки, не доставляются
+        raise NotImplementedError
+
+    def ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        raise NotImplementedError
+
+    def nack(self, delivery_tag: int, requeue: bool = False) -> None:
+        raise NotImplementedError
+
+    def depth(self, queue: str) -> int:
+        raise NotImplementedError
+
+    def start(self) -> None:
+        # Блокирующий цикл доставки до stop()
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        # Можно вызывать из обработчика сигнала или другого потока
+        raise NotImplementedError
+
+    def call_later(self, delay: float, callback: Callable):
+        raise NotImplementedError
+
+    def remove_timeout(self, timer) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class RabbitMQBackend(QueueBackend):
+    def __init__(self, connection_params):
+        import pika
+
+        self._pika = pika
+        self.connection = pika.BlockingConnection(connection_params)
+        self.channel = self.connection.channel()
+        self._exchanges = set()
+
+    def declare(self, queue: str, arguments: Optional[Dict] = None) -> None:
+        self.channel.queue_declare(queue=queue, durable=True, arguments=arguments)
+
+    def publish(self, queue: str, body: bytes, headers: Optional[Dict] = None,
+                content_type: str = 'application/json') -> None:
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=body,
+            properties=self._pika.BasicProperties(
+                delivery_mode=2,
+                content_type=content_type,
+                headers=headers
+            )
+        )
+
+    def consume(self, queue: str, on_message: Callable, prefetch: int = 1) -> None:
+        self.channel.basic_qos(prefetch_count=prefetch)
+        self.channel.basic_consume(queue=queue, on_message_callback=on_message, auto_ack=False)
+
+    def get(self, queue: str) -> Optional[tuple]:
+        method, properties, body = self.channel.basic_get(queue=queue, auto_ack=False)
+        if method is None:
+            return None
+        return method, properties, body
+
+    def _declare_exchange(self, exchange: str) -> None:
+        if exchange not in self._exchanges:
+            self.channel.exchange_declare(exchange=exchange, exchange_type='fanout')
+            self._exchanges.add(exchange)
+
+    def broadcast(self, exchange: str, body: bytes, headers: Optional[Dict] = None) -> None:
+        # События не сохраняются на диск: после перезапуска брокера их некому доставлять
+        self._declare_exchange(exchange)
+        self.channel.basic_publish(
+            exchange=exchange,
+            routing_key='',
+            body=body,
+            properties=self._pika.BasicProperties(content_type='application/json', headers=headers)
+        )
+
+    def subscribe(self, exchange: str, on_message: Callable) -> None:
+        # Временная очередь удаляется брокером при закрытии соединения
+        self._declare_exchange(exchange)
+        queue = self.channel.queue_declare(queue='', exclusive=True).method.queue
+        self.channel.queue_bind(queue=queue, exchange=exchange)
+        self.channel.basic_consume(queue=queue, on_message_callback=on_message, auto_ack=True)
+
+    def ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        self.channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+
+    def nack(self, delivery_tag: int, requeue: bool = False) -> None:
+        self.channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+    def depth(self, queue: str) -> int:
+        return self.channel.queue_declare(queue=queue, passive=True).method.message_count
+
+    def start(self) -> None:
+        self.channel.start_consuming()
+
+    def stop(self) -> None:
+        self.connection.add_callback_threadsafe(self.channel.stop_consuming)
+
+    def call_later(self, delay: float, callback: Callable):
+        return self.connection.call_later(delay, callback)
+
+    def remove_timeout(self, timer) -> None:
+        self.connection.remove_timeout(timer)
+
+    def close(self) -> None:
+        if self.connection.is_open:
+            self.connection.close()
+
+
+class Method:
+    def __init__(self, delivery_tag: int, routing_key: str, redelivered: bool):
+        self.delivery_tag = delivery_tag
+        self.routing_key = routing_key
+        self.redelivered = redelivered
+
+
+class Properties:
+    def __init__(self, headers: Optional[Dict] = None, content_type: Optional[str] = None):
+        self.headers = headers
+        self.content_type = content_type
+
+
+class MemoryQueueBackend(QueueBackend):
+    # Очередь в памяти процесса с той же семантикой доставки, что у RabbitMQ:
+    # - доставка в порядке публикации, не больше prefetch неподтвержденных сообщений
+    #   на потребителя (как basic_qos с global=False), потребители обслуживаются по кругу;
+    # - delivery_tag растет монотонно, ack(multiple=True) подтверждает все теги до указанного;
+    # - ack/nack неизвестного тега - ошибка (в RabbitMQ канал закрывается с PRECONDITION_FAILED);
+    # - nack(requeue=True) и close() возвращают сообщения в голову очереди с redelivered=True;
+    # - сообщения рассылки подтверждаются при доставке и не занимают prefetch;
+    # - в очереди с x-message-ttl сообщение через TTL переходит в x-dead-letter-routing-key.
+    # Публиковать можно из других потоков; доставка идет в потоке, вызвавшем start().
+    def __init__(self):
+        self._queues: Dict[str, deque] = {}
+        self._unacked: Dict[int, tuple] = {}
+        self._consumers: Dict[str, tuple] = {}
+        self._bindings: Dict[str, list] = {}
+        self._arguments: Dict[str, Dict] = {}
+        self._subscriptions = itertools.count(1)
+        self._tags = itertools.count(1)
+        self._timers = []
+        self._timer_ids = itertools.count()
+        self._cancelled = set()
+        self._budget = 0
+        self._lock = threading.Condition()
+        self._stopping = False
+
+    # pika-совместимые методы канала, которые вызывают обработчики
+    def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        self.ack(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag: int, multiple: bool = False, requeue: bool = True) -> None:
+        self.nack(delivery_tag, requeue)
+
+    def declare(self, queue: str, arguments: Optional[Dict] = None) -> None:
+        with self._lock:
+            self._queues.setdefault(queue, deque())
+            if arguments:
+                self._arguments[queue] = dict(arguments)
+
+    def publish(self, queue: str, body: bytes, headers: Optional[Dict] = None,
+                content_type: str = 'application/json') -> None:
+        with self._lock:
+            self._queues.setdefault(queue, deque()).append(
+                (body, Properties(headers, content_type), False)
+            )
+            ttl = self._arguments.get(queue, {}).get("x-message-ttl")
+            if ttl is not None:
+                # TTL одинаковый для всей очереди: по таймеру истекает голова очереди
+                self.call_later(ttl / 1000, lambda: self._expire(queue))
+            self._lock.notify_all()
+
+    def _expire(self, queue: str) -> None:
+        with self._lock:
+            if not self._queues[queue]:
+                return
+            body, properties, _ = self._queues[queue].popleft()
+            target = self._arguments[queue].get("x-dead-letter-routing-key")
+            if target is not None:
+                self._queues.setdefault(target, deque()).append((body, properties, False))
+            self._lock.notify_all()
+
+    def get(self, queue: str) -> Optional[tuple]:
+        with self._lock:
+            pending = self._queues.get(queue)
+            if not pending:
+                return None
+            body, properties, redelivered = pending.popleft()
+            tag = next(self._tags)
+            self._unacked[tag] = (queue, body, properties)
+            return Method(tag, queue, redelivered), properties, body
+
+    def consume(self, queue: str, on_message: Callable, prefetch: int = 1) -> None:
+        with self._lock:
+            self._queues.setdefault(queue, deque())
+            self._consumers[queue] = (on_message, max(int(prefetch), 1), False)
+
+    def broadcast(self, exchange: str, body: bytes, headers: Optional[Dict] = None) -> None:
+        with self._lock:
+            for queue in self._bindings.get(exchange, ()):
+                self._queues[queue].append((body, Properties(headers, 'application/json'), False))
+            self._lock.notify_all()
+
+    def subscribe(self, exchange: str, on_message: Callable) -> None:
+        with self._lock:
+            queue = f"{exchange}.{next(self._subscriptions)}"
+            self._queues[queue] = deque()
+            self._bindings.setdefault(exchange, []).append(queue)
+            self._consumers[queue] = (on_message, 0, True)
+
+    def ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        with self._lock:
+            self._settle(delivery_tag, multiple)
+            self._lock.notify_all()
+
+    def nack(self, delivery_tag: int, requeue: bool = False) -> None:
+        with self._lock:
+            for queue, body, properties in self._settle(delivery_tag, False):
+                if requeue:
+                    self._queues[queue].appendleft((body, properties, True))
+            self._lock.notify_all()
+
+    def _settle(self, delivery_tag: int, multiple: bool):
+        if delivery_tag not in self._unacked:
+            raise ValueError(f"Unknown delivery tag {delivery_tag}")
+        tags = [tag for tag in self._unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        return [self._unacked.pop(tag) for tag in tags]
+
+    def depth(self, queue: str) -> int:
+        with self._lock:
+            return len(self._queues.get(queue, ()))
+
+    @property
+    def unacked(self) -> int:
+        with self._lock:
+            return len(self._unacked)
+
+    def call_later(self, delay: float, callback: Callable):
+        with self._lock:
+            timer = next(self._timer_ids)
+            heapq.heappush(self._timers, (time.monotonic() + delay, timer, callback))
+            self._lock.notify_all()
+            return timer
+
+    def remove_timeout(self, timer) -> None:
+        with self._lock:
+            self._cancelled.add(timer)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+
+    def start(self, until_idle: bool = False) -> None:
+        # until_idle - выйти, когда доставлять нечего и таймеров нет (для тестов и бенчмарков)
+        self._stopping = False
+        while True:
+            callback = None
+            with self._lock:
+                while not self._stopping:
+                    # Итерация как poll в цикле pika: один наступивший таймер, затем все
+                    # сообщения, которые брокер может отдать сейчас (в пределах prefetch).
+                    # Таймер, который ставит себя заново с нулевой задержкой, не блокирует доставки
+                    callback = None
+                    if self._budget <= 0:
+                        self._budget = self._deliverable()
+                        callback = self._next_timer()
+                    if callback is None and self._budget > 0:
+                        callback = self._next_delivery()
+                        self._budget = self._budget - 1 if callback is not None else 0
+                    if callback is not None:
+                        break
+                    if until_idle and not self._timers:
+                        return
+                    # Ждем публикации, подтверждения или ближайшего таймера
+                    self._lock.wait(self._timers[0][0] - time.monotonic() if self._timers else None)
+                if self._stopping:
+                    return
+            callback()
+
+    def _next_timer(self) -> Optional[Callable]:
+        while self._timers and self._timers[0][1] in self._cancelled:
+            self._cancelled.discard(heapq.heappop(self._timers)[1])
+        if self._timers and self._timers[0][0] <= time.monotonic():
+            return heapq.heappop(self._timers)[2]
+        return None
+
+    def _next_delivery(self) -> Optional[Callable]:
+        for queue, (on_message, prefetch, auto_ack) in self._consumers.items():
+            pending = self._queues[queue]
+            if pending and (auto_ack or self._in_flight(queue) < prefetch):
+                body, properties, redelivered = pending.popleft()
+                tag = next(self._tags)
+                if not auto_ack:
+                    self._unacked[tag] = (queue, body, properties)
+                # Следующая доставка начинается со следующего потребителя
+                self._consumers[queue] = self._consumers.pop(queue)
+                method = Method(tag, queue, redelivered)
+                return lambda: on_message(self, method, properties, body)
+        return None
+
+    def _deliverable(self) -> int:
+        return sum(
+            len(self._queues[queue]) if auto_ack
+            else min(len(self._queues[queue]), max(prefetch - self._in_flight(queue), 0))
+            for queue, (_, prefetch, auto_ack) in self._consumers.items()
+        )
+
+    def _in_flight(self, queue: str) -> int:
+        return sum(1 for unacked_queue, _, _ in self._unacked.values() if unacked_queue == queue)
+
+    def close(self) -> None:
+        # Как при закрытии канала: неподтвержденные сообщения возвращаются в очередь
+        with self._lock:
+            for tag in sorted(self._unacked, reverse=True):
+                queue, body, properties = self._unacked.pop(tag)
+                self._queues[queue].appendleft((body, properties, True))
+            self._consumers.clear()
+            # Временные очереди подписок удаляются, как exclusive-очереди в RabbitMQ
+            for queues in self._bindings.values():
+                for queue in queues:
+                    del self._queues[queue]
+            self._bindings.clear()
@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from services.RabbitMQ.codec import JSON
+from services.RabbitMQ.tasks import QUEUE_HEADER, TASK_ID_HEADER, TASK_QUEUE
+
+# Повторы упавших сообщений с экспоненциальной задержкой и очередь недоставленных (DLQ).
+# Для каждой ступени задержки своя очередь <queue>.retry.<мс> с x-message-ttl:
+# истекшие сообщения брокер возвращает в основную очередь (x-dead-letter-exchange '').
+# TTL в очереди у всех сообщений одинаковый, поэтому они истекают по порядку и
+# короткая задержка не ждет длинную. Сообщения в ожидании повтора не занимают
+# воркер и prefetch, поэтому остальные сообщения обрабатываются без задержек.
+# Сообщение, исчерпавшее попытки, и неразбираемое сообщение уходят в <queue>.dead
+# с причиной в заголовках (см. services/RabbitMQ/dead_letters.py).
+
+ATTEMPT_HEADER = "x-attempt"  # число уже сделанных повторов
+ERROR_HEADER = "x-error"
+FAILED_AT_HEADER = "x-failed-at"
+
+# Решение по упавшему сообщению
+RETRY = "retry"
+DEAD = "dead"
+
+
+class RetryPolicy:
+    def __init__(self, queue: str = TASK_QUEUE, max_attempts: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.queue = queue
+        self.max_attempts = max(int(max_attempts), 0)
+        self.base_delay = max(float(base_delay), 0.001)
+        self.max_delay = max(float(max_delay), self.base_delay)
+
+    @property
+    def dead_letter_queue(self) -> str:
+        return f"{self.queue}.dead"
+
+    def delay(self, attempt: int) -> float:
+        # attempt - номер повтора, начиная с 1
+        return min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+
+    def retry_queue(self, attempt: int) -> str:
+        return f"{self.queue}.retry.{int(self.delay(attempt) * 1000)}"
+
+    def retry_queues(self) -> Dict[str, Dict]:
+        # Имя очереди повтора -> аргументы объявления
+        return {
+            self.retry_queue(attempt): {
+                "x-message-ttl": int(self.delay(attempt) * 1000),
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": self.queue
+            }
+            for attempt in range(1, self.max_attempts + 1)
+        }
+
+    def plan(self, headers: Optional[Dict], error: str, retryable: bool = True) -> Tuple[str, str, Dict]:
+        # (решение, очередь, заголовки) для упавшего сообщения; остальные заголовки
+        # (task_id и т.п.) сохраняются
+        headers = dict(headers or {})
+        attempt = int(headers.get(ATTEMPT_HEADER, 0))
+        headers[ERROR_HEADER] = error[:1000]
+        if retryable and attempt < self.max_attempts:
+            headers[ATTEMPT_HEADER] = attempt + 1
+            return RETRY, self.retry_queue(attempt + 1), headers
+        headers[FAILED_AT_HEADER] = datetime.utcnow().isoformat()
+        return DEAD, self.dead_letter_queue, headers
+
+
+class RetryRouter:
+    # Перекладывает упавшие сообщения через QueueBackend (worker.py, BatchConsumer);
+    # исходное сообщение после этого подтверждается.
+    # policies - политики очередей полос (services/RabbitMQ/tasks.py) по заголовку queue:
+    # повтор возвращается в ту очередь, куда сообщение было опубликовано;
+    # сообщения без заголовка - по policy
+    def __init__(self, backend, policy: RetryPolicy, policies: Optional[Dict[str, RetryPolicy]] = None):
+        self.backend = backend
+        self.policy = policy
+        self.policies = policies or {}
+
+    def policy_for(self, properties) -> RetryPolicy:
+        headers = getattr(properties, "headers", None) or {}
+        queue = headers.get(QUEUE_HEADER)
+        if isinstance(queue, bytes):
+            queue = queue.decode()
+        return self.policies.get(queue, self.policy)
+
+    def declare(self) -> None:
+        for policy in {policy.queue: policy for policy in (self.policy, *self.policies.values())}.values():
+            self.backend.declare(policy.dead_letter_queue)
+            for queue, arguments in policy.retry_queues().items():
+                self.backend.declare(queue, arguments=arguments)
+
+    def route(self, body: bytes, properties, error: str, retryable: bool = True) -> str:
+        policy = self.policy_for(properties)
+        decision, queue, headers = policy.plan(getattr(properties, "headers", None), error, retryable)
+        self.backend.publish(queue, body, headers=headers,
+                             content_type=getattr(properties, "content_type", None) or JSON)
+        if decision == RETRY:
+            print(f'Повтор {headers[ATTEMPT_HEADER]}/{policy.max_attempts} '
+                  f'через {policy.delay(headers[ATTEMPT_HEADER])} с: {error}')
+        else:
+            print(f'Сообщение отправлено в {queue}: {error}')
+        return decision
+
+
+def clean_headers(headers: Optional[Dict]) -> Dict:
+    # Заголовки для повторной отправки из DLQ: счетчик попыток начинается заново
+    return {key: value for key, value in (headers or {}).items()
+            if key not in (ATTEMPT_HEADER, ERROR_HEADER, FAILED_AT_HEADER, "x-death")}
+
+
+def dead_letter_info(properties) -> Dict:
+    headers = getattr(properties, "headers", None) or {}
+    return {
+        "task_id": headers.get(TASK_ID_HEADER),
+        "attempts": headers.get(ATTEMPT_HEADER, 0),
+        "error": headers.get(ERROR_HEADER),
+        "failed_at": headers.get(FAILED_AT_HEADER),
+        "content_type": getattr(properties, "content_type", None)
+    }
@@ -0,0 +1,179 @@
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from services.RabbitMQ.tasks import BULK, ENQUEUED_AT_HEADER, INTERACTIVE, USER_ID_HEADER, lane_of
+
+# Справедливая очередность сообщений в воркере. Брокер отдает до prefetch сообщений
+# каждой полосы (services/RabbitMQ/tasks.py), воркер держит до window из них и выбирает
+# следующее deficit round-robin: сначала между полосами (у интерактивной больше ходов),
+# затем между пользователями полосы. Стоимость сообщения - размер тела в байтах,
+# поэтому пользователь с большими сообщениями получает столько же байт за ход,
+# сколько пользователь с маленькими, а не столько же сообщений.
+
+
+class _Fifo:
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, keys: Tuple, item, cost: int) -> None:
+        self._items.append((item, cost))
+
+    def peek_cost(self) -> int:
+        return self._items[0][1]
+
+    def pop(self) -> Tuple[object, int]:
+        return self._items.popleft()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DeficitRoundRobin:
+    # Потоки обходятся по кругу; за ход поток получает quantum * weight к дефициту
+    # и отдает сообщения, пока их стоимость не больше дефицита. Опустевший поток
+    # удаляется вместе с остатком дефицита (как в классическом DRR).
+    # flow_factory создает поток: _Fifo или вложенный DeficitRoundRobin -
+    # push(keys, item, cost) спускается по ключам keys на следующий уровень
+    def __init__(self, quantum: int, weights: Optional[Dict] = None, flow_factory: Callable = _Fifo):
+        self.quantum = max(int(quantum), 1)
+        self.weights = weights or {}
+        self.flow_factory = flow_factory
+        self._flows: Dict = {}
+        self._deficits: OrderedDict = OrderedDict()  # порядок обхода активных потоков
+        self._turn = None
+        self._size = 0
+
+    def push(self, keys: Tuple, item, cost: int) -> None:
+        key = keys[0]
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flows[key] = self.flow_factory()
+            self._deficits[key] = 0
+        flow.push(keys[1:], item, cost)
+        self._size += 1
+
+    def peek_cost(self) -> int:
+        return self._flows[next(iter(self._deficits))].peek_cost()
+
+    def pop(self) -> Tuple[object, int]:
+        if not self._size:
+            raise IndexError("pop from an empty scheduler")
+        while True:
+            key = next(iter(self._deficits))
+            flow = self._flows[key]
+            if self._turn != key:
+                self._turn = key
+                self._deficits[key] += self.quantum * self.weights.get(key, 1)
+            if self._deficits[key] >= flow.peek_cost():
+                item, cost = flow.pop()
+                self._deficits[key] -= cost
+                self._size -= 1
+                if not len(flow):
+                    del self._flows[key], self._deficits[key]
+                    self._turn = None
+                return item, cost
+            # Ход окончен, дефицит копится до следующего круга
+            self._deficits.move_to_end(key)
+            self._turn = None
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class FairScheduler:
+    # Прослойка между брокером и обработчиком воркера (callback или BatchConsumer.on_message).
+    # Сообщение передается дальше, когда в буфере window сообщений (под нагрузкой) или через
+    # max_wait_ms после первого (без нагрузки). По таймеру буфер разбирается по одному
+    # сообщению за итерацию цикла доставки, чтобы новые сообщения (например, интерактивные)
+    # успевали попасть в буфер до следующего выбора. Для обработчика планировщик - канал:
+    # ack и nack идут через него, потому что ack(multiple=True) обработчика не должен
+    # подтвердить сообщения, которые еще ждут в буфере планировщика
+    def __init__(self, connection, on_message: Callable, window: int = 64, quantum: int = 4096,
+                 interactive_weight: int = 8, max_wait_ms: float = 5.0, samples: int = 1000):
+        self.connection = connection
+        self.on_message_ready = on_message
+        self.window = max(int(window), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000
+        self._queue = DeficitRoundRobin(
+            quantum,
+            weights={INTERACTIVE: max(int(interactive_weight), 1), BULK: 1},
+            flow_factory=lambda: DeficitRoundRobin(quantum)
+        )
+        self._buffered = set()
+        self._dispatched = set()
+        self._channel = None
+        self._timer = None
+        self._waits = {lane: deque(maxlen=samples) for lane in (INTERACTIVE, BULK)}
+        self._counts = {lane: 0 for lane in (INTERACTIVE, BULK)}
+
+    def on_message(self, ch, method, properties, body) -> None:
+        self._channel = ch
+        headers = getattr(properties, "headers", None) or {}
+        lane = lane_of(properties)
+        enqueued_at = headers.get(ENQUEUED_AT_HEADER)
+        arrived = float(enqueued_at) if isinstance(enqueued_at, (int, float)) else time.time()
+        self._queue.push((lane, headers.get(USER_ID_HEADER)), (lane, arrived, method, properties, body),
+                         len(body))
+        self._buffered.add(method.delivery_tag)
+
+        while len(self._queue) >= self.window:
+            self._dispatch()
+        if len(self._queue) and self._timer is None:
+            self._timer = self.connection.call_later(self.max_wait, self._drain)
+
+    def _drain(self) -> None:
+        self._timer = None
+        if len(self._queue):
+            self._dispatch()
+        if len(self._queue) and self._timer is None:
+            self._timer = self.connection.call_later(0, self._drain)
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self.connection.remove_timeout(self._timer)
+            self._timer = None
+        while len(self._queue):
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        (lane, arrived, method, properties, body), _ = self._queue.pop()
+        self._buffered.discard(method.delivery_tag)
+        self._dispatched.add(method.delivery_tag)
+        self._waits[lane].append(time.time() - arrived)
+        self._counts[lane] += 1
+        self.on_message_ready(self, method, properties, body)
+
+    # pika-совместимые методы канала для обработчика
+    def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        if not multiple:
+            self._dispatched.discard(delivery_tag)
+            self._channel.basic_ack(delivery_tag=delivery_tag)
+            return
+        tags = sorted(tag for tag in self._dispatched if tag <= delivery_tag)
+        self._dispatched.difference_update(tags)
+        if not any(tag < delivery_tag for tag in self._buffered):
+            self._channel.basic_ack(delivery_tag=delivery_tag, multiple=True)
+            return
+        for tag in tags:
+            self._channel.basic_ack(delivery_tag=tag)
+
+    def basic_nack(self, delivery_tag: int, multiple: bool = False, requeue: bool = True) -> None:
+        self._dispatched.discard(delivery_tag)
+        self._channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+    def stats(self) -> Dict:
+        # Время ожидания - от публикации (заголовок enqueued_at) до передачи обработчику
+        stats = {"buffered": len(self._queue)}
+        for lane, waits in self._waits.items():
+            waits = np.array(waits) * 1000
+            stats[lane] = {
+                "dispatched": self._counts[lane],
+                "wait_ms": {
+                    "p50": round(float(np.percentile(waits, 50)), 2) if len(waits) else None,
+                    "p99": round(float(np.percentile(waits, 99)), 2) if len(waits) else None
+                }
+            }
+        return stats
@@ -1,34 +1,27 @@
 import pika
-import json
+import sys
+import uuid
+from pathlib import Path
 
-connection = pika.BlockingConnection(
-    pika.ConnectionParameters('localhost', 5672)
-)
-channel = connection.channel()
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
-channel.queue_declare(queue='ml_task_queue', durable=True)
+from services.RabbitMQ.codec import encode_task
+from services.RabbitMQ.idempotency import IDEMPOTENCY_HEADER
+from services.RabbitMQ.queues import RabbitMQBackend
+
+backend = RabbitMQBackend(pika.ConnectionParameters('localhost', 5672))
+backend.declare('ml_task_queue')
 
 # Тестовые сообщения
 for i in range(10):
-    message = {
-        'user_id': 1,
-        'data': [[5.1, 3.5, 1.4, 0.2]]
-    }
+    body, content_type = encode_task(1, [{'petal_length': 1.4, 'petal_width': 0.2}])
 
-    # Отправляем сообщение
-    channel.basic_publish(
-        exchange='',
-        routing_key='ml_task_queue',
-        body=json.dumps(message),
-        properties=pika.BasicProperties(
-            delivery_mode=2,
-            content_type='application/json'
-        )
-    )
+    # Отправляем сообщение; ключ защищает от повторного списания при повторной доставке
+    backend.publish('ml_task_queue', body, headers={IDEMPOTENCY_HEADER: uuid.uuid4().hex},
+                    content_type=content_type)
     print(f"Сообщение {i+1} отправлено в очередь ml_task_queue")
 
 # Проверяем количество сообщений
-queue_info = channel.queue_declare(queue='ml_task_queue', passive=True)
-print(f"Сообщений в очереди: {queue_info.method.message_count}")
+print(f"Сообщений в очереди: {backend.depth('ml_task_queue')}")
 
-connection.close()
\ No newline at end of file
+backend.close()
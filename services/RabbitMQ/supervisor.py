@@ -0,0 +1,189 @@
+import math
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, List, Optional, Sequence
+
+
+class Supervisor:
+    # Процессы воркера, порожденные через fork от процесса с уже загруженной моделью:
+    # дочерние процессы делят ее страницы памяти (copy-on-write) и не обучают модель заново.
+    # Число процессов подбирается по глубине очереди: один процесс на
+    # messages_per_process сообщений, в границах [min_processes, max_processes].
+    # Увеличение - сразу, уменьшение - по одному процессу за проверку.
+    def __init__(self, target: Callable, min_processes: int = 1, max_processes: int = 4,
+                 messages_per_process: int = 100, drain_timeout: float = 30.0):
+        self.target = target
+        self.min_processes = max(int(min_processes), 1)
+        self.max_processes = max(int(max_processes), self.min_processes)
+        self.messages_per_process = max(int(messages_per_process), 1)
+        self.drain_timeout = drain_timeout
+        self._context = multiprocessing.get_context("fork")
+        self._processes: List[multiprocessing.Process] = []
+        # Процессы, остановленные при уменьшении, которые еще дорабатывают сообщения
+        self._retired: List[multiprocessing.Process] = []
+        self._stopping = False
+
+    @property
+    def size(self) -> int:
+        return len(self._processes)
+
+    def start(self) -> None:
+        for _ in range(self.min_processes):
+            self._spawn()
+
+    def desired(self, depth: int) -> int:
+        return min(max(math.ceil(depth / self.messages_per_process), self.min_processes),
+                   self.max_processes)
+
+    def scale(self, depth: int) -> int:
+        self._reap()
+        desired = self.desired(depth)
+        while self.size < desired:
+            self._spawn()
+        if self.size > desired:
+            self._stop(self._processes.pop())
+        return self.size
+
+    def run(self, depth_getter: Callable[[], Optional[int]], interval: float = 5.0) -> None:
+        # Основной цикл: проверка очереди раз в interval секунд до SIGTERM/SIGINT
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        self.start()
+        while not self._stopping:
+            try:
+                depth = depth_getter()
+            except Exception as e:
+                print(f'Не удалось получить глубину очереди: {e}')
+                depth = None
+            if depth is None:
+                # Очередь недоступна - только заменяем упавшие процессы
+                self._reap()
+                while self.size < self.min_processes:
+                    self._spawn()
+            else:
+                before = self.size
+                if self.scale(depth) != before:
+                    print(f'Глубина очереди {depth}: процессов {before} -> {self.size}')
+            self._sleep(interval)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        # SIGTERM всем процессам: они дорабатывают текущие сообщения и выходят;
+        # не успевшие за drain_timeout завершаются принудительно
+        processes, self._processes = self._processes + self._retired, []
+        self._retired = []
+        for process in processes:
+            self._signal(process)
+        deadline = time.monotonic() + self.drain_timeout
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                print(f'Процесс {process.pid} не завершился за {self.drain_timeout} с, kill')
+                process.kill()
+                process.join()
+
+    def _spawn(self) -> None:
+        process = self._context.Process(target=_child_main, args=(self.target,), daemon=False)
+        # SIGTERM блокируется на время fork: сигнал, пришедший дочернему процессу
+        # до установки его обработчика, будет доставлен после нее, а не потерян
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        try:
+            process.start()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+        self._processes.append(process)
+
+    def _stop(self, process) -> None:
+        # Остановка при уменьшении: не ждем завершения, процесс выйдет сам
+        self._signal(process)
+        self._retired.append(process)
+
+    @staticmethod
+    def _signal(process) -> None:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+
+    def _reap(self) -> None:
+        # Упавшие процессы убираются из списка (и заменяются при следующем scale)
+        for process in [p for p in self._processes if not p.is_alive()]:
+            print(f'Процесс {process.pid} завершился с кодом {process.exitcode}')
+            process.join()
+            self._processes.remove(process)
+        self._retired = [p for p in self._retired if p.is_alive()]
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _sleep(self, interval: float) -> None:
+        deadline = time.monotonic() + interval
+        while not self._stopping and time.monotonic() < deadline:
+            time.sleep(min(0.1, interval))
+
+
+def _child_main(target: Callable) -> None:
+    # SIGINT (Ctrl+C) получает вся группа процессов; дочерние останавливаются
+    # только по SIGTERM от супервизора, чтобы не прерывать сообщение на середине.
+    # До того как target установит свой обработчик SIGTERM (сообщений еще нет),
+    # процесс просто завершается
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+    target()
+
+
+def _exit_on_sigterm(signum, frame) -> None:
+    raise SystemExit(0)
+
+
+def queue_depth_getter(connection_params, queues: Sequence[str] = ('ml_task_queue',)) -> Callable[[], int]:
+    # Суммарная глубина очередей через пассивный queue_declare (очереди не создаются)
+    import pika
+
+    state = {"connection": None, "channel": None}
+
+    def get_depth() -> int:
+        if state["connection"] is None or state["connection"].is_closed:
+            state["connection"] = pika.BlockingConnection(connection_params)
+            state["channel"] = None
+        if state["channel"] is None or state["channel"].is_closed:
+            state["channel"] = state["connection"].channel()
+        try:
+            return sum(state["channel"].queue_declare(queue=queue, passive=True).method.message_count
+                       for queue in queues)
+        except Exception:
+            # Например, очереди еще нет (404 закрывает канал) или соединение потеряно
+            state["channel"] = None
+            raise
+
+    return get_depth
+
+
+def main() -> None:
+    # Модель загружается один раз при импорте worker, до fork дочерних процессов
+    from database.config import get_settings
+    from services.RabbitMQ import worker
+    from services.RabbitMQ.tasks import task_queues
+
+    settings = get_settings()
+    # Ждем инициализации RabbitMQ
+    time.sleep(settings.WORKER_STARTUP_DELAY_SECONDS)
+
+    supervisor = Supervisor(
+        worker.start_worker,
+        min_processes=settings.WORKER_PROCESSES_MIN,
+        max_processes=settings.WORKER_PROCESSES_MAX,
+        messages_per_process=settings.WORKER_SCALE_MESSAGES_PER_PROCESS,
+        drain_timeout=settings.WORKER_DRAIN_TIMEOUT_SECONDS
+    )
+    print(f'Supervisor started: {supervisor.min_processes}..{supervisor.max_processes} processes')
+    # Очереди обеих полос (services/RabbitMQ/tasks.py)
+    queues = list(task_queues(settings.TASK_BULK_SHARDS))
+    supervisor.run(queue_depth_getter(worker.connection_params, queues),
+                   interval=settings.WORKER_SCALE_INTERVAL_SECONDS)
+    print('Supervisor stopped')
+
+
+if __name__ == "__main__":
+    main()
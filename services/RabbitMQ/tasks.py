@@ -0,0 +1,221 @@
+import json
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from modelses.task import PredictionTask, TaskStatus
+from services.RabbitMQ.codec import MSGPACK, encode_task
+
+# Задачи очереди ml_task_queue со статусами:
+# - производитель создает запись queued и передает task_id в заголовке сообщения;
+# - воркер переводит задачу в running при получении и в done/failed в той же транзакции,
+#   что и результат (или отдельно, если сообщение не разобралось или обработка упала);
+# - после коммита воркер рассылает событие в fanout-обменник ml_task_events,
+#   веб-приложение ждет его вместо опроса таблицы (services/RabbitMQ/notifier.py).
+# Сообщения без task_id (старые производители) обрабатываются без статусов.
+#
+# Задачи разделены на полосы (lanes): небольшие интерактивные - в ml_task_queue,
+# большие - в очереди ml_task_queue.bulk.<n>, чтобы загрузка на десятки тысяч строк
+# не стояла перед запросами на одну строку. Очередь bulk выбирается по хэшу user_id:
+# поток задач одного пользователя занимает одну очередь и не стоит перед задачами
+# пользователей из других очередей. Воркер получает сообщения из всех очередей и выбирает
+# следующее по полосе и пользователю (services/RabbitMQ/scheduling.py)
+# по заголовкам lane и user_id.
+
+TASK_QUEUE = 'ml_task_queue'
+BULK_QUEUE = 'ml_task_queue.bulk'
+EVENTS_EXCHANGE = 'ml_task_events'
+TASK_ID_HEADER = 'task_id'
+USER_ID_HEADER = 'user_id'
+LANE_HEADER = 'lane'
+QUEUE_HEADER = 'queue'  # очередь публикации: в нее возвращаются повторы (services/RabbitMQ/retry.py)
+ENQUEUED_AT_HEADER = 'enqueued_at'  # time.time() публикации, для времени ожидания в очереди
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+INTERACTIVE_MAX_ROWS = 100
+BULK_SHARDS = 4
+
+# Статус задачи и ее итог: (status, prediction_id, error)
+TaskResult = Tuple[str, Optional[int], Optional[str]]
+
+
+def task_id_of(properties) -> Optional[str]:
+    headers = getattr(properties, "headers", None) or {}
+    task_id = headers.get(TASK_ID_HEADER)
+    if isinstance(task_id, bytes):
+        task_id = task_id.decode()
+    return task_id or None
+
+
+def lane_for(rows: int, interactive_max_rows: int = INTERACTIVE_MAX_ROWS) -> str:
+    return INTERACTIVE if rows <= interactive_max_rows else BULK
+
+
+def lane_of(properties) -> str:
+    # Сообщения без заголовка (старые производители) - интерактивные
+    headers = getattr(properties, "headers", None) or {}
+    lane = headers.get(LANE_HEADER)
+    if isinstance(lane, bytes):
+        lane = lane.decode()
+    return lane if lane in (INTERACTIVE, BULK) else INTERACTIVE
+
+
+def task_queue(lane: str, user_id: int, shards: int = BULK_SHARDS) -> str:
+    if lane != BULK:
+        return TASK_QUEUE
+    # crc32, а не hash(): номер очереди одинаков во всех процессах
+    return f"{BULK_QUEUE}.{zlib.crc32(str(user_id).encode()) % max(int(shards), 1)}"
+
+
+def task_queues(shards: int = BULK_SHARDS) -> Dict[str, str]:
+    # Все очереди задач: очередь -> полоса
+    return {TASK_QUEUE: INTERACTIVE, **{f"{BULK_QUEUE}.{i}": BULK for i in range(max(int(shards), 1))}}
+
+
+def task_headers(task_id: str, user_id: int, lane: str, queue: str) -> Dict:
+    return {TASK_ID_HEADER: task_id, USER_ID_HEADER: int(user_id), LANE_HEADER: lane,
+            QUEUE_HEADER: queue, ENQUEUED_AT_HEADER: time.time()}
+
+
+def create_task(session, user_id: int) -> PredictionTask:
+    # Запись задачи коммитится до публикации: воркер может получить сообщение
+    # раньше, чем производитель вернет task_id клиенту
+    task = PredictionTask(task_id=uuid.uuid4().hex, user_id=user_id)
+    session.add(task)
+    session.commit()
+    session.refresh(task)
+    return task
+
+
+def fail_task(session, task_id: str, error: str) -> None:
+    session.execute(failed_update([task_id], error))
+    session.commit()
+
+
+def submit_task(session, backend, user_id: int, data, content_type: str = MSGPACK,
+                lane: Optional[str] = None, shards: int = BULK_SHARDS) -> PredictionTask:
+    # Синхронный производитель через QueueBackend; в веб-приложении -
+    # TaskPublisher.enqueue_prediction (services/RabbitMQ/publisher.py).
+    # Полоса по умолчанию - по числу строк
+    body, content_type = encode_task(user_id, data, content_type)
+    lane = lane or lane_for(len(data))
+    queue = task_queue(lane, user_id, shards)
+    task = create_task(session, user_id)
+    try:
+        backend.publish(queue, body, headers=task_headers(task.task_id, user_id, lane, queue),
+                        content_type=content_type)
+    except Exception as e:
+        fail_task(session, task.task_id, f"publish failed: {e}")
+        raise
+    return task
+
+
+# Запросы статусов строятся отдельно от сессии: они выполняются и в Session,
+# и в AsyncSession (services/RabbitMQ/async_worker.py).
+# Завершенные задачи (done/failed) не перезаписываются
+
+def running_update(task_ids: List[str]):
+    return (
+        update(PredictionTask)
+        .where(PredictionTask.task_id.in_(task_ids), PredictionTask.status == TaskStatus.QUEUED.value)
+        .values(status=TaskStatus.RUNNING.value, started_at=datetime.utcnow())
+    )
+
+
+def failed_update(task_ids: List[str], error: str):
+    return (
+        update(PredictionTask)
+        .where(PredictionTask.task_id.in_(task_ids),
+               PredictionTask.status.in_((TaskStatus.QUEUED.value, TaskStatus.RUNNING.value)))
+        .values(status=TaskStatus.FAILED.value, error=error[:255], finished_at=datetime.utcnow())
+    )
+
+
+def retry_update(task_ids: List[str], error: str):
+    # Задача ждет повтора (services/RabbitMQ/retry.py): снова queued, с причиной
+    return (
+        update(PredictionTask)
+        .where(PredictionTask.task_id.in_(task_ids), PredictionTask.status == TaskStatus.RUNNING.value)
+        .values(status=TaskStatus.QUEUED.value, error=error[:255])
+    )
+
+
+def requeue_update(task_ids: List[str]):
+    # Повторная отправка из DLQ: задача снова queued, итог предыдущих попыток сбрасывается
+    return (
+        update(PredictionTask)
+        .where(PredictionTask.task_id.in_(task_ids), PredictionTask.status == TaskStatus.FAILED.value)
+        .values(status=TaskStatus.QUEUED.value, error=None, started_at=None, finished_at=None)
+    )
+
+
+def results_update(results: Dict[str, TaskResult]):
+    # Пакетный UPDATE по первичному ключу: session.execute(*results_update(results))
+    finished_at = datetime.utcnow()
+    return update(PredictionTask), [
+        {"task_id": task_id, "status": status, "prediction_id": prediction_id,
+         "error": error[:255] if error else None, "finished_at": finished_at}
+        for task_id, (status, prediction_id, error) in results.items()
+    ]
+
+
+def event_body(statuses: Dict[str, str]) -> bytes:
+    # Одно событие на пачку задач; committed_at - для замера задержки доставки
+    return json.dumps({"committed_at": time.time(), "tasks": statuses}).encode()
+
+
+def parse_event(body: bytes) -> Tuple[float, Dict[str, str]]:
+    event = json.loads(body)
+    return float(event["committed_at"]), dict(event["tasks"])
+
+
+class TaskTracker:
+    # Статусы задач для синхронных потребителей (worker.py, BatchConsumer).
+    # Ошибки записи статусов и рассылки событий не прерывают обработку сообщений:
+    # результат важнее статуса, а клиент перечитает статус по таймауту
+    def __init__(self, session_factory: Callable, backend=None):
+        self.session_factory = session_factory
+        self.backend = backend
+
+    def start(self, task_ids: List[str]) -> None:
+        if not task_ids:
+            return
+        try:
+            with self.session_factory() as session:
+                session.execute(running_update(task_ids))
+                session.commit()
+        except Exception as e:
+            print(f'Ошибка при обновлении статуса задач: {e}')
+            return
+        self.notify({task_id: TaskStatus.RUNNING.value for task_id in task_ids})
+
+    def fail(self, errors: Dict[str, str]) -> None:
+        # Задачи, результат которых не записан в транзакции обработки
+        self._update(failed_update, errors)
+
+    def retrying(self, errors: Dict[str, str]) -> None:
+        self._update(retry_update, errors)
+
+    def _update(self, statement, errors: Dict[str, str]) -> None:
+        if not errors:
+            return
+        try:
+            with self.session_factory() as session:
+                for task_id, error in errors.items():
+                    session.execute(statement([task_id], error))
+                session.commit()
+        except Exception as e:
+            print(f'Ошибка при обновлении статуса задач: {e}')
+
+    def notify(self, statuses: Dict[str, str]) -> None:
+        if not statuses or self.backend is None:
+            return
+        try:
+            self.backend.broadcast(EVENTS_EXCHANGE, event_body(statuses))
+        except Exception as e:
+            print(f'Ошибка при отправке событий задач: {e}')
@@ -1,5 +1,6 @@
 import modelses, database
 import pika
+import signal
 import time
 import json
 from modelses.models import MLModel, PredictionResult
@@ -7,90 +8,143 @@ from modelses.balance import Balance
 from modelses.user import User
 from sqlmodel import Session, create_engine, text
 import os
+from typing import List, Optional
 from database.databases import get_database_engine, get_session
-
-# Ждем инициализации RabbitMQ
-time.sleep(15)
+from database.config import get_settings
+from services.ml.registry import get_model, model_registry
+from services.RabbitMQ.batching import (
+    BatchConsumer, OUTCOME_ERRORS, DONE, INVALID, handle_batch, settle
+)
+from services.RabbitMQ.codec import decode_task
+from services.RabbitMQ.idempotency import SeenKeys, idempotency_key_of
+from services.RabbitMQ.queues import QueueBackend, RabbitMQBackend, rabbitmq_connection_params
+from services.RabbitMQ.retry import RetryPolicy, RetryRouter
+from services.RabbitMQ.scheduling import FairScheduler
+from services.RabbitMQ.tasks import TASK_QUEUE, TaskTracker, task_id_of, task_queues
 
 rabbitmq_host = os.getenv('RABBITMQ_HOST', 'localhost')
 
 # Настройки подключения к RabbitMQ
-connection_params = pika.ConnectionParameters(
-    host=rabbitmq_host,
-    port=5672,
-    virtual_host='/',
-    credentials=pika.PlainCredentials(
-        username='guest',
-        password='guest'
-    ),
-    heartbeat=30,
-    blocked_connection_timeout=2
-)
+connection_params = rabbitmq_connection_params(rabbitmq_host)
 
-# Инициализация модели и БД
-ml_model = MLModel()
-
-def process_prediction(user_id: int, data: list):
-    # Обрабатываем одно предсказание
-    with get_session() as session:
-        try:
-            # Получаем пользователя и баланс
-            user = session.get(User, user_id)
-            balance = session.get(Balance, user_id)
-            if not user or not balance:
-                print(f'Пользователь {user_id} или баланс не найдены')
-                return False
-
-            # Проверяем баланс
-            cost = ml_model.get_cost_predict()
-            if not balance.has_enough_credits(cost):
-                # raise ValueError("Not enough credits")
-                print(f"Недостаточно кредитов у пользователя {user_id}")
-                return False
-
-            # Делаем предсказание
-            predictions = ml_model.predict(data)
-
-            # Сохраняем результат
-            prediction = PredictionResult(
-                user_id=user_id,
-                prediction_rez=json.dumps(predictions),
-                cost=cost
-            )
-
-            # Обновляем баланс
-            balance.update_balance(-cost)
-            session.add(prediction)
-            session.add(balance)
-            session.commit()
-            print(f'Предсказание для пользователя {user_id} обработано')
-            return True
+# Общая модель процесса из реестра (загружается один раз)
+get_model()
+print(f'Модель загружена: {model_registry.stats()}')
 
-        except Exception as e:
-            print (f'Ошибка при обработке предсказания: {e}')
-            session.rollback()
-            return False
+# Ключи задач, закоммиченных этим процессом (services/RabbitMQ/idempotency.py)
+seen_keys = SeenKeys(get_settings().WORKER_SEEN_KEYS)
 
-def callback(ch, method, properties, body):
-    # Обрабатываем сообщение из очереди
+def callback(ch, method, properties, body, tracker=None, router=None):
+    # Обрабатываем сообщение из очереди. Подтверждение - по итогу обработки (batching.settle):
+    # упавшее сообщение уходит на повтор или в DLQ (services/RabbitMQ/retry.py), а не теряется
+    tag = method.delivery_tag
+    outcomes, errors = {}, {}
     try:
-        message = json.loads(body)
-        user_id = message['user_id']
-        data = message['data']
+        # Формат сообщения - по content_type (services/RabbitMQ/codec.py)
+        task = decode_task(tag, body, properties.content_type, task_id_of(properties),
+                           idempotency_key_of(properties))
+    except Exception as e:
+        print(f"Ошибка при разборе сообщения: {e}")
+        outcomes[tag] = INVALID
+        errors[tag] = f"{OUTCOME_ERRORS[INVALID]}: {e}"
+    else:
+        user_id = task.user_id
         print(f'Получено сообщение для пользователя {user_id}')
-        success=process_prediction(user_id, data)
-        if success:
+        if tracker is not None and task.task_id:
+            tracker.start([task.task_id])
+        # Та же транзакция, что и в пакетном режиме, из пачки в одно сообщение
+        outcomes = process_predictions_batch([task])
+        if task.error:
+            errors[tag] = task.error
+        if outcomes[tag] == DONE:
             print(f'Успешно обработано для {user_id}')
         else:
             print(f'Ошибка обработки для {user_id}')
 
-    except Exception as e:
-        print(f"Ошибка при обработке сообщения: {e}")
-    finally:
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+    settle(ch, [(tag, body, properties)], outcomes, errors, tracker, router)
+
+
+def process_predictions_batch(tasks: list) -> dict:
+    # Пачка сообщений одной транзакцией, с текущей моделью из реестра
+    return handle_batch(get_session, tasks, get_model(), seen_keys)
+
+
+def consume(backend: QueueBackend, queues: Optional[List[str]] = None):
+    # Подписка на очереди полос (services/RabbitMQ/tasks.py) через любой бэкенд
+    # (services/RabbitMQ/queues.py). Возвращает BatchConsumer в пакетном режиме, иначе None
+    settings = get_settings()
+    batched = settings.WORKER_BATCH_SIZE > 1
+    queues = queues or list(task_queues(settings.TASK_BULK_SHARDS))
+
+    # Объявляем очереди, очереди повтора и DLQ каждой очереди
+    policies = {
+        queue: RetryPolicy(
+            queue,
+            max_attempts=settings.WORKER_RETRY_MAX_ATTEMPTS,
+            base_delay=settings.WORKER_RETRY_BASE_SECONDS,
+            max_delay=settings.WORKER_RETRY_MAX_SECONDS
+        )
+        for queue in queues
+    }
+    for queue in queues:
+        backend.declare(queue)
+    router = RetryRouter(backend, policies.get(TASK_QUEUE, policies[queues[0]]), policies)
+    router.declare()
+
+    # Настройка fair dispatch; в пакетном режиме брокер должен отдавать целую пачку
+    prefetch_count = settings.WORKER_PREFETCH_COUNT
+    if batched:
+        prefetch_count = max(prefetch_count, settings.WORKER_BATCH_SIZE)
+
+    # Статусы задач и события о завершении (services/RabbitMQ/tasks.py)
+    tracker = TaskTracker(get_session, backend)
+    on_message = lambda ch, method, properties, body: callback(ch, method, properties, body, tracker, router)
+    consumer = None
+    if batched:
+        consumer = BatchConsumer(
+            backend,
+            process_predictions_batch,
+            max_batch_size=settings.WORKER_BATCH_SIZE,
+            max_wait_ms=settings.WORKER_BATCH_WAIT_MS,
+            tracker=tracker,
+            router=router
+        )
+        on_message = consumer.on_message
+        print(f'Пакетный режим: до {settings.WORKER_BATCH_SIZE} сообщений '
+              f'или {settings.WORKER_BATCH_WAIT_MS} мс, prefetch {prefetch_count}')
+
+    if settings.WORKER_FAIR_SCHEDULING:
+        # Очередность между полосами и пользователями (services/RabbitMQ/scheduling.py);
+        # сообщения в окне планировщика тоже занимают prefetch. Окно делится между очередями:
+        # если одна полоса заполнит все окно, сообщения другой будут ждать у брокера
+        scheduler = FairScheduler(
+            backend,
+            on_message,
+            window=settings.WORKER_SCHEDULER_WINDOW,
+            quantum=settings.WORKER_SCHEDULER_QUANTUM_BYTES,
+            interactive_weight=settings.WORKER_SCHEDULER_INTERACTIVE_WEIGHT,
+            max_wait_ms=settings.WORKER_SCHEDULER_WAIT_MS
+        )
+        on_message = scheduler.on_message
+        prefetch_count += max(scheduler.window // len(queues), 1)
+        print(f'Справедливая очередность: окно {scheduler.window} сообщений, prefetch {prefetch_count}')
+
+        def report():
+            print(f'Ожидание в очереди по полосам: {scheduler.stats()}')
+            backend.call_later(settings.WORKER_SCHEDULER_STATS_SECONDS, report)
+
+        if settings.WORKER_SCHEDULER_STATS_SECONDS > 0:
+            backend.call_later(settings.WORKER_SCHEDULER_STATS_SECONDS, report)
+
+    # Подписываемся на очереди; prefetch у каждого потребителя свой
+    for queue in queues:
+        backend.consume(queue, on_message, prefetch=prefetch_count)
+    return consumer
 
 
 def start_worker():
+    # Воркер в текущем процессе; по SIGTERM прекращает прием сообщений,
+    # дорабатывает и подтверждает уже полученные и завершается
     try:
         with get_session() as session:
             # Простой запрос для проверки подключения
@@ -103,24 +157,25 @@ def start_worker():
     # Запускаем воркера
     for i in range(10):
         try:
-            connection = pika.BlockingConnection(connection_params)
-            channel = connection.channel()
-
-            # Объявляем очередь
-            channel.queue_declare(queue='ml_task_queue', durable=True)
+            backend = RabbitMQBackend(connection_params)
+            consumer = consume(backend)
 
-            # Настройка fair dispatch
-            channel.basic_qos(prefetch_count=1)
+            def request_stop(signum, frame):
+                # Остановка выполняется из цикла доставки, после текущего сообщения
+                print("Получен сигнал остановки, завершаем обработку...")
+                backend.stop()
 
-            # Подписываемся на очередь
-            channel.basic_consume(
-                queue='ml_task_queue',
-                on_message_callback=callback,
-                auto_ack=False
-            )
+            signal.signal(signal.SIGTERM, request_stop)
 
             print("Worker started. Waiting for messages...")
-            channel.start_consuming()
+            backend.start()
+
+            # Сообщения из буфера пакетного режима обрабатываются до закрытия канала;
+            # полученные, но не переданные в обработку, брокер вернет в очередь
+            if consumer is not None:
+                consumer.flush()
+            backend.close()
+            print("Worker stopped")
             break
         except Exception as e:
             print(f"Ошибка подключения к RabbitMQ (попытка {i+1}/10): {e}")
@@ -130,4 +185,6 @@ def start_worker():
 
 
 if __name__ == "__main__":
+    # Ждем инициализации RabbitMQ
+    time.sleep(get_settings().WORKER_STARTUP_DELAY_SECONDS)
     start_worker()
\ No newline at end of file
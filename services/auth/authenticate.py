@@ -1,8 +1,9 @@
 import services, database
 from fastapi import Depends, HTTPException, status, Request
 from services.auth.jwt_handler import get_current_user_from_token
-from database.databases import get_session
-from sqlmodel import Session
+from database.databases import get_async_session
+from modelses.user import User
+from sqlmodel.ext.asyncio.session import AsyncSession
 from passlib.context import CryptContext
 
 # Хэширование паролей
@@ -17,7 +18,7 @@ def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 
-async def get_current_user(request: Request, session: Session = Depends(get_session)):
+async def get_current_user(request: Request, session: AsyncSession = Depends(get_async_session)):
     # Токен из заголовка Authorization
     auth_header = request.headers.get("Authorization")
 
@@ -31,9 +32,16 @@ async def get_current_user(request: Request, session: Session = Depends(get_sess
 
     try:
         user_data = get_current_user_from_token(token)
-        return user_data
     except HTTPException:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
         )
+
+    # Токен действителен, только пока пользователь существует (сессия запроса)
+    if await session.get(User, user_data["user_id"]) is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+        )
+    return user_data
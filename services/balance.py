@@ -1,4 +1,8 @@
+from datetime import datetime
+
+from sqlalchemy import update
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from modelses.user import User
 from modelses.transaction import Trans, TransactionType
 from modelses.balance import Balance
@@ -25,4 +29,95 @@ class BalanceService:
         #self.session.commit()
 
     def admin_deposit(self, user: User, amount: float) -> None:
-        pass
\ No newline at end of file
+        pass
+
+class AsyncBalanceService:
+    # Баланс и записи транзакций (Trans) на асинхронной сессии (database/databases.py)
+    # для обработчиков FastAPI. autocommit=False - изменения только отправляются в базу (flush), коммит делает
+    # обработчик один раз за запрос
+    def __init__(self, session: AsyncSession, autocommit: bool = True):
+        self.session = session
+        self.autocommit = autocommit
+
+    async def get_balance(self, user: User) -> float:
+        balance = await self.session.get(Balance, user.user_id)
+        if not balance:
+            # Создаем баланс если его нет
+            balance = Balance(user_id=user.user_id, amount=0.0)
+            self.session.add(balance)
+            await self._save()
+        return balance.amount
+
+    async def deposit(self, user: User, amount: float) -> None:
+        balance = await self.session.get(Balance, user.user_id)
+        if not balance:
+            balance = Balance(user_id=user.user_id, amount=amount)
+        else:
+            balance.amount += amount
+
+        self.session.add(balance)
+
+        # Создаем запись о транзакции
+        transaction = Trans(
+            transaction_id=f"trans_{datetime.now().timestamp()}",
+            user_id=user.user_id,
+            amount=amount,
+            transaction_type=TransactionType.DEPOSIT.value
+        )
+        self.session.add(transaction)
+        await self._save()
+
+    async def withdraw(self, user: User, amount: float) -> bool:
+        balance = await self.session.get(Balance, user.user_id)
+        if not balance or balance.amount < amount:
+            return False
+
+        balance.amount -= amount
+        self.session.add(balance)
+
+        # Создаем запись о транзакции
+        transaction = Trans(
+            transaction_id=f"trans_{datetime.now().timestamp()}",
+            user_id=user.user_id,
+            amount=-amount,
+            transaction_type=TransactionType.COST_PREDICTION.value
+        )
+        self.session.add(transaction)
+        await self._save()
+        return True
+
+    async def reserve(self, user: User, amount: float) -> bool:
+        # Резерв суммы до начала работы: атомарный UPDATE с проверкой остатка, параллельные
+        # списания не уводят баланс в минус. Запись в историю - в settle по итогу
+        result = await self.session.execute(
+            update(Balance)
+            .where(Balance.user_id == user.user_id, Balance.amount >= amount)
+            .values(amount=Balance.amount - amount)
+        )
+        if result.rowcount == 0:
+            return False
+        await self._save()
+        return True
+
+    async def settle(self, user: User, reserved: float, cost: float) -> None:
+        # Возврат неиспользованной части резерва и запись фактического списания
+        if reserved > cost:
+            await self.session.execute(
+                update(Balance)
+                .where(Balance.user_id == user.user_id)
+                .values(amount=Balance.amount + (reserved - cost))
+            )
+        if cost > 0:
+            self.session.add(Trans(
+                transaction_id=f"trans_{datetime.now().timestamp()}",
+                user_id=user.user_id,
+                amount=-cost,
+                transaction_type=TransactionType.COST_PREDICTION.value
+            ))
+        await self._save()
+
+    async def _save(self) -> None:
+        if self.autocommit:
+            await self.session.commit()
+        else:
+            await self.session.flush()
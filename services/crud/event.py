@@ -1,6 +1,7 @@
 import modelses
 from modelses.event import Event
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
@@ -95,4 +96,98 @@ def update_event(event_id: int, new_data: dict, session: Session) -> Optional[Ev
         session.rollback()
         raise ValueError(f"Database error while updating event: {str(e)}")
     except Exception as e:
-        raise ValueError(f"Unexpected error: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+# Асинхронные варианты для обработчиков FastAPI (AsyncSession, database/databases.py)
+
+async def get_all_events_async(session: AsyncSession) -> List[Event]:
+
+    try:
+        statement = select(Event)
+        events = (await session.exec(statement)).all()
+        return events
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while fetching events: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+async def get_event_by_id_async(event_id: int, session: AsyncSession) -> Optional[Event]:
+
+    try:
+        event = await session.get(Event, event_id)
+        return event
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while fetching event by ID: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def create_event_async(event_data: Event, session: AsyncSession) -> Event:
+
+    try:
+        session.add(event_data)
+        await session.commit()
+        await session.refresh(event_data)
+        return event_data
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while creating event: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def delete_event_async(event_id: int, session: AsyncSession) -> bool:
+
+    try:
+        event = await session.get(Event, event_id)
+        if not event:
+            return False
+
+        await session.delete(event)
+        await session.commit()
+        return True
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while deleting event: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def delete_all_events_async(session: AsyncSession) -> int:
+
+    try:
+        events = (await session.exec(select(Event))).all()
+        count = len(events)
+
+        for event in events:
+            await session.delete(event)
+
+        await session.commit()
+        return count
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while deleting all events: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def update_event_async(event_id: int, new_data: dict, session: AsyncSession) -> Optional[Event]:
+    try:
+         event = await session.get(Event, event_id)
+         if not event:
+            return None
+
+         for key, value in new_data.items():
+             setattr(event, key, value)
+
+         session.add(event)
+         await session.commit()
+         await session.refresh(event)
+         return event
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while updating event: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
@@ -0,0 +1,28 @@
+import modelses
+from modelses.models import PredictionResult
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from typing import List, Optional, Tuple
+from services.pagination import keyset, page
+
+
+def predictions_page_statement(user_id: int, limit: int, cursor: Optional[str] = None):
+    # Страница результатов пользователя, новые первыми
+    # (индекс ix_predictionresult_user_id_created_at); InvalidCursor - сразу
+    statement = select(PredictionResult).where(PredictionResult.user_id == user_id)
+    return keyset(statement, PredictionResult.created_at, PredictionResult.prediction_id, cursor, limit)
+
+
+async def get_predictions_page_async(user_id: int, session: AsyncSession, limit: int,
+                                     cursor: Optional[str] = None) -> Tuple[List[PredictionResult], Optional[str]]:
+    # Результаты и курсор следующей страницы (services/pagination.py)
+    statement = predictions_page_statement(user_id, limit, cursor)
+    try:
+        predictions = (await session.exec(statement)).all()
+        return page(predictions, limit, lambda prediction: (prediction.created_at, prediction.prediction_id))
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while fetching predictions: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
@@ -1,8 +1,10 @@
 import modelses
 from modelses.user import User
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from services.pagination import keyset, page
 
 
 def get_all_users(session: Session) -> List[User]:
@@ -17,6 +19,11 @@ def get_all_users(session: Session) -> List[User]:
         raise ValueError(f"Unexpected error: {str(e)}")
 
 
+def users_page_statement(limit: int, cursor: Optional[str] = None):
+    # Страница пользователей, новые первыми (индекс ix_user_created_at); InvalidCursor - сразу
+    return keyset(select(User), User.created_at, User.user_id, cursor, limit)
+
+
 def get_user_by_id(user_id: int, session: Session) -> Optional[User]:
 
     try:
@@ -76,4 +83,82 @@ def delete_user(user_id: int, session: Session) -> bool:
         session.rollback()
         raise ValueError(f"Database error while deleting user: {str(e)}")
     except Exception as e:
-        raise ValueError(f"Unexpected error: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+# Асинхронные варианты для обработчиков FastAPI (AsyncSession, database/databases.py)
+
+async def get_users_page_async(session: AsyncSession, limit: int,
+                               cursor: Optional[str] = None) -> Tuple[List[User], Optional[str]]:
+    # Пользователи и курсор следующей страницы (services/pagination.py)
+    statement = users_page_statement(limit, cursor)
+    try:
+        users = (await session.exec(statement)).all()
+        return page(users, limit, lambda user: (user.created_at, user.user_id))
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while fetching users: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def get_user_by_id_async(user_id: int, session: AsyncSession) -> Optional[User]:
+
+    try:
+        user = await session.get(User, user_id)
+        return user
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while fetching user by ID: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def get_user_by_email_async(email: str, session: AsyncSession) -> Optional[User]:
+
+    try:
+        statement = select(User).where(User.email == email)
+        user = (await session.exec(statement)).first()
+        return user
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while fetching user by email: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def create_user_async(user_data: User, session: AsyncSession) -> User:
+
+    try:
+        # Check if user with email already exists
+        existing_user = await get_user_by_email_async(user_data.email, session)
+        if existing_user:
+            raise ValueError(f"User with email {user_data.email} already exists")
+
+        session.add(user_data)
+        await session.commit()
+        await session.refresh(user_data)
+        return user_data
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while creating user: {str(e)}")
+    except ValueError as e:
+        raise
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
+
+
+async def delete_user_async(user_id: int, session: AsyncSession) -> bool:
+
+    try:
+        user = await session.get(User, user_id)
+        if not user:
+            return False
+
+        await session.delete(user)
+        await session.commit()
+        return True
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise ValueError(f"Database error while deleting user: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Unexpected error: {str(e)}")
@@ -0,0 +1,125 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+from database.config import get_settings
+
+
+class PoolStats:
+    # Счетчики пула: сколько задач отправлено, выполняется/ждет и завершено
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.submitted += 1
+            self.max_in_flight = max(self.max_in_flight, self.submitted - self.completed)
+
+    def finished(self, failed: bool) -> None:
+        with self._lock:
+            self.completed += 1
+            if failed:
+                self.failed += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            in_flight = self.submitted - self.completed
+            return {
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": in_flight,
+                # Глубина очереди: задачи, которым не хватило свободного воркера
+                "queue_depth": max(in_flight - self.workers, 0),
+                "max_in_flight": self.max_in_flight
+            }
+
+
+class ExecutorLayer:
+    # Пулы для блокирующей работы из async обработчиков:
+    # io - пул потоков для синхронных вызовов (SQLModel сессии и т.п.),
+    # cpu - пул процессов для тяжелых вычислений (bcrypt, инференс больших пачек).
+    # При cpu_workers=0 CPU задачи выполняются в пуле потоков.
+    def __init__(self, io_workers: int, cpu_workers: int):
+        self.io_workers = max(int(io_workers), 1)
+        self.cpu_workers = max(int(cpu_workers), 0)
+        self._io: Optional[Executor] = None
+        self._cpu: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "io": PoolStats(self.io_workers),
+            "cpu": PoolStats(self.cpu_workers or self.io_workers)
+        }
+
+    def _get_io(self) -> Executor:
+        if self._io is None:
+            with self._lock:
+                if self._io is None:
+                    self._io = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="io")
+        return self._io
+
+    def _get_cpu(self) -> Executor:
+        if self.cpu_workers == 0:
+            return self._get_io()
+        if self._cpu is None:
+            with self._lock:
+                if self._cpu is None:
+                    # spawn: дочерние процессы не наследуют потоки и event loop сервера
+                    self._cpu = ProcessPoolExecutor(
+                        max_workers=self.cpu_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._cpu
+
+    async def run_io(self, func: Callable, *args, **kwargs):
+        # Контекст вызывающей задачи (contextvars) переходит в поток, как в asyncio.to_thread
+        context = contextvars.copy_context()
+        return await self._run("io", self._get_io(), context.run, func, *args, **kwargs)
+
+    async def run_cpu(self, func: Callable, *args, **kwargs):
+        # func и аргументы должны сериализоваться pickle (функции уровня модуля)
+        return await self._run("cpu", self._get_cpu(), func, *args, **kwargs)
+
+    async def _run(self, pool: str, executor: Executor, func: Callable, *args, **kwargs):
+        stats = self._stats[pool]
+        stats.started()
+        failed = True
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+            failed = False
+            return result
+        finally:
+            stats.finished(failed)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for executor in (self._io, self._cpu):
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+            self._io = None
+            self._cpu = None
+
+
+_executors: Optional[ExecutorLayer] = None
+
+
+def get_executors() -> ExecutorLayer:
+    global _executors
+    if _executors is None:
+        settings = get_settings()
+        _executors = ExecutorLayer(settings.EXECUTOR_IO_WORKERS, settings.EXECUTOR_CPU_WORKERS)
+    return _executors
@@ -0,0 +1,138 @@
+import json
+import os
+import pickle
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from database.config import get_settings
+
+
+ARTIFACT_FORMAT = 1
+LATEST_FILE = "LATEST"
+META_FILE = "meta.json"
+
+# Массивы весов линейной модели, которые хранятся в отдельных .npy файлах
+LINEAR_ARRAYS = ("coef_", "intercept_", "classes_")
+
+
+def get_artifact_root(root: Optional[str] = None) -> Path:
+    return Path(root or get_settings().MODEL_ARTIFACT_DIR)
+
+
+def is_linear(estimator) -> bool:
+    # Линейная модель полностью описывается coef_/intercept_/classes_
+    return all(hasattr(estimator, name) for name in LINEAR_ARRAYS)
+
+
+def export_model(model, name: str = "iris", root: Optional[str] = None,
+                 version: Optional[str] = None) -> Path:
+    # Сохраняем обученную модель в версионированный каталог <root>/<name>/<version>
+    estimator = model._model
+    if estimator is None:
+        raise ValueError("Model is not trained")
+
+    version = version or datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    model_dir = get_artifact_root(root) / name
+    target = model_dir / version
+    target.mkdir(parents=True, exist_ok=False)
+
+    meta = {
+        "format": ARTIFACT_FORMAT,
+        "name": name,
+        "version": version,
+        "estimator": type(estimator).__name__,
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+    if is_linear(estimator):
+        meta["kind"] = "linear"
+        meta["params"] = estimator.get_params()
+        for attr in LINEAR_ARRAYS:
+            np.save(target / f"{attr.rstrip('_')}.npy", np.ascontiguousarray(getattr(estimator, attr)))
+    else:
+        # Для остальных оценщиков - обычный pickle без memory-map
+        meta["kind"] = "pickle"
+        with open(target / "estimator.pkl", "wb") as f:
+            pickle.dump(estimator, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    with open(target / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, default=str)
+
+    # Атомарно переключаем указатель на последнюю версию
+    tmp_latest = model_dir / f"{LATEST_FILE}.tmp"
+    tmp_latest.write_text(version, encoding="utf-8")
+    os.replace(tmp_latest, model_dir / LATEST_FILE)
+    return target
+
+
+def resolve_version(name: str = "iris", root: Optional[str] = None,
+                    version: Optional[str] = None) -> Optional[str]:
+    version = version or get_settings().MODEL_VERSION
+    if version:
+        return version
+
+    latest = get_artifact_root(root) / name / LATEST_FILE
+    if not latest.exists():
+        return None
+    return latest.read_text(encoding="utf-8").strip() or None
+
+
+def artifact_exists(name: str = "iris", version: Optional[str] = None, root: Optional[str] = None) -> bool:
+    # Есть ли экспортированная версия - проверка до загрузки, без запасного обучения
+    version = resolve_version(name, root, version)
+    return version is not None and (get_artifact_root(root) / name / version / META_FILE).exists()
+
+
+def load_artifact(name: str = "iris", root: Optional[str] = None,
+                  version: Optional[str] = None) -> Optional[Tuple[object, Dict]]:
+    # Загружаем модель из артефакта; веса отображаются в память (mmap),
+    # поэтому несколько процессов на одной машине делят одни и те же страницы
+    version = resolve_version(name, root, version)
+    if version is None:
+        return None
+
+    target = get_artifact_root(root) / name / version
+    meta_path = target / META_FILE
+    if not meta_path.exists():
+        return None
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format: {meta.get('format')}")
+
+    if meta["kind"] == "linear":
+        estimator = _build_linear(meta, target)
+    else:
+        with open(target / "estimator.pkl", "rb") as f:
+            estimator = pickle.load(f)
+    return estimator, meta
+
+
+def _build_linear(meta: Dict, target: Path):
+    from sklearn.linear_model import LogisticRegression
+
+    estimators = {"LogisticRegression": LogisticRegression}
+    estimator_cls = estimators.get(meta["estimator"])
+    if estimator_cls is None:
+        raise ValueError(f"Unsupported linear estimator: {meta['estimator']}")
+
+    estimator = estimator_cls(**meta.get("params", {}))
+    for attr in LINEAR_ARRAYS:
+        setattr(estimator, attr, np.load(target / f"{attr.rstrip('_')}.npy", mmap_mode="r"))
+    estimator.n_features_in_ = estimator.coef_.shape[1]
+    return estimator
+
+
+if __name__ == "__main__":
+    # Офлайн экспорт: python -m services.ml.artifacts [version]
+    from modelses.models import MLModel
+
+    ml_model = MLModel(use_artifact=False)
+    path = export_model(ml_model, version=sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Model exported to {path}")
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modelses.models import FEATURES
+
+
+class MicroBatcher:
+    # Собирает одиночные строки от параллельных запросов в один векторный predict.
+    # Пачка отправляется, когда набралось max_batch_size строк или прошло max_wait_ms
+    # с момента появления первой строки в очереди.
+    # runner - необязательная async функция (X, model) -> labels (например, пул процессов);
+    # в нее уходят пачки от offload_min_rows строк, меньшие считаются на месте.
+    # Строка считается той моделью, которая была активна при постановке в очередь,
+    # поэтому подмена модели не влияет на уже начатые запросы.
+    def __init__(self, model_getter: Callable, max_batch_size: int = 64,
+                 max_wait_ms: float = 2.0, window: int = 1000,
+                 runner: Optional[Callable] = None, offload_min_rows: int = 0):
+        self._model_getter = model_getter
+        self._runner = runner
+        self.offload_min_rows = offload_min_rows
+        self._tasks = set()
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000
+        self._pending: List[Tuple[Tuple[float, ...], asyncio.Future, float, object]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Метрики: последние значения ожидания в очереди и размеры пачек
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=window)
+        self._batch_sizes: Deque[int] = deque(maxlen=window)
+        self._batches = 0
+        self._rows = 0
+
+    async def predict(self, data: List[Dict], model=None) -> List[Dict]:
+        # Тот же контракт, что у MLModel.predict: список словарей на вход и на выход
+        if not data:
+            return []
+
+        # Все строки запроса разбираются до постановки в очередь: ошибка в любой из них
+        # не оставляет в пачке строки, результат которых уже никто не ждет
+        rows = [tuple(float(item.get(name, 0.0)) for name in FEATURES) for item in data]
+
+        model = model or self._model_getter()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for row in rows:
+            future = loop.create_future()
+            self._pending.append((row, future, time.perf_counter(), model))
+            futures.append(future)
+
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+
+        labels = await asyncio.gather(*futures)
+        return [{"color": label} for label in labels]
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        self._record(batch, started)
+
+        # Обычно вся пачка относится к одной модели; во время подмены их может быть две
+        groups: Dict[int, List] = {}
+        for entry in batch:
+            groups.setdefault(id(entry[3]), []).append(entry)
+        for group in groups.values():
+            self._predict_group(group[0][3], group)
+
+    def _predict_group(self, model, batch) -> None:
+        X = np.array([row for row, _, _, _ in batch], dtype=np.float64)
+        if self._runner is not None and len(batch) >= self.offload_min_rows:
+            task = asyncio.get_running_loop().create_task(self._resolve_offloaded(model, batch, X))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return
+
+        try:
+            labels = model.predict_columns(X).tolist()
+        except Exception:
+            # Ошибка одной строки не должна ронять всю пачку: повторяем построчно
+            self._resolve_one_by_one(model, batch)
+            return
+        self._resolve(batch, labels)
+
+    async def _resolve_offloaded(self, model, batch, X: np.ndarray) -> None:
+        try:
+            labels = await self._runner(X, model)
+        except Exception:
+            self._resolve_one_by_one(model, batch)
+            return
+        self._resolve(batch, labels)
+
+    @staticmethod
+    def _resolve(batch, labels: List[str]) -> None:
+        for (_, future, _, _), label in zip(batch, labels):
+            if not future.done():
+                future.set_result(label)
+
+    @staticmethod
+    def _resolve_one_by_one(model, batch) -> None:
+        for row, future, _, _ in batch:
+            if future.done():
+                continue
+            try:
+                future.set_result(model.predict_columns(np.array([row]))[0].item())
+            except Exception as e:
+                future.set_exception(e)
+
+    def _record(self, batch, flushed_at: float) -> None:
+        with self._lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._waits.extend(flushed_at - enqueued_at for _, _, enqueued_at, _ in batch)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = np.array(self._waits) * 1000 if self._waits else np.zeros(1)
+            sizes = np.array(self._batch_sizes) if self._batch_sizes else np.zeros(1)
+            return {
+                "batches": self._batches,
+                "rows": self._rows,
+                "pending": len(self._pending),
+                "batch_size_avg": round(float(sizes.mean()), 2),
+                "batch_size_max": int(sizes.max()),
+                "queue_wait_ms_avg": round(float(waits.mean()), 3),
+                "queue_wait_ms_p50": round(float(np.percentile(waits, 50)), 3),
+                "queue_wait_ms_p99": round(float(np.percentile(waits, 99)), 3),
+                "queue_wait_ms_max": round(float(waits.max()), 3)
+            }
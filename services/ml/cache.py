@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from database.config import get_settings
+
+
+class PredictionCache:
+    # Ограниченный LRU кэш предсказаний с TTL.
+    # Ключ - версия модели и признаки, округленные до decimals знаков.
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300.0,
+                 decimals: int = 2, max_batch_rows: int = 256):
+        self.max_size = max(int(max_size), 1)
+        self.ttl = float(ttl_seconds)
+        self.decimals = int(decimals)
+        # Для больших пачек построчный поиск в кэше дороже векторного predict
+        self.max_batch_rows = int(max_batch_rows)
+        self._entries: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def normalize(self, X: np.ndarray) -> np.ndarray:
+        return np.round(X, self.decimals)
+
+    def get(self, version: Hashable, row: Tuple[float, ...]) -> Optional[str]:
+        key = (version, row)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            label, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return label
+
+    def put(self, version: Hashable, row: Tuple[float, ...], label: str) -> None:
+        key = (version, row)
+        with self._lock:
+            self._entries[key] = (label, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+_cache: Optional[PredictionCache] = None
+
+
+def get_prediction_cache() -> Optional[PredictionCache]:
+    # Общий кэш процесса; None, если кэш выключен в настройках
+    global _cache
+    settings = get_settings()
+    if not settings.PREDICTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = PredictionCache(
+            max_size=settings.PREDICTION_CACHE_SIZE,
+            ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+            decimals=settings.PREDICTION_CACHE_DECIMALS
+        )
+    return _cache
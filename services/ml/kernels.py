@@ -0,0 +1,51 @@
+from typing import Optional
+
+import numpy as np
+
+
+class LinearKernel:
+    # Быстрое предсказание линейного классификатора без накладных расходов sklearn
+    # (проверки входа, выбор namespace и т.п.). Повторяет LinearClassifierMixin.predict:
+    # те же операции над теми же массивами, поэтому метки совпадают побитно.
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray):
+        # Веса подготавливаются один раз при загрузке модели
+        self.coef_t = coef.T if coef.ndim == 2 else coef
+        self.intercept = intercept
+        self.classes = np.asarray(classes)
+        self.n_features = coef.shape[-1]
+        self.binary = coef.ndim == 2 and coef.shape[0] == 1
+
+    @classmethod
+    def from_estimator(cls, estimator) -> Optional["LinearKernel"]:
+        # Ядро строится только для классификаторов, которые используют
+        # стандартные predict/decision_function из LinearClassifierMixin
+        try:
+            from sklearn.linear_model._base import LinearClassifierMixin
+        except ImportError:
+            return None
+
+        estimator_cls = type(estimator)
+        if not isinstance(estimator, LinearClassifierMixin):
+            return None
+        if estimator_cls.predict is not LinearClassifierMixin.predict:
+            return None
+        if estimator_cls.decision_function is not LinearClassifierMixin.decision_function:
+            return None
+        if not all(hasattr(estimator, name) for name in ("coef_", "intercept_", "classes_")):
+            return None
+
+        return cls(estimator.coef_, estimator.intercept_, estimator.classes_)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        # X - матрица float64 формы (n, n_features), как после MLModel._to_matrix
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but model expects {self.n_features}")
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity")
+
+        scores = X @ self.coef_t + self.intercept
+        if self.binary:
+            indices = (scores.reshape(-1) > 0).astype(np.intp)
+        else:
+            indices = scores.argmax(axis=1)
+        return self.classes.take(indices, axis=0)
@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Deque, Dict, Optional
+
+from services.ml.registry import DEFAULT_MODEL, ModelRegistry, model_registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLifecycle:
+    # Смена версий модели без простоя: новая версия обучается или загружается
+    # в фоновом потоке, затем ссылка в реестре подменяется атомарно.
+    # Путь запроса никогда не ждет обучения - он берет текущую модель из реестра.
+    def __init__(self, registry: ModelRegistry = model_registry, name: str = DEFAULT_MODEL,
+                 export: bool = True, history_size: int = 20):
+        self.registry = registry
+        self.name = name
+        # Переобученная модель экспортируется в артефакт, чтобы ее подхватили другие процессы
+        self.export = export
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-lifecycle")
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self._history: Deque[Dict] = deque(maxlen=history_size)
+
+    def retrain(self) -> Future:
+        return self._submit("retrain", self._retrain)
+
+    def load_version(self, version: str) -> Future:
+        return self._submit("load", self._load_version, version)
+
+    def _submit(self, action: str, func, *args) -> Future:
+        # Повторный запрос, пока предыдущий не завершен, возвращает тот же Future
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return self._pending
+            self._pending = self._executor.submit(self._run, action, func, *args)
+            return self._pending
+
+    def _run(self, action: str, func, *args):
+        event = {"action": action, "started_at": datetime.utcnow().isoformat(), "status": "running"}
+        self._history.append(event)
+        started = time.perf_counter()
+        try:
+            model, stats = func(*args)
+            previous = self.registry.swap(self.name, model, stats)
+            event.update(
+                status="done",
+                version=model.version,
+                previous_version=getattr(previous, "version", None)
+            )
+            logger.info(f"Model '{self.name}' switched to version {model.version}")
+            return model
+        except Exception as e:
+            event.update(status="failed", error=str(e))
+            logger.error(f"Model '{self.name}' {action} failed: {e}")
+            raise
+        finally:
+            event["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _retrain(self):
+        model, stats = self.registry.build(self.name, train=True)
+        if self.export:
+            from services.ml.artifacts import export_model
+
+            version = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+            export_model(model, name=self.name, version=version)
+            model.version = version
+            model.source = "artifact"
+            stats["version"] = version
+            stats["source"] = "artifact"
+        return model, stats
+
+    def _load_version(self, version: str):
+        from services.ml.artifacts import artifact_exists
+
+        # Проверяем каталог версии до build: иначе фабрика обучит модель и ошибка будет после обучения
+        if not artifact_exists(self.name, version):
+            raise ValueError(f"Artifact version {version} not found")
+        model, stats = self.registry.build(self.name, version=version)
+        if model.version != version:
+            raise ValueError(f"Artifact version {version} not found")
+        return model, stats
+
+    def status(self) -> Dict:
+        pending = self._pending is not None and not self._pending.done()
+        return {
+            "active_version": self.registry.stats().get(self.name, {}).get("version"),
+            "in_progress": pending,
+            "history": list(self._history)
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_lifecycle: Optional[ModelLifecycle] = None
+
+
+def get_lifecycle() -> ModelLifecycle:
+    global _lifecycle
+    if _lifecycle is None:
+        _lifecycle = ModelLifecycle()
+    return _lifecycle
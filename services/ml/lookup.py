@@ -0,0 +1,155 @@
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionGrid:
+    # Предвычисленные классы модели на сетке [low, high] x [low, high] с шагом 1 / cells_per_unit.
+    # Предсказание - ближайший узел сетки, O(1) арифметика индексов вместо вызова модели.
+    # Узлы считаются как k / cells_per_unit, поэтому значения формы с шагом 0.1
+    # (при cells_per_unit=10) попадают точно в узлы и совпадают с моделью.
+    CHUNK_ROWS = 1_000_000
+
+    def __init__(self, table: np.ndarray, low: float, high: float, cells_per_unit: int):
+        self.table = table
+        self.low = float(low)
+        self.high = float(high)
+        self.cells_per_unit = int(cells_per_unit)
+        self.size = table.shape[0]
+
+    @classmethod
+    def build(cls, model, low: float = 0.0, high: float = 100.0, cells_per_unit: int = 10) -> "DecisionGrid":
+        size = int(round((high - low) * cells_per_unit)) + 1
+        axis = low + np.arange(size) / cells_per_unit
+
+        table = np.empty((size, size), dtype=np.uint8)
+        flat = table.reshape(-1)
+        # Узлы перебираются кусками, чтобы не держать в памяти всю матрицу признаков
+        rows_per_chunk = max(cls.CHUNK_ROWS // size, 1)
+        for start in range(0, size, rows_per_chunk):
+            stop = min(start + rows_per_chunk, size)
+            X = np.empty(((stop - start) * size, 2), dtype=np.float64)
+            X[:, 0] = np.repeat(axis[start:stop], size)
+            X[:, 1] = np.tile(axis, stop - start)
+            flat[start * size:stop * size] = cls._raw_predict(model, X)
+        return cls(table, low, high, cells_per_unit)
+
+    @staticmethod
+    def _raw_predict(model, X: np.ndarray) -> np.ndarray:
+        # Индексы классов модели; в uint8 помещаются только классы 0..255
+        predictions = np.asarray(model._raw_predict(X))
+        if predictions.size and (predictions.min() < 0 or predictions.max() > 255):
+            raise ValueError("Model classes do not fit into uint8 lookup table")
+        return predictions.astype(np.uint8)
+
+    @classmethod
+    def load_or_build(cls, model, path: Optional[Path], low: float = 0.0,
+                      high: float = 100.0, cells_per_unit: int = 10) -> "DecisionGrid":
+        # Таблица сохраняется рядом с артефактом модели и открывается через mmap.
+        # Рядом (path.json) - границы, шаг и версия модели, по которым она построена:
+        # таблица с другими параметрами не переиспользуется, а строится заново
+        meta = {"low": float(low), "high": float(high), "cells_per_unit": int(cells_per_unit),
+                "version": getattr(model, "version", None)}
+        meta_path = path.with_suffix(".json") if path is not None else None
+        if path is not None and path.exists() and meta_path.exists():
+            if json.loads(meta_path.read_text(encoding="utf-8")) == meta:
+                table = np.load(path, mmap_mode="r")
+                grid = cls(table, low, high, cells_per_unit)
+                if table.shape == (grid._expected_size(),) * 2:
+                    return grid
+
+        grid = cls.build(model, low, high, cells_per_unit)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp.npy")
+            np.save(tmp_path, grid.table)
+            # Сначала таблица, потом параметры: при гонке старые параметры с новой таблицей
+            # не совпадут и таблица будет построена заново, а не прочитана с чужими границами
+            tmp_path.replace(path)
+            tmp_meta = path.with_suffix(".tmp.json")
+            tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+            tmp_meta.replace(meta_path)
+        return grid
+
+    def _expected_size(self) -> int:
+        return int(round((self.high - self.low) * self.cells_per_unit)) + 1
+
+    def contains(self, X: np.ndarray) -> np.ndarray:
+        return ((X >= self.low) & (X <= self.high)).all(axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        # X должен лежать в границах сетки (см. contains)
+        index = np.rint((X - self.low) * self.cells_per_unit).astype(np.intp)
+        np.clip(index, 0, self.size - 1, out=index)
+        return self.table[index[:, 0], index[:, 1]]
+
+    def check_accuracy(self, model, step: int = 1) -> Dict:
+        # Сверка с моделью на границах ячеек (середины между узлами) - худший случай
+        # для поиска ближайшего узла. step > 1 проверяет каждую step-ю границу.
+        edges = self.low + (np.arange(0, self.size - 1, step) + 0.5) / self.cells_per_unit
+        nodes = self.low + np.arange(0, self.size, step) / self.cells_per_unit
+        eps = 1e-9
+
+        chunk = max(self.CHUNK_ROWS // len(nodes), 1)
+
+        checked = 0
+        mismatches = 0
+        # Граница по одной оси (чуть левее и чуть правее), узлы - по другой
+        for axis in (0, 1):
+            for shift in (-eps, eps):
+                for start in range(0, len(edges), chunk):
+                    part = edges[start:start + chunk] + shift
+                    X = np.empty((len(part) * len(nodes), 2), dtype=np.float64)
+                    X[:, axis] = np.repeat(part, len(nodes))
+                    X[:, 1 - axis] = np.tile(nodes, len(part))
+                    X = X[self.contains(X)]
+                    expected = self._raw_predict(model, X)
+                    mismatches += int((self.predict(X) != expected).sum())
+                    checked += len(X)
+
+        return {
+            "points": checked,
+            "mismatches": mismatches,
+            "mismatch_rate": mismatches / checked if checked else 0.0
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "low": self.low,
+            "high": self.high,
+            "cells_per_unit": self.cells_per_unit,
+            "shape": list(self.table.shape),
+            "bytes": int(self.table.nbytes),
+            "memory_mapped": isinstance(self.table, np.memmap)
+        }
+
+
+def attach_grid(model, settings, name: str = "iris") -> Optional[DecisionGrid]:
+    # Режим PREDICTION_MODE="grid": таблица строится при загрузке модели;
+    # для модели из артефакта она кэшируется на диске рядом с весами
+    from services.ml.artifacts import get_artifact_root
+
+    path = None
+    if model.source == "artifact":
+        path = (get_artifact_root() / name / model.version /
+                f"grid-{settings.PREDICTION_GRID_LOW:g}-{settings.PREDICTION_GRID_HIGH:g}-"
+                f"{settings.PREDICTION_GRID_CELLS_PER_UNIT}.npy")
+
+    grid = DecisionGrid.load_or_build(
+        model, path,
+        low=settings.PREDICTION_GRID_LOW,
+        high=settings.PREDICTION_GRID_HIGH,
+        cells_per_unit=settings.PREDICTION_GRID_CELLS_PER_UNIT
+    )
+    if settings.PREDICTION_GRID_VERIFY:
+        result = grid.check_accuracy(model)
+        if result["mismatches"]:
+            logger.warning(f"Decision grid differs from the model: {result}")
+    model.enable_grid(grid)
+    return grid
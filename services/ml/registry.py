@@ -0,0 +1,170 @@
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+DEFAULT_MODEL = "iris"
+# Версия модели, обученной в процессе без артефакта (modelses/models.py)
+TRAINED_VERSION = "untracked"
+
+
+class ModelRegistry:
+    # Реестр моделей процесса: каждая модель загружается (или обучается) один раз,
+    # дальше все потребители получают один и тот же экземпляр только для чтения
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._models: Dict[str, object] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable) -> None:
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str = DEFAULT_MODEL):
+        # Быстрый путь без блокировки: модель уже загружена
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._load(name)
+            return model
+
+    def reload(self, name: str = DEFAULT_MODEL, **options):
+        # Повторная загрузка модели (например, после переобучения).
+        # Модель строится без блокировки реестра, запросы продолжают работать на старой
+        model, stats = self.build(name, **options)
+        self.swap(name, model, stats)
+        return model
+
+    def swap(self, name: str, model, stats: Optional[Dict] = None):
+        # Атомарная подмена ссылки: новые запросы получают новую модель,
+        # уже начатые дорабатывают на ссылке на старую
+        with self._lock:
+            previous = self._models.get(name)
+            self._models[name] = model
+            self._stats[name] = stats or self._describe(model, 0.0, None, None)
+
+        # При замене модели сбрасываем кэш предсказаний старой версии
+        if previous is not None and previous is not model and hasattr(previous, "invalidate_cache"):
+            previous.invalidate_cache()
+        return previous
+
+    def ensure_version(self, name: str, version: str):
+        # Модель нужной версии: текущая, если версия совпадает, иначе загрузка этой версии -
+        # из артефакта или, если модель обучена без артефакта (TRAINED_VERSION), обучением.
+        # Неизвестная версия - ошибка без запасного обучения
+        model = self.get(name)
+        if model.version == version:
+            return model
+        if version == TRAINED_VERSION:
+            options = {"train": True}
+        else:
+            from services.ml.artifacts import artifact_exists
+
+            if not artifact_exists(name, version):
+                raise ValueError(f"Artifact version {version} not found")
+            options = {"version": version}
+        model, stats = self.build(name, **options)
+        self.swap(name, model, stats)
+        return model
+
+    def preload(self, *names: str) -> None:
+        for name in names or (DEFAULT_MODEL,):
+            self.get(name)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def build(self, name: str = DEFAULT_MODEL, **options):
+        # Создание экземпляра модели без установки в реестр (можно вызывать в фоне)
+        factory = self._factories.get(name)
+        if factory is None:
+            raise KeyError(f"Model '{name}' is not registered")
+
+        # Замеряем время загрузки и прирост RSS процесса
+        # (tracemalloc здесь не подходит: он в разы замедляет импорт sklearn)
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        model = factory(**options)
+        load_time = time.perf_counter() - started
+        rss_after = _rss_bytes()
+
+        if hasattr(model, "freeze"):
+            model.freeze()
+        return model, self._describe(model, load_time, rss_before, rss_after)
+
+    def _load(self, name: str):
+        # Вызывается под self._lock
+        model, stats = self.build(name)
+        self._models[name] = model
+        self._stats[name] = stats
+        return model
+
+    @staticmethod
+    def _describe(model, load_time: float, rss_before, rss_after) -> Dict:
+        return {
+            "load_time_ms": round(load_time * 1000, 3),
+            "memory_bytes": _estimator_size(model),
+            "rss_delta_bytes": max(rss_after - rss_before, 0) if rss_before is not None else None,
+            "loaded_at": datetime.utcnow().isoformat(),
+            "version": getattr(model, "version", None),
+            "source": getattr(model, "source", None),
+            "grid": model._grid.stats() if getattr(model, "_grid", None) is not None else None
+        }
+
+
+def _rss_bytes():
+    # Текущий RSS процесса (Linux); на других системах метрика недоступна
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _estimator_size(model) -> int:
+    # Размер параметров модели (сериализованный оценщик)
+    try:
+        return len(pickle.dumps(getattr(model, "_model", model), protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def _iris_factory(version: Optional[str] = None, train: bool = False):
+    # version - конкретная версия артефакта, train - обучить заново вместо загрузки
+    from modelses.models import MLModel
+    from services.ml.cache import get_prediction_cache
+    from database.config import get_settings
+
+    model = MLModel(use_artifact=not train, version=version)
+    settings = get_settings()
+    if settings.PREDICTION_MODE == "grid":
+        from services.ml.lookup import attach_grid
+        attach_grid(model, settings)
+
+    cache = get_prediction_cache()
+    if cache is not None:
+        model.enable_cache(cache)
+    return model
+
+
+model_registry = ModelRegistry()
+model_registry.register(DEFAULT_MODEL, _iris_factory)
+
+
+def get_model(name: str = DEFAULT_MODEL):
+    return model_registry.get(name)
+
+
+def predict_matrix(X, name: str = DEFAULT_MODEL, version: Optional[str] = None) -> list:
+    # Предсказание для пула процессов: модель загружается в дочернем процессе один раз.
+    # Если родитель уже переключился на другую версию - догружаем ее
+    model = get_model(name) if version is None else model_registry.ensure_version(name, version)
+    return model.predict_columns(X).tolist()
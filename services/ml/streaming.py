@@ -0,0 +1,206 @@
+import csv
+import io
+import json
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from modelses.models import FEATURES
+
+
+FORMATS = {
+    "csv": "csv",
+    "text/csv": "csv",
+    "ndjson": "ndjson",
+    "jsonl": "ndjson",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def detect_format(content_type: Optional[str], fmt: Optional[str] = None) -> str:
+    # Явный параметр format важнее заголовка Content-Type
+    key = (fmt or content_type or "").split(";")[0].strip().lower()
+    if key not in FORMATS:
+        raise ValueError(f"Unsupported upload format: {key or 'unknown'}")
+    return FORMATS[key]
+
+
+class ChunkParser:
+    # Инкрементальный разбор CSV/NDJSON: байты приходят кусками произвольного размера,
+    # на выходе матрицы признаков ровно по chunk_rows строк (последняя - остаток).
+    # В памяти держится не больше одного неполного куска, поэтому размер файла не важен.
+    # Строки, которые не удалось разобрать, помечаются NaN.
+    MAX_LINE_BYTES = 64 * 1024
+
+    def __init__(self, fmt: str, chunk_rows: int = 10000):
+        self.fmt = fmt
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self._tail = b""
+        self._lines: List[bytes] = []
+        self._columns: Optional[List[int]] = None
+
+    def feed(self, data: bytes) -> List[np.ndarray]:
+        lines = (self._tail + data).split(b"\n")
+        self._tail = lines.pop()
+        if len(self._tail) > self.MAX_LINE_BYTES:
+            raise ValueError("Upload line is too long")
+        return self._add_lines(lines)
+
+    def close(self) -> List[np.ndarray]:
+        tail, self._tail = self._tail, b""
+        chunks = self._add_lines([tail])
+        if self._lines:
+            chunks.append(self._parse(self._lines))
+            self._lines = []
+        return chunks
+
+    def _add_lines(self, lines: List[bytes]) -> List[np.ndarray]:
+        lines = [line for line in map(bytes.strip, lines) if line]
+        if lines and self.fmt == "csv" and self._columns is None:
+            self._columns = self._read_header(lines.pop(0))
+
+        chunks = []
+        self._lines.extend(lines)
+        while len(self._lines) >= self.chunk_rows:
+            chunks.append(self._parse(self._lines[:self.chunk_rows]))
+            del self._lines[:self.chunk_rows]
+        return chunks
+
+    @staticmethod
+    def _read_header(line: bytes) -> List[int]:
+        header = [name.strip().lower() for name in next(csv.reader([line.decode("utf-8-sig")]))]
+        missing = [name for name in FEATURES if name not in header]
+        if missing:
+            raise ValueError(f"CSV header must contain columns: {', '.join(missing)}")
+        return [header.index(name) for name in FEATURES]
+
+    def _parse(self, lines: List[bytes]) -> np.ndarray:
+        if self.fmt == "csv":
+            return self._parse_csv(lines)
+        return self._parse_ndjson(lines)
+
+    def _parse_csv(self, lines: List[bytes]) -> np.ndarray:
+        try:
+            # Быстрый путь: разбор всего куска в C коде numpy
+            X = np.loadtxt(io.BytesIO(b"\n".join(lines)), delimiter=",", usecols=self._columns,
+                           dtype=np.float64, ndmin=2)
+            if X.shape == (len(lines), len(FEATURES)):
+                return X
+        except ValueError:
+            pass
+
+        # Есть некорректные строки - разбираем построчно
+        X = np.full((len(lines), len(FEATURES)), np.nan)
+        for i, line in enumerate(lines):
+            fields = line.split(b",")
+            try:
+                X[i] = [float(fields[j]) for j in self._columns]
+            except (ValueError, IndexError):
+                pass
+        return X
+
+    @staticmethod
+    def _parse_ndjson(lines: List[bytes]) -> np.ndarray:
+        # Тот же контракт, что у MLModel.predict: отсутствующий признак равен 0.0
+        X = np.full((len(lines), len(FEATURES)), np.nan)
+        for i, line in enumerate(lines):
+            try:
+                item = json.loads(line)
+                X[i] = [float(item.get(name, 0.0)) for name in FEATURES]
+            except (ValueError, TypeError, AttributeError):
+                pass
+        return X
+
+
+def predict_chunk(model, X: np.ndarray) -> np.ndarray:
+    # Классы для корректных строк, None для строк с ошибкой разбора и нечисловыми
+    # значениями (nan, inf, переполнение вроде 1e400) - модель их не принимает
+    labels = np.full(len(X), None, dtype=object)
+    valid = np.isfinite(X).all(axis=1)
+    if valid.any():
+        labels[valid] = model.predict_columns(X[valid])
+    return labels
+
+
+ERROR_LINE = '{"row": %d, "error": "invalid row"}\n'
+
+
+def format_labels(labels: np.ndarray, first_row: int) -> bytes:
+    # Классы - фиксированный набор строк, поэтому JSON собирается форматированием
+    templates = {None: ERROR_LINE}
+    for label in set(labels.tolist()) - {None}:
+        templates[label] = '{"row": %%d, "color": "%s"}\n' % label
+    return "".join([
+        templates[label] % row for row, label in enumerate(labels.tolist(), start=first_row)
+    ]).encode()
+
+
+class StreamStats:
+    def __init__(self):
+        self.rows = 0
+        self.predicted = 0
+        self.errors = 0
+        self.truncated = False
+        self.counts: Dict[str, int] = {}
+
+    def add(self, labels: np.ndarray) -> None:
+        self.rows += len(labels)
+        for label, count in Counter(labels.tolist()).items():
+            if label is None:
+                self.errors += count
+            else:
+                self.counts[label] = self.counts.get(label, 0) + count
+                self.predicted += count
+
+    def as_dict(self) -> Dict:
+        return {
+            "rows": self.rows,
+            "predicted": self.predicted,
+            "errors": self.errors,
+            "truncated": self.truncated,
+            "counts": dict(self.counts)
+        }
+
+
+async def _run_inline(func, *args):
+    return func(*args)
+
+
+async def stream_predictions(model, body: AsyncIterator[bytes], fmt: str,
+                             stats: StreamStats, chunk_rows: int = 10000,
+                             max_rows: Optional[int] = None, run=None) -> AsyncIterator[bytes]:
+    # Разбор загрузки и предсказания по кускам; результат отдается в NDJSON
+    # по мере поступления данных, не дожидаясь конца файла.
+    # run - исполнитель для разбора и predict куска (например, пул потоков), чтобы не
+    # блокировать event loop; max_rows - ограничение по предсказанным строкам (например,
+    # по балансу), строки с ошибкой в него не входят.
+    run = run or _run_inline
+    parser = ChunkParser(fmt, chunk_rows)
+
+    def process(data: Optional[bytes]) -> List[np.ndarray]:
+        chunks = parser.close() if data is None else parser.feed(data)
+        return [predict_chunk(model, X) for X in chunks]
+
+    async def chunks():
+        async for data in body:
+            if data:
+                yield await run(process, data)
+        yield await run(process, None)
+
+    async for results in chunks():
+        for labels in results:
+            if max_rows is not None:
+                # Обрезаем перед первой предсказанной строкой сверх ограничения
+                predicted = np.cumsum(np.not_equal(labels, None))
+                remaining = max(max_rows - stats.predicted, 0)
+                if len(labels) and predicted[-1] > remaining:
+                    labels = labels[:int(np.searchsorted(predicted, remaining + 1))]
+                    stats.truncated = True
+            first_row = stats.rows
+            stats.add(labels)
+            if len(labels):
+                yield format_labels(labels, first_row)
+            if stats.truncated:
+                return
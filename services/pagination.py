@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def clamp_limit(limit: Optional[int], default: int, maximum: int) -> int:
+    # Размер страницы из запроса: по умолчанию default, в границах [1, maximum]
+    if limit is None:
+        return default
+    return min(max(int(limit), 1), maximum)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    # Непрозрачный токен позиции (created_at, id) последней строки страницы
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def keyset(statement, created_column, id_column, cursor: Optional[str], limit: int):
+    # Страница новых первыми: строки после позиции cursor в порядке (created_at, id) по убыванию.
+    # Отдельное условие created_at <= ... - поиск по индексу с created_at сразу с позиции,
+    # без перебора строк предыдущих страниц. limit + 1 строк - есть ли следующая страница
+    if cursor is not None:
+        created_at, row_id = decode_cursor(cursor)
+        statement = statement.where(
+            created_column <= created_at,
+            or_(created_column < created_at, and_(created_column == created_at, id_column < row_id))
+        )
+    return statement.order_by(created_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def page(rows: Sequence, limit: int, key: Callable) -> Tuple[List, Optional[str]]:
+    # Строки страницы и курсор следующей (None - страница последняя); key(row) -> (created_at, id)
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -8,13 +8,15 @@ from modelses.models import PredictionResult
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import SQLModel, Session, create_engine
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from test.api1.api import app
-from database.databases import get_session, engine
+from database.databases import get_async_session, get_session, engine
 from services.auth.jwt_handler import create_access_token
 from services.auth.authenticate import get_password_hash, get_current_user
 
@@ -37,6 +39,15 @@ def client_fixture(session: Session):
         return session
 
     app.dependency_overrides[get_session] = get_session_override
+
+    # Асинхронные обработчики - та же база testing.db через aiosqlite
+    async_engine = create_async_engine("sqlite+aiosqlite:///testing.db", poolclass=NullPool)
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    app.dependency_overrides[get_async_session] = get_async_session_override
     # app.dependency_overrides[authenticate] = lambda: "user@test.ru"
     async def mock_get_current_user():
         return {"user_id": 1, "username": "testuser", "email": "test@test.ru"}
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.databases import track_db_stats, track_engine
+from modelses.models import PredictionResult  # noqa: F401 - модели для связей User
+from modelses.transaction import Trans
+from modelses.user import User
+from datetime import datetime
+
+from services.balance import AsyncBalanceService
+from services.crud.prediction import get_predictions_page_async
+from services.crud.user import (
+    create_user_async, get_user_by_email_async, get_user_by_id_async, get_users_page_async
+)
+from services.pagination import InvalidCursor
+
+
+def test_async_crud_and_balance(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                user = await create_user_async(User(username="u", email="u@test.ru", password_hash="x"), session)
+                await AsyncBalanceService(session).deposit(user, 30.0)
+            async with sessions() as session:
+                found = await get_user_by_email_async("u@test.ru", session)
+                balance = await AsyncBalanceService(session).get_balance(found)
+                ledger = (await session.exec(select(Trans).where(Trans.user_id == user.user_id))).all()
+                users, _ = await get_users_page_async(session, 10)
+                with pytest.raises(ValueError, match="already exists"):
+                    await create_user_async(User(username="u2", email="u@test.ru", password_hash="x"), session)
+            return user, found, balance, users, ledger
+        finally:
+            await engine.dispose()
+
+    user, found, balance, users, ledger = asyncio.run(scenario())
+    assert found.user_id == user.user_id
+    assert balance == 30.0
+    # Пополнение записано в историю транзакций
+    assert [(t.amount, t.transaction_type) for t in ledger] == [(30.0, "deposit")]
+    assert [u.email for u in users] == ["u@test.ru"]
+
+
+def test_one_checkout_per_session(tmp_path):
+    # Пользователь, баланс и списание в одной сессии - одно соединение из пула
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stats.db'}")
+        track_engine(engine.sync_engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                user = await create_user_async(User(username="u", email="u@test.ru", password_hash="x"), session)
+                await AsyncBalanceService(session).deposit(user, 30.0)
+            with track_db_stats() as stats:
+                async with sessions() as session:
+                    found = await get_user_by_id_async(user.user_id, session)
+                    balance_service = AsyncBalanceService(session)
+                    await balance_service.get_balance(found)
+                    await balance_service.deposit(found, 5.0)
+            return stats
+        finally:
+            await engine.dispose()
+
+    stats = asyncio.run(scenario())
+    assert stats.checkouts == 1
+    assert stats.statements >= 3
+
+
+def test_keyset_pages(tmp_path):
+    # Страницы по (created_at, id): без пропусков и повторов, в том числе при равном created_at
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pages.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                for n in range(5):
+                    session.add(User(username=f"u{n}", email=f"u{n}@test.ru", password_hash="x",
+                                     created_at=datetime(2026, 1, 1 + n // 2)))
+                await session.commit()
+                for n in range(7):
+                    session.add(PredictionResult(user_id=1, prediction_rez="[]", cost=1.0,
+                                                 created_at=datetime(2026, 1, 1, n // 3)))
+                session.add(PredictionResult(user_id=2, prediction_rez="[]", cost=1.0))
+                await session.commit()
+
+                pages, cursor = [], None
+                while True:
+                    rows, cursor = await get_predictions_page_async(1, session, 3, cursor)
+                    pages.append([row.prediction_id for row in rows])
+                    if cursor is None:
+                        break
+                users, next_users = await get_users_page_async(session, 10)
+                with pytest.raises(InvalidCursor):
+                    await get_users_page_async(session, 10, "not-a-cursor")
+            return pages, [user.username for user in users], next_users
+        finally:
+            await engine.dispose()
+
+    pages, users, next_users = asyncio.run(scenario())
+    assert pages == [[7, 6, 5], [4, 3, 2], [1]]
+    assert users == ["u4", "u3", "u2", "u1", "u0"] and next_users is None
+
+
+def test_reserve_and_settle(tmp_path):
+    # Резерв не уходит в минус при нехватке средств; по итогу списывается фактическая стоимость
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reserve.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                user = await create_user_async(User(username="u", email="u@test.ru", password_hash="x"), session)
+                await AsyncBalanceService(session).deposit(user, 1.0)
+            async with sessions() as first, sessions() as second:
+                reserved = await AsyncBalanceService(first).reserve(user, 0.75)
+                rejected = not await AsyncBalanceService(second).reserve(user, 0.75)
+            async with sessions() as session:
+                await AsyncBalanceService(session).settle(user, 0.75, 0.25)
+            async with sessions() as session:
+                balance = await AsyncBalanceService(session).get_balance(user)
+                ledger = (await session.exec(select(Trans.amount).where(Trans.user_id == user.user_id))).all()
+            return reserved, rejected, balance, ledger
+        finally:
+            await engine.dispose()
+
+    reserved, rejected, balance, ledger = asyncio.run(scenario())
+    assert reserved and rejected
+    assert balance == 0.75
+    assert sorted(ledger) == [-0.25, 1.0]
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import modelses.models  # noqa: F401 - модели для связей User
+from modelses.balance import Balance
+from modelses.user import User
+from services.RabbitMQ.async_worker import AsyncWorker, process_message
+from services.RabbitMQ.batching import DONE, REJECTED
+from services.RabbitMQ.codec import Task
+
+
+class FakeMessage:
+    def __init__(self, broker, delivery_tag, body):
+        self.broker = broker
+        self.delivery_tag = delivery_tag
+        self.body = body
+
+    async def ack(self):
+        self.broker.settle(self, "ack")
+
+    async def reject(self, requeue=False):
+        self.broker.settle(self, "reject")
+
+
+class FakeBroker:
+    # Очередь в памяти с prefetch: не отдает больше prefetch неподтвержденных сообщений
+    def __init__(self, prefetch):
+        self.prefetch = prefetch
+        self.queue = []
+        self.unacked = 0
+        self.max_unacked = 0
+        self.settled = {}
+        self._changed = asyncio.Condition()
+
+    def publish(self, body):
+        self.queue.append(FakeMessage(self, len(self.queue) + 1, body))
+
+    def settle(self, message, result):
+        self.settled[message.delivery_tag] = result
+        self.unacked -= 1
+
+    async def consume(self):
+        for message in list(self.queue):
+            while self.unacked >= self.prefetch:
+                await asyncio.sleep(0)
+            self.unacked += 1
+            self.max_unacked = max(self.max_unacked, self.unacked)
+            yield message
+
+
+def test_async_worker_processes_messages_concurrently():
+    running = 0
+    max_running = 0
+
+    async def process(task):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if task.user_id == 2:
+            raise RuntimeError("database is down")
+        return REJECTED if task.user_id == 3 else DONE
+
+    async def run():
+        broker = FakeBroker(prefetch=5)
+        row = {"petal_length": 1.4, "petal_width": 0.2}
+        for i in range(20):
+            broker.publish(json.dumps({"user_id": 1, "data": [row]}).encode())
+        broker.publish(b"not json")
+        broker.publish(json.dumps({"user_id": 2, "data": [row]}).encode())
+        broker.publish(json.dumps({"user_id": 3, "data": [row]}).encode())
+        # Ошибка разбора не из ValueError (RecursionError в json)
+        broker.publish(b"[" * 100000)
+
+        worker = AsyncWorker(process, concurrency=5)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await worker.run(broker.consume())
+        return broker, worker, loop.time() - started
+
+    broker, worker, elapsed = asyncio.run(run())
+
+    assert max_running == 5
+    assert broker.max_unacked <= 5
+    assert elapsed < 22 * 0.01
+    assert broker.unacked == 0
+    assert [broker.settled[tag] for tag in (21, 22, 23, 24)] == ["reject", "reject", "ack", "reject"]
+    assert list(broker.settled.values()).count("ack") == 21
+    assert worker.stats()["done"] == 20
+
+
+def test_process_message_predicts_off_event_loop(tmp_path):
+    class SlowModel:
+        version = "slow"
+
+        def predict_columns(self, X):
+            time.sleep(0.2)
+            return np.array(["setosa"] * len(X), dtype=object)
+
+        def get_cost_predict(self):
+            return 10.0
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'worker.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                session.add(User(user_id=1, username="u", email="u@test.ru", password_hash="x"))
+                session.add(Balance(user_id=1, amount=30.0))
+                await session.commit()
+
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            background = asyncio.ensure_future(ticker())
+            outcome = await process_message(sessions, Task(1, 1, np.array([[1.4, 0.2]])), SlowModel())
+            background.cancel()
+            return outcome, ticks
+        finally:
+            await engine.dispose()
+
+    outcome, ticks = asyncio.run(scenario())
+
+    assert outcome == DONE
+    # Пока модель считает, event loop обслуживает другие задачи
+    assert ticks >= 10
@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+
+from database.metrics import EngineMetrics, normalize_sql
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM user WHERE email = 'a@b.ru' AND user_id = 42") == \
+        "SELECT * FROM user WHERE email = ? AND user_id = ?"
+    assert normalize_sql("SELECT 1 FROM t WHERE id IN (%s, %s,\n %s)") == "SELECT ? FROM t WHERE id IN (...)"
+    assert normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (...)"
+    assert normalize_sql("SELECT t1.x FROM t1 WHERE t1.y = :y_1") == "SELECT t1.x FROM t1 WHERE t1.y = ?"
+
+
+def make_engine(tmp_path, metrics, **pool):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", poolclass=metrics.pool_class(QueuePool), **pool)
+    metrics.attach(engine)
+    return engine
+
+
+def test_statements_and_slow_query_log(tmp_path, caplog):
+    metrics = EngineMetrics("test", slow_query_ms=0.0)
+    engine = make_engine(tmp_path, metrics)
+    with caplog.at_level(logging.WARNING, logger="database.slow_query"):
+        with engine.connect() as conn:
+            for user_id in (1, 2, 3):
+                conn.execute(text(f"SELECT {user_id}"))
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+    engine.dispose()
+
+    stats = metrics.stats()
+    assert stats["checkouts"] == 1 and stats["statements"] == 3 and stats["errors"] == 1
+    assert stats["slow_queries"][0]["sql"] == "SELECT ?"
+    assert stats["slow_queries"][0]["count"] == 3
+    assert len(caplog.records) == 3 and "SELECT ?" in caplog.records[0].getMessage()
+
+
+def test_pool_wait_and_timeout(tmp_path):
+    metrics = EngineMetrics("test")
+    engine = make_engine(tmp_path, metrics, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    with engine.connect():
+        assert metrics.pool_stats()["in_use"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    engine.dispose()
+
+    stats = metrics.stats()
+    assert stats["timeouts"] == 1
+    assert stats["checkout_wait_ms"]["max"] >= 50
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from services.executors import ExecutorLayer
+from services.auth.hashing import hash_password, check_password
+
+
+def test_executor_layer_runs_io_and_cpu_work():
+    executors = ExecutorLayer(io_workers=2, cpu_workers=0)
+
+    async def run():
+        hashed = await executors.run_cpu(hash_password, "Test12345")
+        ok = await executors.run_cpu(check_password, "Test12345", hashed)
+        total = await executors.run_io(sum, [1, 2, 3])
+        return ok, total
+
+    try:
+        assert asyncio.run(run()) == (True, 6)
+        stats = executors.stats()
+        assert stats["cpu"]["completed"] == 2
+        assert stats["io"]["completed"] == 1
+        assert stats["io"]["in_flight"] == 0
+    finally:
+        executors.shutdown()
+
+
+def test_executor_layer_reports_queue_depth():
+    executors = ExecutorLayer(io_workers=1, cpu_workers=0)
+
+    async def run():
+        tasks = [asyncio.ensure_future(executors.run_io(time.sleep, 0.05)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        depth = executors.stats()["io"]["queue_depth"]
+        await asyncio.gather(*tasks)
+        return depth
+
+    try:
+        assert asyncio.run(run()) == 3
+        assert executors.stats()["io"]["max_in_flight"] == 4
+    finally:
+        executors.shutdown()
@@ -0,0 +1,59 @@
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import SQLModel
+
+import modelses.event  # noqa: F401 - все таблицы в SQLModel.metadata
+import modelses.task  # noqa: F401
+from database.databases import migrate as migrate_schema, migrations_config
+from database.explain import check_query_plans, hot_queries
+
+
+def upgrade_to(engine, revision: str) -> None:
+    with engine.begin() as conn:
+        command.upgrade(migrations_config(conn), revision)
+
+
+def test_migrations_match_models_and_index_hot_queries(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    # Без индексов 0003-0004 все запросы горячего пути - полный просмотр или сортировка
+    upgrade_to(engine, "0002")
+    assert set(check_query_plans(engine)) == set(hot_queries())
+
+    upgrade_to(engine, "head")
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), SQLModel.metadata) == []
+    assert check_query_plans(engine) == {}
+
+    with engine.begin() as conn:
+        command.downgrade(migrations_config(conn), "base")
+    with engine.connect() as conn:
+        assert conn.dialect.get_table_names(conn) == ["alembic_version"]
+    engine.dispose()
+
+
+def test_legacy_create_all_database_is_upgraded(tmp_path):
+    # База исходной схемы без alembic_version (create_all до миграций) доводится до моделей
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    upgrade_to(engine, "0001")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE alembic_version"))
+        migrate_schema(conn)
+    with engine.connect() as conn:
+        assert "predictiontask" in inspect(conn).get_table_names()
+        assert compare_metadata(MigrationContext.configure(conn), SQLModel.metadata) == []
+    engine.dispose()
+
+
+def test_current_create_all_database_is_upgraded(tmp_path):
+    # База из create_all текущих моделей (все индексы уже есть) помечается 0001
+    # и доводится до head без ошибок о повторных индексах
+    engine = create_engine(f"sqlite:///{tmp_path / 'current.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        migrate_schema(conn)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0004"
+        assert compare_metadata(MigrationContext.configure(conn), SQLModel.metadata) == []
+    engine.dispose()
@@ -0,0 +1,366 @@
+import numpy as np
+import pytest
+
+from modelses.models import MLModel, MLModelService
+from services.ml.registry import ModelRegistry
+
+
+def test_registry_loads_model_once():
+    # Фабрика вызывается один раз, дальше отдается тот же экземпляр
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return MLModel()
+
+    registry = ModelRegistry()
+    registry.register("iris", factory)
+
+    first = registry.get("iris")
+    second = registry.get("iris")
+
+    assert first is second
+    assert len(calls) == 1
+    assert registry.stats()["iris"]["load_time_ms"] >= 0
+    assert registry.stats()["iris"]["memory_bytes"] >= 0
+
+
+def test_registry_model_is_read_only():
+    registry = ModelRegistry()
+    registry.register("iris", MLModel)
+
+    model = registry.get("iris")
+    with pytest.raises(RuntimeError):
+        model.reset_training()
+
+
+def test_registry_unknown_model():
+    registry = ModelRegistry()
+    with pytest.raises(KeyError):
+        registry.get("unknown")
+
+
+def test_service_uses_shared_model():
+    registry = ModelRegistry()
+    registry.register("iris", MLModel)
+    model = registry.get("iris")
+
+    service = MLModelService(balance_service=None, ml_model=model)
+    assert service.imodel is model
+    assert service.imodel.predict([{"petal_length": 1.4, "petal_width": 0.2}]) == [{"color": "setosa"}]
+
+
+def test_artifact_roundtrip(tmp_path):
+    # Экспорт и загрузка артефакта дают те же предсказания без обучения
+    from services.ml.artifacts import export_model
+
+    trained = MLModel(use_artifact=False)
+    export_model(trained, root=str(tmp_path), version="v1")
+
+    loaded = MLModel(artifact_dir=str(tmp_path))
+    assert loaded.source == "artifact"
+    assert loaded.version == "v1"
+
+    data = [{"petal_length": 1.4, "petal_width": 0.2}, {"petal_length": 5.5, "petal_width": 2.1}]
+    assert loaded.predict(data) == trained.predict(data)
+
+
+def test_missing_artifact_falls_back_to_training(tmp_path):
+    model = MLModel(artifact_dir=str(tmp_path))
+    assert model.source == "trained"
+
+
+def test_predict_columns_matches_records():
+    model = MLModel(use_artifact=False)
+    rows = [{"petal_length": 1.4, "petal_width": 0.2},
+            {"petal_length": 4.5, "petal_width": 1.5},
+            {"petal_length": 6.0, "petal_width": 2.5}]
+    columns = {"petal_length": [r["petal_length"] for r in rows],
+               "petal_width": [r["petal_width"] for r in rows]}
+
+    labels = model.predict_columns(columns)
+    assert labels.tolist() == [r["color"] for r in model.predict(rows)]
+    assert model.predict_columns(np.array([[1.4, 0.2]]), as_records=True) == [{"color": "setosa"}]
+
+
+def test_predict_columns_missing_feature_and_empty_input():
+    model = MLModel(use_artifact=False)
+    assert model.predict_columns({"petal_length": [1.4]}).tolist() == \
+        [r["color"] for r in model.predict([{"petal_length": 1.4}])]
+    assert model.predict_columns(np.empty((0, 2))).tolist() == []
+    assert model.predict([]) == []
+
+    with pytest.raises(ValueError):
+        model.predict_columns(np.zeros((3, 4)))
+
+
+def test_linear_kernel_matches_sklearn():
+    model = MLModel(use_artifact=False)
+    assert model._kernel is not None
+
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.uniform(0, 100, size=(5000, 2)), rng.uniform(0, 7, size=(5000, 2))])
+    assert np.array_equal(model._kernel.predict(X), model._model.predict(X))
+
+    with pytest.raises(ValueError):
+        model._kernel.predict(np.array([[np.nan, 1.0]]))
+
+
+def test_non_linear_estimator_falls_back_to_sklearn():
+    from sklearn.tree import DecisionTreeClassifier
+    from services.ml.kernels import LinearKernel
+
+    estimator = DecisionTreeClassifier().fit([[1.0, 0.2], [5.0, 2.0]], [0, 2])
+    assert LinearKernel.from_estimator(estimator) is None
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    import asyncio
+    from services.ml.batcher import MicroBatcher
+
+    model = MLModel(use_artifact=False)
+    batcher = MicroBatcher(lambda: model, max_batch_size=16, max_wait_ms=5)
+    rows = [{"petal_length": 1.4, "petal_width": 0.2}, {"petal_length": 6.0, "petal_width": 2.5}] * 20
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict([row]) for row in rows))
+
+    results = asyncio.run(run())
+    assert [r[0] for r in results] == model.predict(rows)
+
+    stats = batcher.stats()
+    assert stats["rows"] == len(rows)
+    assert stats["batches"] < len(rows)
+    assert stats["batch_size_max"] <= 16
+
+
+def test_micro_batcher_isolates_bad_rows():
+    import asyncio
+    from services.ml.batcher import MicroBatcher
+
+    model = MLModel(use_artifact=False)
+    batcher = MicroBatcher(lambda: model, max_batch_size=8, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.predict([{"petal_length": 1.4, "petal_width": 0.2}]),
+            batcher.predict([{"petal_length": float("nan"), "petal_width": 0.2}]),
+            return_exceptions=True
+        )
+
+    good, bad = asyncio.run(run())
+    assert good == [{"color": "setosa"}]
+    assert isinstance(bad, ValueError)
+
+
+def test_micro_batcher_validates_request_before_enqueue():
+    import asyncio
+    from services.ml.batcher import MicroBatcher
+
+    model = MLModel(use_artifact=False)
+    batcher = MicroBatcher(lambda: model, max_batch_size=8, max_wait_ms=5)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await batcher.predict([{"petal_length": 1.4, "petal_width": 0.2}, {"petal_length": "abc"}])
+        return batcher.stats()
+
+    # Строка запроса с ошибкой разбора - ни одной строки этого запроса в очереди
+    stats = asyncio.run(run())
+    assert stats["pending"] == 0 and stats["rows"] == 0
+
+
+def test_prediction_cache_hits_and_invalidation():
+    from services.ml.cache import PredictionCache
+
+    model = MLModel(use_artifact=False)
+    cache = PredictionCache(max_size=2, ttl_seconds=60)
+    model.enable_cache(cache)
+
+    rows = [{"petal_length": 1.4, "petal_width": 0.2}, {"petal_length": 6.0, "petal_width": 2.5}]
+    first = model.predict(rows)
+    second = model.predict(rows)
+    assert first == second == [{"color": "setosa"}, {"color": "virginica"}]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+    # Третья запись вытесняет самую старую
+    model.predict([{"petal_length": 4.5, "petal_width": 1.5}])
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+    model.reset_training()
+    assert cache.stats()["size"] == 0
+    assert model.predict(rows) == first
+
+
+def test_prediction_cache_does_not_change_predictions():
+    from services.ml.cache import PredictionCache
+
+    model = MLModel(use_artifact=False)
+    # Точки у границы классов с точностью выше PREDICTION_CACHE_DECIMALS
+    X = np.random.default_rng(2).uniform(0, 7, size=(20000, 2))
+    expected = model.predict_columns(X)
+
+    cache = PredictionCache(max_size=100, ttl_seconds=60, decimals=2, max_batch_rows=200)
+    model.enable_cache(cache)
+    cached = np.concatenate([model.predict_columns(X[start:start + 200]) for start in range(0, len(X), 200)])
+    assert np.array_equal(cached, expected)
+    # Такие строки не кэшируются, строки формы - кэшируются
+    assert cache.stats()["size"] == 0
+    model.predict_columns(np.array([[1.4, 0.2], [4.5, 1.5]]))
+    assert cache.stats()["size"] == 2
+
+
+def test_prediction_cache_ttl_expiry(monkeypatch):
+    from services.ml import cache as cache_module
+    from services.ml.cache import PredictionCache
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put("v1", (1.4, 0.2), "setosa")
+    assert cache.get("v1", (1.4, 0.2)) == "setosa"
+    assert cache.get("v2", (1.4, 0.2)) is None
+
+    now[0] += 11
+    assert cache.get("v1", (1.4, 0.2)) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_decision_grid_matches_model_on_form_values(tmp_path):
+    from services.ml.lookup import DecisionGrid
+
+    model = MLModel(use_artifact=False)
+    path = tmp_path / "grid-10.npy"
+    grid = DecisionGrid.load_or_build(model, path)
+    assert grid.table.dtype == np.uint8
+    assert path.exists()
+
+    # Значения формы с шагом 0.1 попадают точно в узлы сетки
+    X = np.round(np.random.default_rng(1).uniform(0, 100, size=(20000, 2)), 1)
+    assert np.array_equal(grid.predict(X), model._raw_predict(X))
+
+    # Повторная загрузка - через mmap
+    assert DecisionGrid.load_or_build(model, path).stats()["memory_mapped"]
+
+    # Та же сетка с другими границами или для другой версии модели не переиспользуется
+    shifted = DecisionGrid.load_or_build(model, path, low=1.0, high=101.0)
+    assert not shifted.stats()["memory_mapped"]
+    assert np.array_equal(shifted.predict(X[X.min(axis=1) >= 1.0]), model._raw_predict(X[X.min(axis=1) >= 1.0]))
+    assert DecisionGrid.load_or_build(model, path, low=1.0, high=101.0).stats()["memory_mapped"]
+    model.version = "other"
+    assert not DecisionGrid.load_or_build(model, path, low=1.0, high=101.0).stats()["memory_mapped"]
+    model.version = "untracked"
+
+    accuracy = grid.check_accuracy(model, step=5)
+    assert accuracy["points"] > 0
+    assert accuracy["mismatch_rate"] < 0.001
+
+
+def test_grid_mode_falls_back_to_model_outside_domain():
+    from services.ml.lookup import DecisionGrid
+
+    model = MLModel(use_artifact=False)
+    expected = model.predict_columns(np.array([[1.4, 0.2], [150.0, 80.0]])).tolist()
+
+    model.enable_grid(DecisionGrid.build(model, high=10.0))
+    assert model.predict_columns(np.array([[1.4, 0.2], [150.0, 80.0]])).tolist() == expected
+
+
+def test_lifecycle_swaps_model_without_blocking_readers():
+    import threading
+    from services.ml.lifecycle import ModelLifecycle
+
+    release = threading.Event()
+
+    def factory(version=None, train=False):
+        model = MLModel(use_artifact=False)
+        if train:
+            # Имитация долгого обучения
+            release.wait(5)
+            model.version = "retrained"
+        return model
+
+    registry = ModelRegistry()
+    registry.register("iris", factory)
+    old = registry.get("iris")
+
+    lifecycle = ModelLifecycle(registry=registry, name="iris", export=False)
+    future = lifecycle.retrain()
+    # Повторный запрос во время обучения присоединяется к текущему
+    assert lifecycle.retrain() is future
+
+    # Пока идет обучение, запросы обслуживает старая модель
+    assert registry.get("iris") is old
+    assert lifecycle.status()["in_progress"]
+
+    release.set()
+    new = future.result(timeout=10)
+    assert registry.get("iris") is new
+    assert new.version == "retrained"
+    assert lifecycle.status()["history"][-1]["status"] == "done"
+    lifecycle.shutdown()
+
+
+def test_stream_predictions_split_across_chunks():
+    import asyncio
+    import json
+    from services.ml.streaming import StreamStats, stream_predictions
+
+    model = MLModel(use_artifact=False)
+    data = b"petal_width,petal_length\n" + b"0.2,1.4\nbad\n2.5,6.0\n" * 5
+
+    async def body():
+        # Куски режут строки в произвольных местах
+        for i in range(0, len(data), 7):
+            yield data[i:i + 7]
+
+    async def run():
+        stats = StreamStats()
+        out = b"".join([lines async for lines in stream_predictions(model, body(), "csv", stats, chunk_rows=4)])
+        return stats, [json.loads(line) for line in out.splitlines()]
+
+    stats, rows = asyncio.run(run())
+    assert [row["row"] for row in rows] == list(range(15))
+    assert rows[0] == {"row": 0, "color": "setosa"}
+    assert rows[1] == {"row": 1, "error": "invalid row"}
+    assert rows[2] == {"row": 2, "color": "virginica"}
+    assert stats.as_dict()["predicted"] == 10
+
+
+def test_registry_ensure_version_switches_trained_model(tmp_path, monkeypatch):
+    from database.config import get_settings
+    from services.ml.artifacts import export_model
+    from services.ml.lifecycle import ModelLifecycle
+
+    monkeypatch.setattr(get_settings(), "MODEL_ARTIFACT_DIR", str(tmp_path))
+    builds = []
+
+    def factory(version=None, train=False):
+        builds.append(version)
+        return MLModel(use_artifact=not train, version=version)
+
+    registry = ModelRegistry()
+    registry.register("iris", factory)
+    # Артефактов еще нет - модель обучена в процессе
+    assert registry.get("iris").source == "trained"
+
+    export_model(MLModel(use_artifact=False), root=str(tmp_path), version="v2")
+    model = registry.ensure_version("iris", "v2")
+    assert (model.version, model.source) == ("v2", "artifact")
+    assert registry.ensure_version("iris", "v2") is model
+
+    # Неизвестная версия - ошибка без обучения
+    builds.clear()
+    with pytest.raises(ValueError, match="not found"):
+        registry.ensure_version("iris", "missing")
+    lifecycle = ModelLifecycle(registry, export=False)
+    try:
+        with pytest.raises(ValueError, match="not found"):
+            lifecycle.load_version("missing").result(timeout=10)
+    finally:
+        lifecycle.shutdown()
+    assert builds == []
+    assert registry.get("iris") is model
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlalchemy.pool import StaticPool
+
+from modelses.balance import Balance
+from modelses.models import MLModel
+from modelses.task import PredictionTask
+from modelses.user import User
+from services.RabbitMQ.batching import BatchConsumer, handle_batch
+from services.RabbitMQ.publisher import MemoryTransport, TaskPublisher
+from services.RabbitMQ.queues import MemoryQueueBackend
+from services.RabbitMQ.tasks import TASK_QUEUE, TaskTracker
+
+ROW = {"petal_length": 1.4, "petal_width": 0.2}
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(user_id=1, username="u1", email="u1@test.ru", password_hash="x"))
+        session.add(Balance(user_id=1, amount=100.0))
+        session.commit()
+    return engine
+
+
+async def run_inline(func, *args):
+    return func(*args)
+
+
+class SlowChannel:
+    # Подтверждение пачки занимает время, как ожидание confirm от брокера
+    def __init__(self):
+        self.batches = []
+
+    async def open(self, pool_size):
+        return [self] * pool_size
+
+    async def close(self):
+        pass
+
+    async def publish_batch(self, messages):
+        self.batches.append(len(messages))
+        await asyncio.sleep(0.01)
+
+
+def test_publisher_batches_confirms_across_concurrent_requests():
+    transport = SlowChannel()
+
+    async def scenario():
+        publisher = TaskPublisher(transport, session_factory=None, pool_size=2, max_batch=16)
+        await asyncio.gather(*[publisher.publish(TASK_QUEUE, b"x") for _ in range(50)])
+        await publisher.close()
+        return publisher.stats()
+
+    stats = asyncio.run(scenario())
+    assert sum(transport.batches) == stats["published"] == 50
+    # Пока канал ждет подтверждений, новые сообщения копятся в следующую пачку
+    assert max(transport.batches) == 16 and len(transport.batches) < 10
+
+
+def test_enqueue_prediction_through_memory_queue():
+    engine = make_engine()
+    backend = MemoryQueueBackend()
+    publisher = TaskPublisher(MemoryTransport(backend), lambda: Session(engine), run_io=run_inline)
+
+    async def scenario():
+        task_ids = await asyncio.gather(*[publisher.enqueue_prediction(1, [ROW]) for _ in range(3)])
+        await publisher.close()
+        return task_ids
+
+    task_ids = asyncio.run(scenario())
+    assert backend.depth(TASK_QUEUE) == 3
+
+    model = MLModel(use_artifact=False)
+    consumer = BatchConsumer(backend, lambda tasks: handle_batch(lambda: Session(engine), tasks, model),
+                             max_batch_size=3, tracker=TaskTracker(lambda: Session(engine)))
+    backend.consume(TASK_QUEUE, consumer.on_message, prefetch=3)
+    backend.start(until_idle=True)
+
+    with Session(engine) as session:
+        assert [session.get(PredictionTask, task_id).status for task_id in task_ids] == ["done"] * 3
+        assert session.get(Balance, 1).amount == 70.0
+
+
+def test_enqueue_prediction_marks_task_failed_when_publish_fails():
+    class BrokenChannel(SlowChannel):
+        async def publish_batch(self, messages):
+            raise ConnectionError("channel closed")
+
+    engine = make_engine()
+    publisher = TaskPublisher(BrokenChannel(), lambda: Session(engine), run_io=run_inline)
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await publisher.enqueue_prediction(1, [ROW])
+        await publisher.close()
+
+    asyncio.run(scenario())
+    with Session(engine) as session:
+        task = session.exec(select(PredictionTask)).one()
+        assert task.status == "failed" and task.error.startswith("publish failed")
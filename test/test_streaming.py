@@ -0,0 +1,32 @@
+import asyncio
+import json
+
+from modelses.models import MLModel
+from services.ml.streaming import StreamStats, stream_predictions
+
+
+def run_stream(body: bytes, max_rows=None):
+    async def chunks():
+        yield body
+
+    async def collect():
+        stats = StreamStats()
+        lines = [line async for line in stream_predictions(MLModel(), chunks(), "csv", stats,
+                                                           chunk_rows=2, max_rows=max_rows)]
+        return [json.loads(line) for line in b"".join(lines).splitlines()], stats
+
+    return asyncio.run(collect())
+
+
+def test_non_finite_rows_are_invalid():
+    # inf и переполнение не обрывают загрузку - строка с ошибкой, остальные предсказаны
+    results, stats = run_stream(b"petal_length,petal_width\n1.4,0.2\ninf,0.2\n1e400,1.0\n5.5,2.0\n")
+    assert [("color" in row, row["row"]) for row in results] == [(True, 0), (False, 1), (False, 2), (True, 3)]
+    assert stats.predicted == 2 and stats.errors == 2 and not stats.truncated
+
+
+def test_max_rows_counts_predicted_rows_only():
+    results, stats = run_stream(b"petal_length,petal_width\nx,0.2\n1.4,0.2\nnan,1\n4.5,1.5\n5.5,2.0\n",
+                                max_rows=2)
+    assert [row["row"] for row in results] == [0, 1, 2, 3]
+    assert stats.predicted == 2 and stats.errors == 2 and stats.truncated
@@ -0,0 +1,42 @@
+import os
+import signal
+import time
+
+from services.RabbitMQ.supervisor import Supervisor
+
+
+def _consumer():
+    # Имитация воркера: по SIGTERM дорабатывает "сообщение" и выходит с кодом 0
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    while not stopping:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    os._exit(0)
+
+
+def test_supervisor_scales_between_bounds_and_drains():
+    supervisor = Supervisor(_consumer, min_processes=1, max_processes=3,
+                            messages_per_process=10, drain_timeout=5)
+    supervisor.start()
+    try:
+        assert supervisor.size == 1
+        assert supervisor.scale(25) == 3
+        assert supervisor.scale(1000) == 3
+        # Уменьшение - по одному процессу за проверку
+        assert supervisor.scale(0) == 2
+        assert supervisor.scale(0) == 1
+        assert supervisor.scale(0) == 1
+
+        # Упавший процесс заменяется при следующей проверке
+        crashed = supervisor._processes[0]
+        os.kill(crashed.pid, signal.SIGKILL)
+        crashed.join()
+        assert supervisor.scale(0) == 1
+        assert supervisor._processes[0].pid != crashed.pid
+
+        processes = list(supervisor._processes) + list(supervisor._retired)
+    finally:
+        supervisor.shutdown()
+
+    assert all(process.exitcode == 0 for process in processes)
@@ -0,0 +1,366 @@
+import json
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlalchemy.pool import StaticPool
+
+from modelses.balance import Balance
+from modelses.models import MLModel, PredictionResult
+from modelses.user import User
+from services.RabbitMQ.batching import BatchConsumer, DONE, FAILED, REJECTED, handle_batch
+from services.RabbitMQ.codec import decode_task
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(user_id=1, username="u1", email="u1@test.ru", password_hash="x"))
+        session.add(Balance(user_id=1, amount=25.0))
+        session.commit()
+    return engine
+
+
+def message(user_id, data):
+    return json.dumps({"user_id": user_id, "data": data}).encode()
+
+
+def test_worker_batch_charges_once_per_user():
+    engine = make_engine()
+    model = MLModel(use_artifact=False)
+    row = {"petal_length": 1.4, "petal_width": 0.2}
+    tasks = [decode_task(tag, message(user_id, [row]))
+             for tag, user_id in ((1, 1), (2, 1), (3, 1), (4, 2))]
+
+    outcomes = handle_batch(lambda: Session(engine), tasks, model)
+
+    # Средств хватает на два предсказания, пользователя 2 нет
+    assert outcomes == {1: DONE, 2: DONE, 3: REJECTED, 4: REJECTED}
+    with Session(engine) as session:
+        assert session.get(Balance, 1).amount == 5.0
+        results = session.exec(select(PredictionResult)).all()
+        assert [json.loads(r.prediction_rez) for r in results] == [[{"color": "setosa"}]] * 2
+
+
+def test_worker_batch_routes_failures_per_message():
+    class Channel:
+        def __init__(self):
+            self.calls = []
+
+        def basic_ack(self, delivery_tag, multiple=False):
+            self.calls.append(("ack", delivery_tag, multiple))
+
+        def basic_nack(self, delivery_tag, requeue=True):
+            self.calls.append(("nack", delivery_tag, requeue))
+
+    class Connection:
+        def call_later(self, delay, callback):
+            return callback
+
+        def remove_timeout(self, timer):
+            pass
+
+    class Method:
+        def __init__(self, tag):
+            self.delivery_tag = tag
+
+    def handler(tasks):
+        return {task.tag: FAILED if task.user_id == 3 else DONE for task in tasks}
+
+    channel = Channel()
+    consumer = BatchConsumer(connection=Connection(), handler=handler, max_batch_size=5)
+    row = {"petal_length": 1.4, "petal_width": 0.2}
+    bodies = [message(1, [row]), b"not json", message(1, [{"petal_length": 10 ** 400}]),
+              message(3, [row]), message(1, [row])]
+    for tag, body in enumerate(bodies, start=1):
+        consumer.on_message(channel, Method(tag), None, body)
+
+    # Некорректные и упавшее сообщения - nack по одному, остальные - один ack
+    assert channel.calls == [("nack", 2, False), ("nack", 3, False), ("nack", 4, False), ("ack", 5, True)]
+
+
+def test_worker_rejects_invalid_payload():
+    with pytest.raises(ValueError):
+        decode_task(1, message(1, [{"petal_length": float("nan")}]))
+    with pytest.raises(ValueError):
+        decode_task(1, message(1, [[5.1, 3.5, 1.4, 0.2]]))
+    # Целое больше float - ValueError, а не OverflowError
+    with pytest.raises(ValueError):
+        decode_task(1, message(1, [{"petal_length": 10 ** 400}]))
+
+
+def test_memory_queue_delivery_semantics():
+    from services.RabbitMQ.queues import MemoryQueueBackend
+
+    backend = MemoryQueueBackend()
+    delivered = []
+
+    def on_message(channel, method, properties, body):
+        delivered.append((method.delivery_tag, body, method.redelivered))
+        # Первое сообщение возвращается в очередь, остальные ждут подтверждения
+        if body == b"1" and not method.redelivered:
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+    for body in (b"1", b"2", b"3", b"4"):
+        backend.publish("q", body)
+    backend.consume("q", on_message, prefetch=2)
+    backend.start(until_idle=True)
+
+    # Не больше prefetch неподтвержденных; возвращенное сообщение доставлено повторно
+    assert delivered == [(1, b"1", False), (2, b"1", True), (3, b"2", False)]
+    assert backend.unacked == 2 and backend.depth("q") == 2
+
+    backend.ack(3, multiple=True)
+    with pytest.raises(ValueError):
+        backend.ack(3)
+    backend.start(until_idle=True)
+    assert [body for _, body, _ in delivered[3:]] == [b"3", b"4"]
+
+    # Закрытие канала возвращает неподтвержденные сообщения в очередь
+    backend.close()
+    assert backend.depth("q") == 2 and backend.unacked == 0
+
+
+def test_task_codec_roundtrip_and_schema():
+    import msgpack
+    import numpy as np
+    from services.RabbitMQ.codec import JSON, MSGPACK, encode_task
+
+    rows = [{"petal_length": 1.4, "petal_width": 0.2}, {"petal_length": 6.0}]
+    expected = np.array([[1.4, 0.2], [6.0, 0.0]])
+    for content_type in (JSON, MSGPACK):
+        body, content_type = encode_task(7, rows, content_type)
+        task = decode_task(1, body, content_type)
+        assert task.user_id == 7
+        assert np.array_equal(task.X, expected)
+
+    # Сообщение без content_type - JSON, как у старых производителей
+    assert decode_task(1, message(1, rows)).X.shape == (2, 2)
+
+    body, _ = encode_task(1, expected)
+    broken = msgpack.unpackb(body)
+    broken["columns"]["petal_width"] = broken["columns"]["petal_width"][:8]
+    for bad in (msgpack.packb(broken), msgpack.packb({**broken, "v": 2}), b"\xc1"):
+        with pytest.raises(ValueError):
+            decode_task(1, bad, MSGPACK)
+    with pytest.raises(ValueError):
+        decode_task(1, body, "text/plain")
+
+
+def test_task_statuses_and_events_through_memory_queue():
+    from modelses.task import PredictionTask
+    from services.RabbitMQ.queues import MemoryQueueBackend
+    from services.RabbitMQ.tasks import EVENTS_EXCHANGE, TASK_QUEUE, TaskTracker, parse_event, submit_task
+
+    engine = make_engine()
+    model = MLModel(use_artifact=False)
+    backend = MemoryQueueBackend()
+    events = []
+    backend.subscribe(EVENTS_EXCHANGE, lambda ch, method, properties, body: events.append(parse_event(body)[1]))
+
+    row = {"petal_length": 1.4, "petal_width": 0.2}
+    with Session(engine) as session:
+        ids = [submit_task(session, backend, user_id, [row]).task_id for user_id in (1, 2)]
+        assert session.get(PredictionTask, ids[0]).status == "queued"
+    # Старый производитель: сообщение без task_id
+    backend.publish(TASK_QUEUE, message(1, [row]))
+    backend.publish(TASK_QUEUE, b"not json", headers={"task_id": "broken"})
+
+    consumer = BatchConsumer(backend, lambda tasks: handle_batch(lambda: Session(engine), tasks, model),
+                             max_batch_size=4, tracker=TaskTracker(lambda: Session(engine), backend))
+    backend.consume(TASK_QUEUE, consumer.on_message, prefetch=4)
+    backend.start(until_idle=True)
+
+    with Session(engine) as session:
+        done, rejected = (session.get(PredictionTask, task_id) for task_id in ids)
+        assert (done.status, rejected.status) == ("done", "failed")
+        assert session.get(PredictionResult, done.prediction_id).user_id == 1
+        assert rejected.error == "user or balance not found" and rejected.finished_at is not None
+        assert len(session.exec(select(PredictionResult)).all()) == 2
+    # running до обработки и одно событие с итогами пачки
+    assert events == [{ids[0]: "running", ids[1]: "running"},
+                      {ids[0]: "done", ids[1]: "failed", "broken": "failed"}]
+
+
+def test_task_notifier_wakes_waiter_from_another_thread():
+    import asyncio
+    import threading
+    from services.RabbitMQ.notifier import TaskNotifier
+    from services.RabbitMQ.tasks import event_body
+
+    async def scenario():
+        notifier = TaskNotifier()
+        notifier.attach(asyncio.get_running_loop())
+        events = notifier.subscribe("t1")
+        threading.Thread(target=notifier.deliver, args=(event_body({"t1": "done", "t2": "done"}),)).start()
+        committed_at = await notifier.next_event(events, timeout=5)
+        notifier.record_delivery(committed_at)
+        assert await notifier.next_event(events, timeout=0.01) is None
+        notifier.unsubscribe("t1", events)
+        return notifier.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["events"] == 2 and stats["waiting"] == 0
+    assert stats["delivery_latency_ms"]["count"] == 1
+
+
+def test_failed_messages_retry_with_backoff_then_dead_letter_and_replay():
+    from modelses.task import PredictionTask
+    from services.RabbitMQ.dead_letters import list_dead_letters, replay_dead_letters
+    from services.RabbitMQ.queues import MemoryQueueBackend
+    from services.RabbitMQ.retry import RetryPolicy, RetryRouter
+    from services.RabbitMQ.tasks import TASK_QUEUE, TaskTracker, submit_task
+
+    engine = make_engine()
+    model = MLModel(use_artifact=False)
+    backend = MemoryQueueBackend()
+    policy = RetryPolicy(TASK_QUEUE, max_attempts=2, base_delay=0.01)
+    router = RetryRouter(backend, policy)
+    router.declare()
+    attempts = []
+
+    def handler(tasks):
+        # Задача poison падает при каждой обработке, остальные обрабатываются
+        rest = [task for task in tasks if task.task_id != poison]
+        outcomes = handle_batch(lambda: Session(engine), rest, model) if rest else {}
+        for task in tasks:
+            if task.task_id == poison:
+                attempts.append(task.tag)
+                task.error = "processing failed: boom"
+                outcomes[task.tag] = FAILED
+        return outcomes
+
+    row = {"petal_length": 1.4, "petal_width": 0.2}
+    with Session(engine) as session:
+        poison, healthy = (submit_task(session, backend, 1, [row]).task_id for _ in range(2))
+    backend.publish(TASK_QUEUE, b"not json", headers={"task_id": "broken"})
+
+    consumer = BatchConsumer(backend, handler, max_batch_size=4,
+                             tracker=TaskTracker(lambda: Session(engine)), router=router)
+    backend.consume(TASK_QUEUE, consumer.on_message, prefetch=4)
+    backend.start(until_idle=True)
+
+    # Первая попытка и два повтора; неразбираемое сообщение - сразу в DLQ
+    assert len(attempts) == 3 and backend.depth(TASK_QUEUE) == 0 and backend.unacked == 0
+    assert policy.retry_queues() == {
+        f"{TASK_QUEUE}.retry.10": {"x-message-ttl": 10, "x-dead-letter-exchange": "",
+                                   "x-dead-letter-routing-key": TASK_QUEUE},
+        f"{TASK_QUEUE}.retry.20": {"x-message-ttl": 20, "x-dead-letter-exchange": "",
+                                   "x-dead-letter-routing-key": TASK_QUEUE}
+    }
+    letters = list_dead_letters(backend, policy)
+    assert [(letter["task_id"], letter["attempts"]) for letter in letters] == [("broken", 0), (poison, 2)]
+    assert letters[0]["error"].startswith("invalid message") and letters[1]["error"] == "processing failed: boom"
+    assert letters[1]["failed_at"] is not None and backend.depth(policy.dead_letter_queue) == 2
+    with Session(engine) as session:
+        assert session.get(PredictionTask, healthy).status == "done"
+        assert (session.get(PredictionTask, poison).status, session.get(PredictionTask, poison).error) == \
+               ("failed", "processing failed: boom")
+
+    # Повторная отправка одной задачи: счетчик попыток сбрасывается, задача снова queued
+    replayed = replay_dead_letters(backend, policy, task_id=poison, session_factory=lambda: Session(engine))
+    assert [letter["task_id"] for letter in replayed] == [poison]
+    assert backend.depth(policy.dead_letter_queue) == 1 and backend.depth(TASK_QUEUE) == 1
+    method, properties, _ = backend.get(TASK_QUEUE)
+    assert properties.headers["task_id"] == poison and "x-attempt" not in properties.headers
+    with Session(engine) as session:
+        assert session.get(PredictionTask, poison).status == "queued"
+
+
+def test_redelivery_after_crash_does_not_charge_twice():
+    from services.RabbitMQ.idempotency import IDEMPOTENCY_HEADER, SeenKeys
+    from services.RabbitMQ.queues import MemoryQueueBackend
+    from services.RabbitMQ.tasks import TASK_QUEUE
+
+    class Crash(Exception):
+        pass
+
+    engine = make_engine()
+    with Session(engine) as session:
+        session.get(Balance, 1).amount = 1000.0
+        session.commit()
+    model = MLModel(use_artifact=False)
+    backend = MemoryQueueBackend()
+    row = {"petal_length": 1.4, "petal_width": 0.2}
+    for i in range(6):
+        backend.publish(TASK_QUEUE, message(1, [row]), headers={IDEMPOTENCY_HEADER: f"key-{i}"})
+
+    def run_worker(seen, session_factory, crash_on_ack=None):
+        # Новый процесс воркера: свой SeenKeys и свой потребитель
+        acks = []
+
+        def basic_ack(delivery_tag, multiple=False):
+            acks.append(delivery_tag)
+            if len(acks) == crash_on_ack:
+                # Процесс умер после коммита пачки, но до ack
+                raise Crash()
+            backend.ack(delivery_tag, multiple)
+
+        backend.basic_ack = basic_ack
+        consumer = BatchConsumer(backend, lambda tasks: handle_batch(session_factory, tasks, model, seen),
+                                 max_batch_size=4)
+        backend.consume(TASK_QUEUE, consumer.on_message, prefetch=4)
+        try:
+            backend.start(until_idle=True)
+        except Crash:
+            # Соединение закрыто: неподтвержденные сообщения возвращаются в очередь
+            backend.close()
+
+    run_worker(SeenKeys(), lambda: Session(engine), crash_on_ack=2)
+    assert backend.depth(TASK_QUEUE) == 2 and backend.unacked == 0
+
+    # Перезапущенный воркер получает вторую пачку снова: дубликаты находятся по ключу в БД
+    seen = SeenKeys()
+    run_worker(seen, lambda: Session(engine))
+    assert backend.depth(TASK_QUEUE) == 0 and backend.unacked == 0 and len(seen) == 2
+    with Session(engine) as session:
+        results = session.exec(select(PredictionResult)).all()
+        assert sorted(r.idempotency_key for r in results) == [f"key-{i}" for i in range(6)]
+        assert session.get(Balance, 1).amount == 1000.0 - 6 * model.get_cost_predict()
+
+    # Повтор в тот же процесс отсекается SeenKeys без обращения к БД
+    def no_db():
+        raise AssertionError("database should not be used")
+
+    backend.publish(TASK_QUEUE, message(1, [row]), headers={IDEMPOTENCY_HEADER: "key-4"})
+    run_worker(seen, no_db)
+    assert backend.depth(TASK_QUEUE) == 0 and seen.hits == 1
+
+
+def test_fair_scheduler_interleaves_lanes_and_users():
+    from services.RabbitMQ.codec import encode_task
+    from services.RabbitMQ.queues import MemoryQueueBackend
+    from services.RabbitMQ.scheduling import FairScheduler
+    from services.RabbitMQ.tasks import BULK, INTERACTIVE, task_headers, task_queue, task_queues
+
+    backend = MemoryQueueBackend()
+    row = {"petal_length": 1.4, "petal_width": 0.2}
+    # Поток больших задач пользователя 2 опубликован раньше, чем у пользователя 3 и интерактивные
+    assert task_queue(BULK, 2) != task_queue(BULK, 3)
+    for user_id, lane, count, rows in ((2, BULK, 20, 500), (3, BULK, 5, 500), (1, INTERACTIVE, 5, 1)):
+        for i in range(count):
+            body, content_type = encode_task(user_id, [row] * rows)
+            queue = task_queue(lane, user_id)
+            backend.publish(queue, body, headers=task_headers(f"{user_id}-{i}", user_id, lane, queue),
+                            content_type=content_type)
+
+    order = []
+
+    def on_message(ch, method, properties, body):
+        order.append(properties.headers["user_id"])
+        # ack(multiple=True) не должен подтвердить сообщения, ждущие в буфере планировщика
+        ch.basic_ack(delivery_tag=method.delivery_tag, multiple=True)
+        assert backend.unacked == len(scheduler._buffered)
+
+    scheduler = FairScheduler(backend, on_message, window=8, quantum=4096, interactive_weight=8)
+    for queue in sorted(task_queues(), reverse=True):
+        backend.consume(queue, scheduler.on_message, prefetch=9)
+    backend.start(until_idle=True)
+
+    assert len(order) == 30 and backend.unacked == 0
+    # Интерактивные задачи не ждут весь поток bulk, пользователь 3 - весь поток пользователя 2
+    assert max(i for i, user_id in enumerate(order) if user_id == 1) < 10
+    assert min(i for i, user_id in enumerate(order) if user_id == 3) < 10
+    stats = scheduler.stats()
+    assert stats[INTERACTIVE]["dispatched"] == 5 and stats[BULK]["dispatched"] == 25
+    assert stats[INTERACTIVE]["wait_ms"]["p99"] is not None and stats["buffered"] == 0
@@ -1,22 +1,41 @@
 from fastapi import FastAPI, Request, Depends, HTTPException, status, Response
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+import asyncio
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import bcrypt
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import json
+import os
 
 import modelses, services, database
 from modelses.models import MLModelService, PredictionResult, MLModel
-from services.balance import BalanceService as ImportedBalanceService
-from services.crud.user import get_user_by_email, create_user, get_user_by_id
+from services.balance import AsyncBalanceService, BalanceService as ImportedBalanceService
+from services.crud.prediction import get_predictions_page_async
+from services.crud.user import get_user_by_email_async, get_user_by_id_async
+from services.pagination import InvalidCursor, clamp_limit
 from modelses.user import User
 from modelses.balance import Balance
-from database.databases import engine
+from database.databases import (
+    database_stats, engine, get_async_session, get_async_session_factory, track_db_stats
+)
 from database.config import Settings, get_settings
 from modelses.transaction import Trans, TransactionType
+from modelses.task import PredictionTask, TERMINAL_STATUSES
+from services.ml.registry import model_registry, get_model, predict_matrix, DEFAULT_MODEL
+from services.ml.lifecycle import get_lifecycle
+from services.ml.batcher import MicroBatcher
+from services.ml.cache import get_prediction_cache
+from services.ml.streaming import StreamStats, detect_format, stream_predictions
+from services.executors import get_executors
+from services.RabbitMQ.notifier import TaskEventListener, TaskNotifier
+from services.RabbitMQ.publisher import AioPikaTransport, MemoryTransport, TaskPublisher
+from services.RabbitMQ.queues import MemoryQueueBackend, RabbitMQBackend, rabbitmq_connection_params
+from services.RabbitMQ.tasks import EVENTS_EXCHANGE
+from services.auth.hashing import hash_password, check_password
 
 from services.auth.jwt_handler import create_access_token, verify_access_token, get_current_user_from_token
 from services.auth.cookieauth import OAuth2PasswordBearerWithCookie
@@ -32,6 +51,41 @@ settings = get_settings()
 templates = Jinja2Templates(directory="templates")
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Общий микро-батчер: одиночные предсказания параллельных запросов идут одним predict
+prediction_batcher = MicroBatcher(
+    get_model,
+    max_batch_size=settings.PREDICTION_BATCH_MAX_SIZE,
+    max_wait_ms=settings.PREDICTION_BATCH_WAIT_MS,
+    runner=lambda X, model: get_executors().run_cpu(predict_matrix, X, DEFAULT_MODEL, model.version),
+    offload_min_rows=settings.EXECUTOR_CPU_OFFLOAD_MIN_ROWS
+)
+
+# Очередь задач: RabbitMQ или очередь в памяти процесса (TASK_QUEUE_BACKEND=memory),
+# которую в тестах читает воркер этого же процесса
+task_queue_backend = MemoryQueueBackend() if settings.TASK_QUEUE_BACKEND == "memory" else None
+
+# Публикация задач: пул каналов с подтверждениями издателя
+task_publisher = TaskPublisher(
+    MemoryTransport(task_queue_backend) if task_queue_backend is not None
+    else AioPikaTransport(os.getenv('RABBITMQ_HOST', 'localhost'), bulk_shards=settings.TASK_BULK_SHARDS),
+    lambda: Session(engine),
+    run_io=lambda func, *args: get_executors().run_io(func, *args),
+    pool_size=settings.TASK_PUBLISHER_CHANNELS,
+    max_batch=settings.TASK_PUBLISH_BATCH,
+    confirm_timeout=settings.TASK_PUBLISH_CONFIRM_TIMEOUT_SECONDS,
+    retry_seconds=settings.TASK_EVENTS_RETRY_SECONDS,
+    interactive_max_rows=settings.TASK_INTERACTIVE_MAX_ROWS,
+    bulk_shards=settings.TASK_BULK_SHARDS
+)
+
+# Ожидание задач очереди: события о завершении от воркеров через RabbitMQ
+task_notifier = TaskNotifier()
+task_events_listener = TaskEventListener(
+    task_notifier,
+    lambda: RabbitMQBackend(rabbitmq_connection_params()),
+    retry_seconds=settings.TASK_EVENTS_RETRY_SECONDS
+)
+
 # OAuth2 схема с куками
 oauth2_scheme = OAuth2PasswordBearerWithCookie(
     tokenUrl="/api/users/login",
@@ -39,75 +93,178 @@ oauth2_scheme = OAuth2PasswordBearerWithCookie(
 )
 
 
-class BalanceService:
-    def __init__(self, session: Session):
-        self.session = session
-
-    def get_balance(self, user: User) -> float:
-        balance = self.session.get(Balance, user.user_id)
-        if not balance:
-            # Создаем баланс если его нет
-            balance = Balance(user_id=user.user_id, amount=0.0)
-            self.session.add(balance)
-            self.session.commit()
-            self.session.refresh(balance)
-        return balance.amount
-
-    def deposit(self, user: User, amount: float) -> None:
-        balance = self.session.get(Balance, user.user_id)
-        if not balance:
-            balance = Balance(user_id=user.user_id, amount=amount)
-        else:
-            balance.amount += amount
+class DbStatsMiddleware:
+    # Обращения к базе за запрос (database/databases.py, track_db_stats); в DEBUG -
+    # в заголовках X-DB-Checkouts и X-DB-Statements. ASGI-мидлварь, а не @app.middleware:
+    # та читала бы тело запроса отдельно от потоковой загрузки /api/predictions/batch
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with track_db_stats() as stats:
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    # Только запросы с большим числом выражений; уровень проверяется
+                    # до форматирования - мидлварь работает на каждом запросе
+                    if (stats.statements >= settings.DB_STATS_LOG_MIN_STATEMENTS
+                            and logger.isEnabledFor(logging.DEBUG)):
+                        logger.debug("%s %s: %s", scope["method"], scope["path"], stats.as_dict())
+                    if settings.DEBUG:
+                        message.setdefault("headers", [])
+                        message["headers"] = list(message["headers"]) + [
+                            (b"x-db-checkouts", str(stats.checkouts).encode()),
+                            (b"x-db-statements", str(stats.statements).encode())
+                        ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
+
+
+app.add_middleware(DbStatsMiddleware)
+
+
+@app.on_event("startup")
+async def preload_models():
+    # Загружаем модель один раз при старте, а не в обработчике запроса
+    model_registry.preload()
+    task_notifier.attach(asyncio.get_running_loop())
+    if task_queue_backend is not None:
+        # События доставляются в потоке, который обрабатывает очередь в памяти
+        task_queue_backend.subscribe(
+            EVENTS_EXCHANGE, lambda ch, method, properties, body: task_notifier.deliver(body)
+        )
+    elif settings.TASK_EVENTS_ENABLED:
+        task_events_listener.start()
 
-        self.session.add(balance)
 
-        # Создаем запись о транзакции
-        transaction = Trans(
-            transaction_id=f"trans_{datetime.now().timestamp()}",
-            user_id=user.user_id,
-            amount=amount,
-            transaction_type=TransactionType.DEPOSIT.value
-        )
-        self.session.add(transaction)
-        self.session.commit()
-
-    def withdraw(self, user: User, amount: float) -> bool:
-        balance = self.session.get(Balance, user.user_id)
-        if not balance or balance.amount < amount:
-            return False
-
-        balance.amount -= amount
-        self.session.add(balance)
-
-        # Создаем запись о транзакции
-        transaction = Trans(
-            transaction_id=f"trans_{datetime.now().timestamp()}",
-            user_id=user.user_id,
-            amount=-amount,
-            transaction_type=TransactionType.COST_PREDICTION.value
-        )
-        self.session.add(transaction)
-        self.session.commit()
+@app.on_event("shutdown")
+async def shutdown_executors():
+    get_executors().shutdown()
+    get_lifecycle().shutdown()
+    task_events_listener.stop()
+    await task_publisher.close()
+
+
+# Работа с БД - через сессию запроса (get_async_session, database/databases.py):
+# авторизация, баланс и результат используют одно соединение из пула
+
+def _db_session() -> AsyncSession:
+    # Отдельная сессия - для кода вне запроса (после отдачи потокового ответа)
+    return get_async_session_factory()()
+
+
+async def _create_user(db_session: AsyncSession, username: str, email: str, hashed_password: str) -> User:
+    new_user = User(
+        username=username,
+        email=email,
+        password_hash=hashed_password,
+        created_at=datetime.now(),
+        balance=0.0
+    )
+
+    try:
+        # Пользователь и его баланс - одним коммитом; flush выдает user_id
+        db_session.add(new_user)
+        await db_session.flush()
+        db_session.add(Balance(user_id=new_user.user_id, amount=0.0))
+        await db_session.commit()
+        return new_user
+    except Exception:
+        await db_session.rollback()
+        raise
+
+
+async def _load_index_data(db_session: AsyncSession, user: User):
+    balance_service = AsyncBalanceService(db_session)
+    balance = await balance_service.get_balance(user)
+
+    # Получаем последнее предсказание из базы
+    statement = select(PredictionResult).where(
+        PredictionResult.user_id == user.user_id
+    ).order_by(PredictionResult.created_at.desc()).limit(1)
+
+    last_prediction = (await db_session.exec(statement)).first()
+    prediction_result = last_prediction.get_prediction_rez() if last_prediction else None
+    return balance, prediction_result
+
+
+async def _settle_batch(user: User, reserved: float, cost: float,
+                        prediction: Optional[PredictionResult]) -> None:
+    # Возврат неиспользованного резерва, запись списания и результата - одной транзакцией
+    # на всю пакетную загрузку. Вызывается после отдачи потокового ответа, когда сессии
+    # запроса уже нет
+    async with _db_session() as db_session:
+        await AsyncBalanceService(db_session, autocommit=False).settle(user, reserved, cost)
+        if prediction is not None:
+            db_session.add(prediction)
+        await db_session.commit()
+
+
+async def _load_predictions(db_session: AsyncSession, user_id: int, limit: int,
+                            cursor: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    # Одна страница: время ответа и память не зависят от длины истории
+    predictions, next_cursor = await get_predictions_page_async(user_id, db_session, limit, cursor)
+    return [
+        {
+            "id": pred.prediction_id,
+            "result": pred.get_prediction_rez(),
+            "cost": pred.cost,
+            "model_version": pred.model_version,
+            "created_at": pred.created_at
+        } for pred in predictions
+    ], next_cursor
+
+
+async def _load_task(db_session: AsyncSession, user_id: int, task_id: str) -> Optional[dict]:
+    # Задача видна только ее владельцу; результат - когда задача выполнена.
+    # Сессия закрывается после чтения: между проверками long-poll и SSE соединение
+    # возвращается в пул, а следующее чтение видит коммиты воркера
+    try:
+        task = await db_session.get(PredictionTask, task_id)
+        if not task or task.user_id != user_id:
+            return None
+        prediction = await db_session.get(PredictionResult, task.prediction_id) if task.prediction_id else None
+        return {
+            "task_id": task.task_id,
+            "status": task.status,
+            "error": task.error,
+            "prediction_id": task.prediction_id,
+            "result": prediction.get_prediction_rez() if prediction else None,
+            "created_at": task.created_at.isoformat(),
+            "started_at": task.started_at.isoformat() if task.started_at else None,
+            "finished_at": task.finished_at.isoformat() if task.finished_at else None
+        }
+    finally:
+        await db_session.close()
+
+
+def _should_enqueue(rows: int) -> bool:
+    # Большие запросы и запросы под нагрузкой уходят воркерам через очередь
+    if settings.PREDICTION_QUEUE_MIN_ROWS and rows >= settings.PREDICTION_QUEUE_MIN_ROWS:
         return True
+    load = settings.PREDICTION_QUEUE_LOAD_THRESHOLD
+    return bool(load) and get_executors().stats()["cpu"]["in_flight"] >= load
 
 
 # получение текущего пользователя
-async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)):
+async def get_current_user(token: Optional[str] = Depends(oauth2_scheme),
+                           db_session: AsyncSession = Depends(get_async_session)):
     if not token:
         return None
 
     try:
         user_data = get_current_user_from_token(token)
-        with Session(engine) as db_session:
-            user = db_session.get(User, user_data["user_id"])
-            return user
+        return await get_user_by_id_async(user_data["user_id"], db_session)
     except HTTPException:
         return None
 
 
 # аутентифицированные пользователи
-async def get_authenticated_user(token: str = Depends(oauth2_scheme)):
+async def get_authenticated_user(token: str = Depends(oauth2_scheme),
+                                 db_session: AsyncSession = Depends(get_async_session)):
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -115,54 +272,40 @@ async def get_authenticated_user(token: str = Depends(oauth2_scheme)):
         )
 
     user_data = get_current_user_from_token(token)
-    with Session(engine) as db_session:
-        user = db_session.get(User, user_data["user_id"])
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
-        return user
+    user = await get_user_by_id_async(user_data["user_id"], db_session)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    return user
 
 
 @app.get("/", response_class=HTMLResponse)
 async def index(
         request: Request,
-        current_user: Optional[User] = Depends(get_current_user)
+        current_user: Optional[User] = Depends(get_current_user),
+        db_session: AsyncSession = Depends(get_async_session)
 ):
     error_message = request.query_params.get("error")
     success_message = request.query_params.get("success")
 
     if current_user:
-        with Session(engine) as db_session:
-            balance_service = BalanceService(db_session)
-            balance = balance_service.get_balance(current_user)
-
-            # Проверяем наличие последнего предсказания
-            prediction_made = False
-            prediction_result = None
-
-            # Получаем последнее предсказание из базы
-            statement = select(PredictionResult).where(
-                PredictionResult.user_id == current_user.user_id
-            ).order_by(PredictionResult.created_at.desc()).limit(1)
-
-            last_prediction = db_session.exec(statement).first()
-            if last_prediction:
-                prediction_made = True
-
-                prediction_result = last_prediction.get_prediction_rez()
-
-            return templates.TemplateResponse("app.html", {
-                "request": request,
-                "registered": True,
-                "username": current_user.username,
-                "balance": balance,
-                "prediction_made": prediction_made,
-                "prediction_result": prediction_result,
-                "error_message": error_message,
-                "success_message": success_message
-            })
+        balance, prediction_result = await _load_index_data(db_session, current_user)
+
+        # Проверяем наличие последнего предсказания
+        prediction_made = prediction_result is not None
+
+        return templates.TemplateResponse("app.html", {
+            "request": request,
+            "registered": True,
+            "username": current_user.username,
+            "balance": balance,
+            "prediction_made": prediction_made,
+            "prediction_result": prediction_result,
+            "error_message": error_message,
+            "success_message": success_message
+        })
 
     return templates.TemplateResponse("app.html", {
         "request": request,
@@ -173,7 +316,8 @@ async def index(
 
 
 @app.post("/api/users/register")
-async def register(request: Request, response: Response):
+async def register(request: Request, response: Response,
+                   db_session: AsyncSession = Depends(get_async_session)):
     form_data = await request.form()
     username = form_data.get("username", "").strip()
     email = form_data.get("email", "").strip()
@@ -189,56 +333,41 @@ async def register(request: Request, response: Response):
     if "@" not in email or "." not in email:
         return RedirectResponse("/?error=Некорректный формат email", status_code=303)
 
-    with Session(engine) as db_session:
-        # Проверяем, нет ли уже такого пользователя
-        existing_user = db_session.exec(select(User).where(User.email == email)).first()
-        if existing_user:
-            return RedirectResponse("/?error=Пользователь с таким email уже существует", status_code=303)
-
-        # Создаем нового пользователя
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-        new_user = User(
-            username=username,
-            email=email,
-            password_hash=hashed_password,
-            created_at=datetime.now(),
-            balance=0.0
+    executors = get_executors()
+
+    # Проверяем, нет ли уже такого пользователя
+    existing_user = await get_user_by_email_async(email, db_session)
+    if existing_user:
+        return RedirectResponse("/?error=Пользователь с таким email уже существует", status_code=303)
+
+    try:
+        # Создаем нового пользователя (bcrypt - в пуле процессов)
+        hashed_password = await executors.run_cpu(hash_password, password)
+        new_user = await _create_user(db_session, username, email, hashed_password)
+
+        # Создаем JWT токен
+        token = create_access_token(new_user.user_id, new_user.username)
+
+        # Устанавливаем токен в куки
+        response = RedirectResponse("/?success=Регистрация завершена успешно!", status_code=303)
+        response.set_cookie(
+            key=settings.COOKIE_NAME,
+            value=token,
+            httponly=True,
+            max_age=3600,
+            secure=not settings.DEBUG,
+            samesite="lax"
         )
 
-        try:
-            db_session.add(new_user)
-            db_session.commit()
-            db_session.refresh(new_user)
-
-            # Создаем баланс для пользователя
-            balance = Balance(user_id=new_user.user_id, amount=0.0)
-            db_session.add(balance)
-            db_session.commit()
-
-            # Создаем JWT токен
-            token = create_access_token(new_user.user_id, new_user.username)
-
-            # Устанавливаем токен в куки
-            response = RedirectResponse("/?success=Регистрация завершена успешно!", status_code=303)
-            response.set_cookie(
-                key=settings.COOKIE_NAME,
-                value=token,
-                httponly=True,
-                max_age=3600,
-                secure=not settings.DEBUG,
-                samesite="lax"
-            )
-
-            return response
+        return response
 
-        except Exception as e:
-            db_session.rollback()
-            return RedirectResponse(f"/?error=Ошибка при создании пользователя: {str(e)}", status_code=303)
+    except Exception as e:
+        return RedirectResponse(f"/?error=Ошибка при создании пользователя: {str(e)}", status_code=303)
 
 
 @app.post("/api/users/login")
-async def login(request: Request, response: Response):
+async def login(request: Request, response: Response,
+                db_session: AsyncSession = Depends(get_async_session)):
     try:
         form_data = await request.form()
         email = form_data.get("username", "").strip()
@@ -247,33 +376,33 @@ async def login(request: Request, response: Response):
         if not email or not password:
             return RedirectResponse("/?error=Email и пароль обязательны", status_code=303)
 
-        with Session(engine) as db_session:
-            user = db_session.exec(select(User).where(User.email == email)).first()
-            if not user:
-                return RedirectResponse("/?error=Неверный email или пароль", status_code=303)
-
-            # Проверяем пароль
-            try:
-                if not bcrypt.checkpw(password.encode('utf-8'), user.password_hash.encode('utf-8')):
-                    return RedirectResponse("/?error=Неверный email или пароль", status_code=303)
-            except Exception as e:
-                return RedirectResponse("/?error=Ошибка проверки пароля", status_code=303)
-
-            # Создаем JWT токен
-            token = create_access_token(user.user_id, user.username)
+        executors = get_executors()
+        user = await get_user_by_email_async(email, db_session)
+        if not user:
+            return RedirectResponse("/?error=Неверный email или пароль", status_code=303)
 
-            # Устанавливаем токен в куки
-            response = RedirectResponse("/?success=Вход выполнен успешно!", status_code=303)
-            response.set_cookie(
-                key=settings.COOKIE_NAME,
-                value=token,
-                httponly=True,
-                max_age=3600,
-                secure=not settings.DEBUG,
-                samesite="lax"
-            )
+        # Проверяем пароль (bcrypt - в пуле процессов)
+        try:
+            if not await executors.run_cpu(check_password, password, user.password_hash):
+                return RedirectResponse("/?error=Неверный email или пароль", status_code=303)
+        except Exception as e:
+            return RedirectResponse("/?error=Ошибка проверки пароля", status_code=303)
+
+        # Создаем JWT токен
+        token = create_access_token(user.user_id, user.username)
+
+        # Устанавливаем токен в куки
+        response = RedirectResponse("/?success=Вход выполнен успешно!", status_code=303)
+        response.set_cookie(
+            key=settings.COOKIE_NAME,
+            value=token,
+            httponly=True,
+            max_age=3600,
+            secure=not settings.DEBUG,
+            samesite="lax"
+        )
 
-            return response
+        return response
 
     except Exception as e:
         print(f"Login error: {e}")
@@ -282,7 +411,8 @@ async def login(request: Request, response: Response):
 @app.post("/balance")
 async def handle_balance(
         request: Request,
-        current_user: User = Depends(get_authenticated_user)
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
 ):
     form_data = await request.form()
     try:
@@ -290,10 +420,7 @@ async def handle_balance(
     except ValueError:
         return RedirectResponse("/?error=Неверная сумма", status_code=303)
 
-    with Session(engine) as db_session:
-
-        balance_service = BalanceService(db_session)
-        balance_service.deposit(current_user, amount)
+    await AsyncBalanceService(db_session).deposit(current_user, amount)
 
     return RedirectResponse("/?success=Баланс пополнен успешно!", status_code=303)
 
@@ -301,7 +428,8 @@ async def handle_balance(
 @app.post("/prediction")
 async def handle_prediction(
         request: Request,
-        current_user: User = Depends(get_authenticated_user)
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
 ):
     form_data = await request.form()
 
@@ -338,44 +466,53 @@ async def handle_prediction(
     except ValueError:
         return RedirectResponse("/?error=Некорректные данные для предсказания", status_code=303)
 
-    with Session(engine) as db_session:
-        balance_service = BalanceService(db_session)
-        balance = balance_service.get_balance(current_user)
+    # Сессия запроса - та же, в которой загружен пользователь. Списание и результат
+    # коммитятся вместе в конце: если предсказание упало, средства не списываются
+    balance_service = AsyncBalanceService(db_session, autocommit=False)
+    balance = await balance_service.get_balance(current_user)
 
-        # Стоимость предсказания из ML модели
-        ml_model = MLModel()
-        cost = ml_model.get_cost_predict()
+    # Стоимость предсказания из общей ML модели процесса
+    ml_model = get_model()
+    cost = ml_model.get_cost_predict()
 
-        # Проверяем баланс
-        if balance < cost:
-            return RedirectResponse("/?error=Недостаточно средств для предсказания", status_code=303)
+    # Проверяем баланс
+    if balance < cost:
+        return RedirectResponse("/?error=Недостаточно средств для предсказания", status_code=303)
 
-        success_withdraw = balance_service.withdraw(current_user, cost)
-        if not success_withdraw:
-            return RedirectResponse("/?error=Недостаточно средств для предсказания", status_code=303)
+    # В очереди средства списывает воркер; если очередь недоступна - считаем на месте
+    if prediction_data and _should_enqueue(len(prediction_data)):
+        try:
+            task_id = await task_publisher.enqueue_prediction(current_user.user_id, prediction_data)
+            return RedirectResponse(f"/?success=Предсказание поставлено в очередь, задача {task_id}",
+                                    status_code=303)
+        except Exception as e:
+            logger.warning(f"Prediction of user {current_user.user_id} computed inline, queue failed: {e}")
 
-        #user_balance_obj = Balance(user_id=current_user.user_id, amount=balance)
-        ml_service = MLModelService(balance_service=balance_service)
+    #user_balance_obj = Balance(user_id=current_user.user_id, amount=balance)
+    ml_service = MLModelService(balance_service=balance_service, ml_model=ml_model)
 
-        try:
-            prediction_result = ml_service.make_prediction(current_user, prediction_data)
+    try:
+        # Списание - внутри make_prediction_batched_async, один раз за предсказание
+        prediction_result = await ml_service.make_prediction_batched_async(
+            current_user, prediction_data, prediction_batcher
+        )
 
-            # Сохраняем результат в базу
-            if prediction_result:
-                prediction = PredictionResult(
-                    user_id=current_user.user_id,
-                    prediction_rez=json.dumps(prediction_result),
-                    cost=cost,
-                    created_at=datetime.now()
-                )
-                db_session.add(prediction)
-                db_session.commit()
+        # Сохраняем результат в базу
+        if prediction_result:
+            db_session.add(PredictionResult(
+                user_id=current_user.user_id,
+                prediction_rez=json.dumps(prediction_result),
+                cost=cost,
+                model_version=ml_model.version,
+                created_at=datetime.now()
+            ))
+        await db_session.commit()
 
-            return RedirectResponse("/?success=Предсказание выполнено успешно!", status_code=303)
+        return RedirectResponse("/?success=Предсказание выполнено успешно!", status_code=303)
 
-        except Exception as e:
-            db_session.rollback()
-            return RedirectResponse(f"/?error=Ошибка предсказания: {str(e)}", status_code=303)
+    except Exception as e:
+        await db_session.rollback()
+        return RedirectResponse(f"/?error=Ошибка предсказания: {str(e)}", status_code=303)
 
 @app.post("/logout")
 async def logout(response: Response):
@@ -387,36 +524,240 @@ async def logout(response: Response):
 
 @app.get("/api/predictions")
 async def get_user_predictions(
-        current_user: User = Depends(get_authenticated_user)
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
 ):
-    # API для получения предсказаний пользователя
-    with Session(engine) as db_session:
-        statement = select(PredictionResult).where(
-            PredictionResult.user_id == current_user.user_id
-        ).order_by(PredictionResult.created_at.desc())
+    # API для получения предсказаний пользователя: страница новых первыми
+    # (до PAGE_LIMIT_MAX), следующая - с ?cursor=next_cursor из ответа
+    limit = clamp_limit(limit, settings.PAGE_LIMIT_DEFAULT, settings.PAGE_LIMIT_MAX)
+    try:
+        predictions, next_cursor = await _load_predictions(db_session, current_user.user_id, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return {"predictions": predictions, "next_cursor": next_cursor}
 
-        predictions = db_session.exec(statement).all()
-        return {
-            "predictions": [
-                {
-                    "id": pred.prediction_id,
-                    "result": pred.get_prediction_rez(),
-                    "cost": pred.cost,
-                    "created_at": pred.created_at
-                } for pred in predictions
-            ]
-        }
+
+@app.post("/api/predictions/tasks", status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_predictions(
+        request: Request,
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
+):
+    # Предсказание через очередь: {"data": [{"petal_length": 1.4, "petal_width": 0.2}, ...]}.
+    # Ответ - task_id для /api/tasks/{task_id}; средства списывает воркер
+    try:
+        payload = await request.json()
+        rows = payload["data"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Body must be {\"data\": [...]}")
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="data must be a non-empty list of objects")
+
+    balance = await AsyncBalanceService(db_session).get_balance(current_user)
+    if balance < get_model().get_cost_predict():
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Not enough credits")
+
+    try:
+        task_id = await task_publisher.enqueue_prediction(current_user.user_id, rows)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except Exception as e:
+        logger.warning(f"Task queue unavailable: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Task queue unavailable")
+    return {"task_id": task_id, "status": "queued"}
+
+
+class UploadStreamingResponse(StreamingResponse):
+    # Ответ отдается, пока тело запроса еще читается. Стандартный StreamingResponse
+    # (ASGI spec < 2.4) параллельно читает receive() в ожидании отключения клиента
+    # и забирал бы куски загрузки; здесь отключение замечает сам request.stream()
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/api/predictions/batch")
+async def predict_batch(
+        request: Request,
+        format: Optional[str] = None,
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
+):
+    # Пакетные предсказания: CSV (с заголовком) или NDJSON в теле запроса.
+    # Загрузка разбирается кусками по PREDICTION_STREAM_CHUNK_ROWS строк,
+    # результаты уходят клиенту в NDJSON, не дожидаясь конца файла
+    try:
+        fmt = detect_format(request.headers.get("content-type"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+
+    run_io = get_executors().run_io
+    row_cost = settings.PREDICTION_BATCH_ROW_COST
+    balance_service = AsyncBalanceService(db_session)
+    balance = await balance_service.get_balance(current_user)
+
+    # Обрабатываем не больше строк, чем покрывает баланс. Стоимость всех этих строк
+    # резервируется до отдачи первой строки, остаток возвращается по итогу загрузки:
+    # клиент не получает строк, за которые не удалось списать средства
+    max_rows = int(balance / row_cost + 1e-9) if row_cost > 0 else None
+    reserved = round(max_rows * row_cost, 2) if max_rows else 0.0
+    if max_rows == 0 or (reserved > 0 and not await balance_service.reserve(current_user, reserved)):
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Not enough credits")
+
+    # Вся загрузка считается одной версией модели, даже если модель подменят
+    ml_model = get_model()
+    stats = StreamStats()
+
+    async def results():
+        summary = {}
+        try:
+            async for lines in stream_predictions(
+                    ml_model, request.stream(), fmt, stats,
+                    chunk_rows=settings.PREDICTION_STREAM_CHUNK_ROWS,
+                    max_rows=max_rows, run=run_io):
+                yield lines
+        except ValueError as e:
+            summary["error"] = str(e)
+        finally:
+            # Итог и при обрыве соединения: списание за отданные строки, остаток резерва - обратно
+            cost = round(stats.predicted * row_cost, 2)
+            summary.update(stats.as_dict(), cost=cost, model_version=ml_model.version)
+            prediction = PredictionResult(
+                user_id=current_user.user_id,
+                prediction_rez=json.dumps([{"batch": summary}]),
+                cost=cost,
+                model_version=ml_model.version,
+                created_at=datetime.now()
+            ) if stats.rows else None
+            try:
+                await _settle_batch(current_user, reserved, cost, prediction)
+            except Exception as e:
+                logger.error(f"Batch reserve of user {current_user.user_id} was not settled "
+                             f"(reserved {reserved}, cost {cost}): {e}")
+
+        yield (json.dumps({"summary": summary}) + "\n").encode()
+
+    return UploadStreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/api/tasks/{task_id}")
+async def get_task(
+        task_id: str,
+        wait: float = 0.0,
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
+):
+    # Статус задачи очереди. С wait > 0 - long-poll: ответ приходит, как только
+    # воркер завершит задачу, или через wait секунд с текущим статусом
+    wait = min(max(wait, 0.0), settings.TASK_LONG_POLL_MAX_SECONDS)
+    events = task_notifier.subscribe(task_id)
+    try:
+        task = await _load_task(db_session, current_user.user_id, task_id)
+        if task is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while task["status"] not in TERMINAL_STATUSES and deadline > loop.time():
+            timeout = min(deadline - loop.time(), settings.TASK_STATUS_RECHECK_SECONDS)
+            committed_at = await task_notifier.next_event(events, timeout)
+            task = await _load_task(db_session, current_user.user_id, task_id)
+            if committed_at is not None and task["status"] in TERMINAL_STATUSES:
+                task_notifier.record_delivery(committed_at)
+        return task
+    finally:
+        task_notifier.unsubscribe(task_id, events)
+
+
+@app.get("/api/tasks/{task_id}/events")
+async def stream_task_events(
+        task_id: str,
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
+):
+    # Server-Sent Events: текущий статус задачи, затем каждое его изменение;
+    # поток закрывается после done/failed
+    events = task_notifier.subscribe(task_id)
+    task = await _load_task(db_session, current_user.user_id, task_id)
+    if task is None:
+        task_notifier.unsubscribe(task_id, events)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+    async def stream():
+        current = task
+        try:
+            yield f"event: status\ndata: {json.dumps(current)}\n\n"
+            while current["status"] not in TERMINAL_STATUSES:
+                committed_at = await task_notifier.next_event(events, settings.TASK_STATUS_RECHECK_SECONDS)
+                # Поток отдается после закрытия сессии запроса - своя сессия на чтение
+                latest = await _load_task(_db_session(), current_user.user_id, task_id)
+                if latest["status"] == current["status"]:
+                    # Комментарий держит соединение открытым через прокси
+                    yield ": keepalive\n\n"
+                    continue
+                current = latest
+                if committed_at is not None:
+                    task_notifier.record_delivery(committed_at)
+                yield f"event: status\ndata: {json.dumps(current)}\n\n"
+        finally:
+            task_notifier.unsubscribe(task_id, events)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    # Метрики процесса: время загрузки и память моделей, батчинг, пулы, кэш, события задач, БД
+    cache = get_prediction_cache()
+    return {
+        "models": model_registry.stats(),
+        "batching": prediction_batcher.stats(),
+        "executors": get_executors().stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "lifecycle": get_lifecycle().status(),
+        "tasks": task_notifier.stats(),
+        "publisher": task_publisher.stats(),
+        "database": database_stats()
+    }
+
+
+async def get_admin_user(current_user: User = Depends(get_authenticated_user)):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin rights required"
+        )
+    return current_user
+
+
+@app.post("/api/models/retrain")
+async def retrain_model(current_user: User = Depends(get_admin_user)):
+    # Переобучение в фоне, запросы продолжают обслуживаться текущей версией
+    get_lifecycle().retrain()
+    return {"status": "scheduled", "active_version": get_model().version}
+
+
+@app.post("/api/models/activate/{version}")
+async def activate_model(version: str, current_user: User = Depends(get_admin_user)):
+    # Загрузка сохраненной версии артефакта в фоне и атомарная подмена
+    get_lifecycle().load_version(version)
+    return {"status": "scheduled", "active_version": get_model().version}
 
 
 @app.get("/api/user/balance")
 async def get_user_balance(
-        current_user: User = Depends(get_authenticated_user)
+        current_user: User = Depends(get_authenticated_user),
+        db_session: AsyncSession = Depends(get_async_session)
 ):
     # API для получения баланса пользователя
-    with Session(engine) as db_session:
-        balance_service = BalanceService(db_session)
-        balance = balance_service.get_balance(current_user)
-        return {"balance": balance}
+    balance = await AsyncBalanceService(db_session).get_balance(current_user)
+    return {"balance": balance}
 
 
 if __name__ == "__main__":